@@ -12,5 +12,10 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'api.settings')
+# the read endpoints are served by async views (DATA_ASYNC_VIEWS=0 to keep the sync ones)
+os.environ.setdefault('DATA_ASYNC_VIEWS', '1')
 
 application = get_asgi_application()
+
+from data.graph import warm_up_graph_index  # noqa: E402 (after the app registry is ready)
+warm_up_graph_index()
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 import os
+import tempfile
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -46,6 +47,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'data.timing.server_timing_middleware',
+    'data.metrics.metrics_middleware',
+    'data.routers.replica_routing_middleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -79,18 +83,39 @@ WSGI_APPLICATION = 'api.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
+# PostgreSQL backend with an optional psycopg 3 connection pool per process (data/backends/postgresql):
+# DB_POOL=1 keeps DB_POOL_MIN_SIZE to DB_POOL_MAX_SIZE connections open, checked before use
+# (DB_CONN_HEALTH_CHECKS) and recycled after DB_POOL_MAX_LIFETIME seconds (DB_POOL_MAX_IDLE when unused).
+# DB_PREPARE_THRESHOLD=n (psycopg 3) binds the parameters on the server and prepares a query the
+# n-th time a connection executes it, at most DB_PREPARED_MAX prepared queries per connection
+DATABASE_OPTIONS = {}
+if bool(int(os.getenv('DB_POOL', 0))):
+    DATABASE_OPTIONS['pool'] = {
+        'min_size': int(os.getenv('DB_POOL_MIN_SIZE', 2)),
+        'max_size': int(os.getenv('DB_POOL_MAX_SIZE', 10)),
+        'timeout': float(os.getenv('DB_POOL_TIMEOUT', 10)),
+        'max_lifetime': float(os.getenv('DB_POOL_MAX_LIFETIME', 1800)),
+        'max_idle': float(os.getenv('DB_POOL_MAX_IDLE', 300)),
+    }
+if os.getenv('DB_PREPARE_THRESHOLD'):
+    DATABASE_OPTIONS['server_side_binding'] = True
+    DATABASE_OPTIONS['prepare_threshold'] = int(os.getenv('DB_PREPARE_THRESHOLD'))
+    DATABASE_OPTIONS['prepared_max'] = int(os.getenv('DB_PREPARED_MAX', 100))
+
 DATABASES = {
     # 'default': {
     #     'ENGINE': 'django.db.backends.sqlite3',
     #     'NAME': BASE_DIR / 'db.sqlite3',
     # },
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
+        'ENGINE': 'data.backends.postgresql',
         'NAME': os.getenv('DB_NAME', 'dev'),
         'USER': os.getenv('DB_USER', 'anogueira'),
         'PASSWORD': os.getenv('DB_PASSWORD', 'changeme'),
         'HOST': os.getenv('DB_HOST', '127.0.0.1'),
         'PORT': os.getenv('DB_PORT', '5432'),
+        'OPTIONS': DATABASE_OPTIONS,
+        'CONN_HEALTH_CHECKS': bool(int(os.getenv('DB_CONN_HEALTH_CHECKS', 1))),
         'TEST': {
             'NAME': os.getenv('DB_NAME', 'test'),
             'USER': os.getenv('DB_USER', 'anogueira'),
@@ -101,6 +126,25 @@ DATABASES = {
     }
 }
 
+# read replicas of the primary for the GET endpoints (data/routers.py): DB_REPLICA_HOSTS=host[:port],...
+# with the NAME, USER and PASSWORD of the primary, aliases replica1, replica2... (the primary in tests).
+# A replica more than DATA_REPLICA_MAX_LAG seconds behind (checked every DATA_REPLICA_LAG_CHECK_INTERVAL
+# seconds) is skipped, a user reads from the primary for DATA_REPLICA_PRIMARY_WINDOW seconds after a write
+DATA_REPLICAS = []
+for position, replica in enumerate(filter(None, os.getenv('DB_REPLICA_HOSTS', '').split(',')), 1):
+    host, _, port = replica.strip().partition(':')
+    DATABASES[f'replica{position}'] = {
+        **DATABASES['default'],
+        'HOST': host,
+        'PORT': port or DATABASES['default']['PORT'],
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATA_REPLICAS.append(f'replica{position}')
+DATABASE_ROUTERS = ['data.routers.ReplicaRouter']
+DATA_REPLICA_MAX_LAG = float(os.getenv('DATA_REPLICA_MAX_LAG', 5))
+DATA_REPLICA_LAG_CHECK_INTERVAL = float(os.getenv('DATA_REPLICA_LAG_CHECK_INTERVAL', 1))
+DATA_REPLICA_PRIMARY_WINDOW = float(os.getenv('DATA_REPLICA_PRIMARY_WINDOW', 10))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -145,14 +189,89 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
-        'rest_framework.authentication.SessionAuthentication',
+        'data.authentication.CachedTokenAuthentication',
+        'data.authentication.CachedSessionAuthentication',
+    ],
+    # same output as rest_framework.renderers.JSONRenderer, encoded with orjson when installed
+    'DEFAULT_RENDERER_CLASSES': [
+        'data.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
     ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.LimitOffsetPagination',
     'PAGE_SIZE': 100,
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
 }
 
+# count mode used by the paginated endpoints when the request has no `count` query param:
+# 'exact' (COUNT(*)), 'estimate' (cached per-filter count or planner estimate) or 'none'
+DATA_PAGINATION_COUNT = os.getenv('DATA_PAGINATION_COUNT', 'exact')
+
+# serve the read endpoints with the async views (data/async_views.py), set by api/asgi.py
+DATA_ASYNC_VIEWS = bool(int(os.getenv('DATA_ASYNC_VIEWS', 0)))
+
+# rows fetched per server-side cursor round trip by the NDJSON export endpoints
+DATA_EXPORT_CHUNK_SIZE = int(os.getenv('DATA_EXPORT_CHUNK_SIZE', 2000))
+
+# max ids per request of the multi-get endpoints (?ids=1,2,3)
+DATA_MULTI_GET_MAX_IDS = int(os.getenv('DATA_MULTI_GET_MAX_IDS', 100))
+
+# limits of the affiliation network endpoints: max `depth` query param, max nodes per response
+DATA_NETWORK_MAX_DEPTH = int(os.getenv('DATA_NETWORK_MAX_DEPTH', 4))
+DATA_NETWORK_MAX_NODES = int(os.getenv('DATA_NETWORK_MAX_NODES', 1000))
+
+# in-memory affiliation graph index (data/graph.py): built at startup and used by the network
+# endpoints when enabled, otherwise built on first use of the neighbours/path endpoints.
+# Writes are applied to an overlay merged into the index past DATA_GRAPH_INDEX_MAX_DELTA changes,
+# rebuilt after DATA_GRAPH_INDEX_MAX_AGE seconds when the data cache is per process (locmem)
+DATA_GRAPH_INDEX = bool(int(os.getenv('DATA_GRAPH_INDEX', 0)))
+DATA_GRAPH_INDEX_MAX_DELTA = int(os.getenv('DATA_GRAPH_INDEX_MAX_DELTA', 100000))
+DATA_GRAPH_INDEX_MAX_AGE = int(os.getenv('DATA_GRAPH_INDEX_MAX_AGE', 300))
+
+# doc: https://docs.djangoproject.com/en/4.2/topics/cache/
+# 'data' holds the response cache, cached counts and the version counters they are keyed with.
+# The version counters must be shared by all the processes (API workers, ingest_data), so the
+# default backend is file based; memcached/redis are faster. With a process-local backend
+# (LocMemCache) the response cache and the ETag/Last-Modified validators are disabled
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'data': {
+        'BACKEND': os.getenv('DATA_CACHE_BACKEND', 'django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': os.getenv('DATA_CACHE_LOCATION', os.path.join(tempfile.gettempdir(), 'health-api-data')),
+        'TIMEOUT': int(os.getenv('DATA_CACHE_TIMEOUT', 300)),
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.getenv('DATA_CACHE_MAX_ENTRIES', 10000)),
+        },
+    },
+}
+DATA_CACHE_ALIAS = 'data'
+
+# read-through cache of the GET endpoints responses (set DATA_RESPONSE_CACHE=0 to disable)
+DATA_RESPONSE_CACHE = bool(int(os.getenv('DATA_RESPONSE_CACHE', 1)))
+
+# share of the requests answered with a Server-Timing header (auth, cache, db, serialize, render
+# and total durations, data/timing.py), from 0 (default, no instrumentation) to 1 (every request)
+DATA_SERVER_TIMING_SAMPLE_RATE = float(os.getenv('DATA_SERVER_TIMING_SAMPLE_RATE', 0))
+
+# request metrics served by /metrics (data/metrics.py), set DATA_METRICS=0 to disable.
+# With DATA_METRICS_DIR (a directory emptied at startup, e.g. /var/tmp/health-api-metrics) the
+# processes write their counters there every DATA_METRICS_FLUSH_INTERVAL seconds and /metrics sums them.
+# DATA_METRICS_SQL=1 adds the SQL queries and their time, with a wrapper on every query
+DATA_METRICS = bool(int(os.getenv('DATA_METRICS', 1)))
+DATA_METRICS_SQL = bool(int(os.getenv('DATA_METRICS_SQL', 0)))
+DATA_METRICS_DIR = os.getenv('DATA_METRICS_DIR') or None
+DATA_METRICS_FLUSH_INTERVAL = float(os.getenv('DATA_METRICS_FLUSH_INTERVAL', 5))
+
+# authentication (data/authentication.py): resolved sessions and tokens cached per process,
+# dropped after DATA_AUTH_CACHE_TIMEOUT seconds or on a token/user change (set DATA_AUTH_CACHE=0 to disable)
+DATA_AUTH_CACHE = bool(int(os.getenv('DATA_AUTH_CACHE', 1)))
+DATA_AUTH_CACHE_TIMEOUT = int(os.getenv('DATA_AUTH_CACHE_TIMEOUT', 60))
+DATA_AUTH_CACHE_MAX_ENTRIES = int(os.getenv('DATA_AUTH_CACHE_MAX_ENTRIES', 10000))
+# stateless signed tokens (Authorization: Bearer), issued by v1/auth/signed/
+DATA_SIGNED_TOKENS = bool(int(os.getenv('DATA_SIGNED_TOKENS', 0)))
+DATA_SIGNED_TOKEN_MAX_AGE = int(os.getenv('DATA_SIGNED_TOKEN_MAX_AGE', 3600))
+
 # doc: https://github.com/tfranzel/drf-spectacular/
 # for generating OpenAPI
 SPECTACULAR_SETTINGS = {
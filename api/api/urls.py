@@ -17,9 +17,12 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import include, path
+from data.views import get_metrics, obtain_signed_token
 
 urlpatterns = [
     path('api/v1/auth/', views.obtain_auth_token),
+    path('api/v1/auth/signed/', obtain_signed_token),
     path('api/v1/', include('data.urls')),
     path('admin/', admin.site.urls),
+    path('metrics', get_metrics, name='metrics'),
 ]
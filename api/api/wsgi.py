@@ -14,3 +14,6 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'api.settings')
 
 application = get_wsgi_application()
+
+from data.graph import warm_up_graph_index  # noqa: E402 (after the app registry is ready)
+warm_up_graph_index()
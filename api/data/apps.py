@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class DataConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'data'
+
+    def ready(self):
+        # graph after signals: its receivers expect the generation bumped by the signals ones
+        from . import signals, graph, authentication, timing, metrics  # noqa: F401
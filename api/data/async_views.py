@@ -0,0 +1,302 @@
+from functools import wraps
+from asgiref.sync import sync_to_async
+from django.http import Http404
+from django.utils.cache import patch_vary_headers
+from rest_framework import status
+from rest_framework.exceptions import AuthenticationFailed, MethodNotAllowed, NotAuthenticated
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.views import APIView, exception_handler
+from .authentication import aauthenticate
+from .cache import cached_response
+from .expand import get_expand_dependencies, get_plan
+from .pagination import CountingLimitOffsetPagination, get_paginator
+from .models import Address, HealthCareProvider, HealthCareOrganization, Affiliation
+from .locations import filter_addresses, get_location_dependencies, get_location_filters
+from .graph import get_graph_walk, get_neighbours_data, get_path_data
+from .network import HCO, HCP, NODE_MODELS, get_network, get_network_params
+from .plans import ADDRESS_PLAN, AFFILIATION_PLAN, ORGANIZATION_PLAN, PROVIDER_PLAN
+from .renderers import FastJSONRenderer
+from .routers import aload_pin
+from .search import get_search_data
+from .views import RESPONSE_HEADERS, build_multi_get_response, get_path_params, build_return_response, get_addresses_query_set, get_affiliations_query_set, get_organizations_query_set, get_providers_query_set, get_requested_ids
+
+# doc: https://docs.djangoproject.com/en/4.2/topics/async/
+# doc: https://docs.djangoproject.com/en/4.2/topics/db/queries/#asynchronous-queries
+# async versions of the read endpoints of views.py, served under ASGI (see api/asgi.py and urls.py):
+# a request waiting on the database does not hold a worker thread.
+# DRF views are sync only, so @async_api_view does what @api_view + the authentication/permission
+# decorators do, and the responses (body, status, headers) are the same as the sync views
+
+
+def handle_exception(exc):
+    if isinstance(exc, (NotAuthenticated, AuthenticationFailed)):
+        # SessionAuthentication comes first and has no WWW-Authenticate header, so DRF answers 403
+        exc.status_code = status.HTTP_403_FORBIDDEN
+    response = exception_handler(exc, {})
+    if response is None:
+        raise exc
+    return response
+
+
+def finalize_response(response):
+    # rendered by Django (SimpleTemplateResponse), as DRF would with the JSON renderer
+    if isinstance(response, Response):
+        response.accepted_renderer = FastJSONRenderer()
+        response.accepted_media_type = FastJSONRenderer.media_type
+        response.renderer_context = {}
+    response['Allow'] = 'GET, OPTIONS'
+    patch_vary_headers(response, ('Accept',))
+    return response
+
+
+def get_options_metadata(view):
+    # what DRF answers to OPTIONS for the @api_view of the same name (views.py)
+    api_view = type(view.__name__, (APIView,), {'__doc__': view.__doc__})()
+    return api_settings.DEFAULT_METADATA_CLASS().determine_metadata(None, api_view)
+
+
+def async_api_view(view):
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        try:
+            # authenticated first, as DRF does for every method
+            request.user = await aauthenticate(request)
+            await aload_pin(request)
+            if request.method == 'OPTIONS':
+                response = Response(get_options_metadata(view))
+            elif request.method not in ('GET', 'HEAD'):
+                raise MethodNotAllowed(request.method)
+            else:
+                response = await view(Request(request), *args, **kwargs)
+        except Exception as exc:
+            response = handle_exception(exc)
+        return finalize_response(response)
+    return wrapper
+
+
+async def paginate(paginator, query_set, request, plan):
+    data = await paginator.apaginate_queryset(plan.rows(query_set), request)
+    return build_return_response(paginator.get_paginated_response(plan.serialize(data)))
+
+
+async def multi_get(model, plan, request):
+    ids = get_requested_ids(request)
+    rows = [row async for row in plan.rows(model.objects.filter(id__in=ids))]
+    return build_multi_get_response(plan, rows, ids)
+
+
+@async_api_view
+@cached_response(HealthCareProvider, get_expand_dependencies, get_location_dependencies)
+async def get_all_providers(request):
+    return await paginate(get_paginator(request), get_providers_query_set(request), request, get_plan(request, PROVIDER_PLAN))
+
+
+@async_api_view
+@cached_response(HealthCareOrganization, get_expand_dependencies, get_location_dependencies)
+async def get_all_organizations(request):
+    return await paginate(get_paginator(request), get_organizations_query_set(request), request, get_plan(request, ORGANIZATION_PLAN))
+
+
+@async_api_view
+@cached_response(Address)
+async def get_all_addresses(request):
+    return await paginate(get_paginator(request), get_addresses_query_set(request), request, ADDRESS_PLAN)
+
+
+@async_api_view
+@cached_response(Affiliation)
+async def get_all_affiliations(request):
+    return await paginate(get_paginator(request), get_affiliations_query_set(request), request, AFFILIATION_PLAN)
+
+
+@async_api_view
+@cached_response(HealthCareProvider)
+async def get_providers_by_ids(request):
+    return await multi_get(HealthCareProvider, PROVIDER_PLAN, request)
+
+
+@async_api_view
+@cached_response(HealthCareOrganization)
+async def get_organizations_by_ids(request):
+    return await multi_get(HealthCareOrganization, ORGANIZATION_PLAN, request)
+
+
+@async_api_view
+@cached_response(Address)
+async def get_addresses_by_ids(request):
+    return await multi_get(Address, ADDRESS_PLAN, request)
+
+
+@async_api_view
+@cached_response(Affiliation)
+async def get_affiliations_by_ids(request):
+    return await multi_get(Affiliation, AFFILIATION_PLAN, request)
+
+
+@async_api_view
+@cached_response((HealthCareOrganization, 'organization_id'), get_expand_dependencies)
+async def get_healthcare_organization_by_id(request, organization_id):
+    plan = get_plan(request, ORGANIZATION_PLAN)
+    row = await plan.rows(HealthCareOrganization.objects.filter(id=organization_id)).afirst()
+    if row is None:
+        raise Http404("Healthcare organization does not exist")
+
+    return Response(plan.serialize_one(row), status=200, headers=RESPONSE_HEADERS)
+
+
+@async_api_view
+@cached_response((Affiliation, 'affiliation_id'))
+async def get_affiliation_by_id(request, affiliation_id):
+    row = await AFFILIATION_PLAN.rows(Affiliation.objects.filter(id=affiliation_id)).afirst()
+    if row is None:
+        raise Http404("Affiliation does not exist")
+
+    return Response(AFFILIATION_PLAN.serialize_one(row), status=200, headers=RESPONSE_HEADERS)
+
+
+@async_api_view
+@cached_response((HealthCareOrganization, 'organization_id'))
+async def get_healthcare_addresses_by_organization_by_id(request, organization_id):
+    query_set = filter_addresses(Address.objects.filter(healthcareorganization=organization_id).order_by('id'), get_location_filters(request))
+
+    paginator = CountingLimitOffsetPagination()
+    data = await paginator.apaginate_queryset(ADDRESS_PLAN.rows(query_set), request)
+    if not data and not await HealthCareOrganization.objects.filter(id=organization_id).aexists():
+        raise Http404("Heathcare organization addresses do not exist")
+
+    return build_return_response(paginator.get_paginated_response(ADDRESS_PLAN.serialize(data)))
+
+
+@async_api_view
+@cached_response((HealthCareProvider, 'provider_id'), get_expand_dependencies)
+async def get_healthcare_provider_by_id(request, provider_id):
+    plan = get_plan(request, PROVIDER_PLAN)
+    row = await plan.rows(HealthCareProvider.objects.filter(id=provider_id)).afirst()
+    if row is None:
+        raise Http404("Heathcare provider does not exist")
+
+    return Response(plan.serialize_one(row), status=200, headers=RESPONSE_HEADERS)
+
+
+@async_api_view
+@cached_response((HealthCareProvider, 'provider_id'))
+async def get_healthcare_addresses_by_provider_by_id(request, provider_id):
+    query_set = filter_addresses(Address.objects.filter(healthcareprovider=provider_id).order_by('id'), get_location_filters(request))
+
+    paginator = CountingLimitOffsetPagination()
+    data = await paginator.apaginate_queryset(ADDRESS_PLAN.rows(query_set), request)
+    if not data and not await HealthCareProvider.objects.filter(id=provider_id).aexists():
+        raise Http404("Healthcare addresses do not exist")
+
+    return build_return_response(paginator.get_paginated_response(ADDRESS_PLAN.serialize(data)))
+
+
+@async_api_view
+@cached_response((HealthCareOrganization, 'organization_id'), (Address, 'address_id'))
+async def get_healthcare_organization_address_by_id(request, organization_id, address_id):
+    row = await ADDRESS_PLAN.rows(Address.objects.filter(healthcareorganization=organization_id, id=address_id)).afirst()
+    if row is None:
+        raise Http404("Healthcare organization address does not exist")
+
+    return Response(ADDRESS_PLAN.serialize_one(row), status=200, headers=RESPONSE_HEADERS)
+
+
+@async_api_view
+@cached_response((HealthCareProvider, 'provider_id'), (Address, 'address_id'))
+async def get_healthcare_provider_address_by_id(request, provider_id, address_id):
+    row = await ADDRESS_PLAN.rows(Address.objects.filter(healthcareprovider=provider_id, id=address_id)).afirst()
+    if row is None:
+        raise Http404("Healthcare provider address does not exist")
+
+    return Response(ADDRESS_PLAN.serialize_one(row), status=200, headers=RESPONSE_HEADERS)
+
+
+@async_api_view
+@cached_response((HealthCareProvider, 'provider_id'))
+async def get_healthcare_provider_affiliations(request, provider_id):
+    if not await HealthCareProvider.objects.filter(id=provider_id).aexists():
+        raise Http404("Heathcare provider does not exist")
+
+    return await paginate(CountingLimitOffsetPagination(), Affiliation.filter_by_provider(provider_id), request, AFFILIATION_PLAN)
+
+
+@async_api_view
+@cached_response((HealthCareOrganization, 'organization_id'))
+async def get_healthcare_organization_affiliations(request, organization_id):
+    if not await HealthCareOrganization.objects.filter(id=organization_id).aexists():
+        raise Http404("Heathcare organization does not exist")
+
+    return await paginate(CountingLimitOffsetPagination(), Affiliation.filter_by_organization(organization_id), request, AFFILIATION_PLAN)
+
+
+@async_api_view
+@cached_response(HealthCareProvider, HealthCareOrganization, Affiliation)
+async def get_healthcare_provider_network(request, provider_id):
+    if not await HealthCareProvider.objects.filter(id=provider_id).aexists():
+        raise Http404("Heathcare provider does not exist")
+
+    # raw recursive query, no async cursor in Django 4.2
+    depth, status_filter = get_network_params(request)
+    network = await sync_to_async(get_network)((HCP, int(provider_id)), depth, status_filter, walk=get_graph_walk())
+    return Response(network, status=200, headers=RESPONSE_HEADERS)
+
+
+@async_api_view
+@cached_response(HealthCareProvider, HealthCareOrganization, Affiliation)
+async def get_healthcare_organization_network(request, organization_id):
+    if not await HealthCareOrganization.objects.filter(id=organization_id).aexists():
+        raise Http404("Heathcare organization does not exist")
+
+    depth, status_filter = get_network_params(request)
+    network = await sync_to_async(get_network)((HCO, int(organization_id)), depth, status_filter, walk=get_graph_walk())
+    return Response(network, status=200, headers=RESPONSE_HEADERS)
+
+
+@async_api_view
+@cached_response(HealthCareProvider, HealthCareOrganization, Affiliation)
+async def get_healthcare_provider_neighbours(request, provider_id):
+    if not await HealthCareProvider.objects.filter(id=provider_id).aexists():
+        raise Http404("Heathcare provider does not exist")
+
+    # the index is built (queries) on first use
+    neighbours = await sync_to_async(get_neighbours_data)((HCP, int(provider_id)), request.query_params.get('status', 'A'))
+    return Response(neighbours, status=200, headers=RESPONSE_HEADERS)
+
+
+@async_api_view
+@cached_response(HealthCareProvider, HealthCareOrganization, Affiliation)
+async def get_healthcare_organization_neighbours(request, organization_id):
+    if not await HealthCareOrganization.objects.filter(id=organization_id).aexists():
+        raise Http404("Heathcare organization does not exist")
+
+    neighbours = await sync_to_async(get_neighbours_data)((HCO, int(organization_id)), request.query_params.get('status', 'A'))
+    return Response(neighbours, status=200, headers=RESPONSE_HEADERS)
+
+
+@async_api_view
+@cached_response(HealthCareProvider, HealthCareOrganization, Affiliation)
+async def get_affiliation_path(request):
+    source, target, status_filter, max_depth = get_path_params(request)
+    for kind, id in (source, target):
+        if not await NODE_MODELS[kind].objects.filter(id=id).aexists():
+            raise Http404(f"{kind} {id} does not exist")
+
+    path = await sync_to_async(get_path_data)(source, target, status_filter, max_depth)
+    return Response(path, status=200, headers=RESPONSE_HEADERS)
+
+
+@async_api_view
+@cached_response(HealthCareProvider)
+async def search_providers(request):
+    # raw query on PostgreSQL, no async cursor in Django 4.2
+    results = await sync_to_async(get_search_data)(request, HealthCareProvider)
+    return Response(results, status=200, headers=RESPONSE_HEADERS)
+
+
+@async_api_view
+@cached_response(HealthCareOrganization)
+async def search_organizations(request):
+    results = await sync_to_async(get_search_data)(request, HealthCareOrganization)
+    return Response(results, status=200, headers=RESPONSE_HEADERS)
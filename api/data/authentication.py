@@ -0,0 +1,269 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from copy import copy
+from functools import partial
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user, get_user_model
+from django.contrib.auth.signals import user_logged_out
+from django.core import signing
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authentication import SessionAuthentication, TokenAuthentication, get_authorization_header
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import AuthenticationFailed, NotAuthenticated
+from .versions import bump, get_cache, get_versions
+from .timing import timed
+
+# doc: https://docs.djangoproject.com/en/4.2/topics/async/#async-safety
+# doc: https://www.django-rest-framework.org/api-guide/authentication/#custom-authentication
+# doc: https://docs.djangoproject.com/en/4.2/topics/signing/
+# doc: https://docs.djangoproject.com/en/4.2/topics/db/transactions/#performing-actions-after-commit
+# authentication of the views: SessionAuthentication then TokenAuthentication, with the same
+# error messages, and the stateless signed tokens when enabled (DATA_SIGNED_TOKENS).
+# Resolved sessions and tokens are kept in a bounded in-process LRU for DATA_AUTH_CACHE_TIMEOUT
+# seconds, so most requests authenticate without a query. Entries hold the generation of their
+# user (auth:user:<id>, versions.py, shared by the processes), bumped by the signals below once
+# a token deletion, a user change (deactivation, password) or a logout commits: the entries of
+# that user are then dropped, the other users keep theirs.
+# Session expiry is not tracked, an expired session keeps working until its entry expires.
+# aauthenticate is the async counterpart used by async_views.py: DRF authentication classes are
+# sync (lazy request.user, Token.objects.get), so they cannot run inside async views, it runs
+# the same lookups through sync_to_async
+
+TOKEN_KEYWORD = b'token'
+SIGNED_TOKEN_KEYWORD = b'bearer'
+SIGNED_TOKEN_SALT = 'data.authentication'
+
+User = get_user_model()
+
+
+class AuthCache:
+    # LRU of cache key -> (expiry, generation of the user, (user, auth))
+    def __init__(self):
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        if not is_enabled():
+            return None
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+        if entry is None:
+            return None
+        expires_at, generation, (user, auth) = entry
+        if expires_at < time.monotonic() or generation != get_auth_generation(user.pk):
+            self.discard(key)
+            return None
+        # a copy, the request may change its user
+        return copy(user), auth
+
+    def set(self, key, result):
+        # generation read once the credentials are resolved (their user is needed): the bumps run after
+        # their change commits, only a change committing while the credentials are read is missed (until expiry)
+        if not is_enabled():
+            return
+        generation = get_auth_generation(result[0].pk)
+        expires_at = time.monotonic() + getattr(settings, 'DATA_AUTH_CACHE_TIMEOUT', 60)
+        with self.lock:
+            self.entries[key] = (expires_at, generation, result)
+            self.entries.move_to_end(key)
+            while len(self.entries) > getattr(settings, 'DATA_AUTH_CACHE_MAX_ENTRIES', 10000):
+                self.entries.popitem(last=False)
+
+    def discard(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+_cache = AuthCache()
+
+
+def is_enabled():
+    return getattr(settings, 'DATA_AUTH_CACHE', True)
+
+
+def auth_generation_key(user_id):
+    return f'auth:user:{user_id}'
+
+
+def get_auth_generation(user_id):
+    return get_versions([auth_generation_key(user_id)])[0]
+
+
+def bump_auth_generation(user_id):
+    bump([auth_generation_key(user_id)])
+
+
+def reset_auth_cache():
+    _cache.clear()
+
+
+def session_cache_key(session_key):
+    return f'session:{session_key}'
+
+
+def token_cache_key(key):
+    # no raw credentials kept in memory
+    return f'token:{hashlib.sha256(key.encode()).hexdigest()}'
+
+
+def get_session_key(request):
+    return request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+
+
+# signed tokens: the user id and the issue time signed with SECRET_KEY, checked without a query.
+# A token is valid DATA_SIGNED_TOKEN_MAX_AGE seconds; a user change revokes the tokens issued before
+# it (revocation time kept in the data cache, no database), a token can not be revoked on its own
+
+def is_signed_tokens_enabled():
+    return getattr(settings, 'DATA_SIGNED_TOKENS', False)
+
+
+def get_signed_token_max_age():
+    return getattr(settings, 'DATA_SIGNED_TOKEN_MAX_AGE', 3600)
+
+
+def revoked_key(user_id):
+    return f'auth:revoked:{user_id}'
+
+
+def create_signed_token(user):
+    return signing.dumps({'id': user.pk, 'username': user.get_username(), 'iat': time.time()}, salt=SIGNED_TOKEN_SALT, compress=True)
+
+
+def get_signed_token_user(key):
+    try:
+        payload = signing.loads(key, salt=SIGNED_TOKEN_SALT, max_age=get_signed_token_max_age())
+    except signing.BadSignature:
+        raise AuthenticationFailed('Invalid token.')
+    revoked_at = get_cache().get(revoked_key(payload['id']))
+    if revoked_at is not None and payload['iat'] <= revoked_at:
+        raise AuthenticationFailed('Invalid token.')
+    # not saved, the views only need an authenticated user
+    return User(id=payload['id'], username=payload['username'], is_active=True)
+
+
+def revoke_signed_tokens(user_id):
+    get_cache().set(revoked_key(user_id), time.time(), get_signed_token_max_age())
+
+
+class CachedSessionAuthentication(SessionAuthentication):
+    @timed('auth')
+    def authenticate(self, request):
+        session_key = get_session_key(request._request)
+        if not session_key:
+            return None
+        result = _cache.get(session_cache_key(session_key))
+        if result is None:
+            # loads the session and its user (request.user of AuthenticationMiddleware)
+            result = super().authenticate(request)
+            if result is not None:
+                _cache.set(session_cache_key(session_key), result)
+            return result
+
+        self.enforce_csrf(request)
+        return result
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    @timed('auth')
+    def authenticate_credentials(self, key):
+        result = _cache.get(token_cache_key(key))
+        if result is None:
+            result = super().authenticate_credentials(key)
+            _cache.set(token_cache_key(key), result)
+        return result
+
+
+class SignedTokenAuthentication(TokenAuthentication):
+    # Authorization: Bearer <signed token>
+    keyword = 'Bearer'
+
+    def authenticate(self, request):
+        if not is_signed_tokens_enabled():
+            return None
+        return super().authenticate(request)
+
+    @timed('auth')
+    def authenticate_credentials(self, key):
+        return get_signed_token_user(key), key
+
+
+AUTHENTICATION_CLASSES = [CachedSessionAuthentication, CachedTokenAuthentication, SignedTokenAuthentication]
+
+
+def get_token_credentials(request):
+    # (keyword, key) of the Authorization header, same errors as TokenAuthentication
+    auth = get_authorization_header(request).split()
+    keywords = (TOKEN_KEYWORD, SIGNED_TOKEN_KEYWORD) if is_signed_tokens_enabled() else (TOKEN_KEYWORD,)
+    if not auth or auth[0].lower() not in keywords:
+        raise NotAuthenticated()
+    if len(auth) == 1:
+        raise AuthenticationFailed('Invalid token header. No credentials provided.')
+    if len(auth) > 2:
+        raise AuthenticationFailed('Invalid token header. Token string should not contain spaces.')
+    try:
+        return auth[0].lower(), auth[1].decode()
+    except UnicodeError:
+        raise AuthenticationFailed('Invalid token header. Token string should not contain invalid characters.')
+
+
+def get_session_user(request, session_key):
+    # the active user of the session, None when it has none
+    result = _cache.get(session_cache_key(session_key))
+    if result is not None:
+        return result[0]
+    user = get_user(request)
+    if user.is_authenticated and user.is_active:
+        _cache.set(session_cache_key(session_key), (user, None))
+        return user
+    return None
+
+
+@timed('auth')
+async def aauthenticate(request):
+    # returns the authenticated user, raises NotAuthenticated / AuthenticationFailed.
+    # The lookups run in a thread: the data cache (file based by default) blocks on file I/O
+    session_key = get_session_key(request)
+    if session_key:
+        user = await sync_to_async(get_session_user)(request, session_key)
+        if user is not None:
+            return user
+
+    keyword, key = get_token_credentials(request)
+    if keyword == SIGNED_TOKEN_KEYWORD:
+        return await sync_to_async(get_signed_token_user)(key)
+    user, _ = await sync_to_async(CachedTokenAuthentication().authenticate_credentials)(key)
+    return user
+
+
+@receiver(post_delete, sender=Token)
+def handle_token_deleted(sender, instance, using, **kwargs):
+    transaction.on_commit(partial(bump_auth_generation, instance.user_id), using=using)
+
+
+@receiver(user_logged_out)
+def handle_logged_out(sender, user, **kwargs):
+    # the session is flushed, its entries in the other processes go with the user generation
+    if user is not None:
+        transaction.on_commit(partial(bump_auth_generation, user.pk))
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def handle_user_changed(sender, instance, using, created=False, update_fields=None, **kwargs):
+    # a new user has no cached credentials, a login only updates last_login
+    if created or (update_fields is not None and set(update_fields) == {'last_login'}):
+        return
+    transaction.on_commit(partial(bump_auth_generation, instance.pk), using=using)
+    transaction.on_commit(partial(revoke_signed_tokens, instance.pk), using=using)
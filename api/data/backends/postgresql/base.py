@@ -0,0 +1,126 @@
+import os
+import threading
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.base.base import NO_DB_ALIAS
+from django.db.backends.postgresql import base
+from django.db.backends.postgresql.psycopg_any import IsolationLevel, is_psycopg3
+from .creation import DatabaseCreation
+
+try:
+    from psycopg_pool import ConnectionPool
+except ImportError:  # optional, required by OPTIONS['pool'] only
+    ConnectionPool = None
+
+# doc: https://www.psycopg.org/psycopg3/docs/advanced/pool.html
+# doc: https://www.psycopg.org/psycopg3/docs/advanced/prepare.html
+# doc: https://docs.djangoproject.com/en/4.2/ref/databases/#server-side-parameters-binding
+# PostgreSQL backend (ENGINE 'data.backends.postgresql') with a psycopg 3 connection pool per
+# process and database alias, the pool of Django 5.1 for Django 4.2. OPTIONS['pool'] holds the
+# psycopg_pool.ConnectionPool arguments (min_size, max_size, timeout, max_lifetime, max_idle...),
+# without it the backend is the default one. Django takes a connection from the pool when a request
+# first queries and gives it back at the end of the request (CONN_MAX_AGE must be 0), so a request
+# only pays a connection setup when the pool grows or recycles one (max_lifetime). With
+# CONN_HEALTH_CHECKS the pool checks a connection before handing it out.
+# Prepared statements: with OPTIONS server_side_binding and prepare_threshold (see settings.py), a
+# query shape executed prepare_threshold times on a connection is prepared on the server, a pooled
+# connection lives long enough to reuse its prepared statements (OPTIONS['prepared_max'] per connection)
+
+DEFAULT_PREPARED_MAX = 100
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    creation_class = DatabaseCreation
+    # alias -> ConnectionPool of the process
+    _connection_pools = {}
+    _pools_lock = threading.Lock()
+
+    @property
+    def pool(self):
+        options = self.settings_dict['OPTIONS'].get('pool')
+        if self.alias == NO_DB_ALIAS or not options:
+            return None
+        pool = self._connection_pools.get(self.alias)
+        if pool is None:
+            check_pool_settings(self.settings_dict)
+            connect_kwargs = self.get_connection_params()
+            # Django sets autocommit when it gets the connection, a connection given back in a
+            # transaction is rolled back by the pool
+            connect_kwargs['autocommit'] = True
+            with self._pools_lock:
+                pool = self._connection_pools.get(self.alias)
+                if pool is None:
+                    pool = self._connection_pools[self.alias] = ConnectionPool(
+                        kwargs=connect_kwargs,
+                        # opened on first use, not at import (forked workers)
+                        open=False,
+                        check=ConnectionPool.check_connection if self.settings_dict['CONN_HEALTH_CHECKS'] else None,
+                        name=f'data-{self.alias}',
+                        **options,
+                    )
+        return pool
+
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        params.pop('pool', None)
+        params.pop('prepared_max', None)
+        return params
+
+    def get_new_connection(self, conn_params):
+        pool = self.pool
+        if pool is None:
+            connection = super().get_new_connection(conn_params)
+        else:
+            connection = self.get_pool_connection(pool)
+        if is_psycopg3:
+            connection.prepared_max = self.settings_dict['OPTIONS'].get('prepared_max', DEFAULT_PREPARED_MAX)
+        return connection
+
+    def get_pool_connection(self, pool):
+        # as the default backend, the isolation level is set before autocommit
+        isolation_level = self.settings_dict['OPTIONS'].get('isolation_level')
+        try:
+            self.isolation_level = IsolationLevel(isolation_level) if isolation_level is not None else IsolationLevel.READ_COMMITTED
+        except ValueError:
+            raise ImproperlyConfigured(f'Invalid transaction isolation level {isolation_level} specified.')
+        if pool.closed:
+            pool.open()
+        connection = pool.getconn()
+        if isolation_level is not None:
+            connection.isolation_level = self.isolation_level
+        return connection
+
+    def _close(self):
+        if self.connection is None or self.pool is None:
+            return super()._close()
+        with self.wrap_database_errors:
+            # back to the pool it was taken from
+            self.connection._pool.putconn(self.connection)
+            self.connection = None
+
+    def close_pool(self):
+        with self._pools_lock:
+            pool = self._connection_pools.pop(self.alias, None)
+        if pool is not None:
+            pool.close()
+
+
+def check_pool_settings(settings_dict):
+    if ConnectionPool is None or not is_psycopg3:
+        raise ImproperlyConfigured("OPTIONS['pool'] requires psycopg 3 and psycopg_pool (pip install 'psycopg[binary]' psycopg-pool)")
+    if settings_dict['CONN_MAX_AGE'] != 0:
+        raise ImproperlyConfigured("OPTIONS['pool'] requires CONN_MAX_AGE = 0, connections are kept by the pool")
+
+
+# pools inherited by a forked process (ingest_data workers, gunicorn --preload): their connections
+# belong to the parent, closing them would end the parent sessions. The child forgets the pools and
+# keeps them referenced (never garbage collected), its own pools are created on first use
+_inherited_pools = []
+
+
+def forget_pools():
+    _inherited_pools.extend(DatabaseWrapper._connection_pools.values())
+    DatabaseWrapper._connection_pools.clear()
+    DatabaseWrapper._pools_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=forget_pools)
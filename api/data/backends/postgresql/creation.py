@@ -0,0 +1,16 @@
+from django.db.backends.postgresql import creation
+
+
+class DatabaseCreation(creation.DatabaseCreation):
+    # the pool connects to the database NAME it was created with: closed before the test
+    # database replaces it, and before it is dropped (open connections would prevent it)
+
+    def create_test_db(self, *args, **kwargs):
+        self.connection.close()
+        self.connection.close_pool()
+        return super().create_test_db(*args, **kwargs)
+
+    def destroy_test_db(self, *args, **kwargs):
+        self.connection.close()
+        self.connection.close_pool()
+        return super().destroy_test_db(*args, **kwargs)
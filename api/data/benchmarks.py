@@ -0,0 +1,105 @@
+import http.client
+import json
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+# shared helpers for the benchmark_* management commands
+
+
+def percentile(values, q):
+    # nearest-rank percentile, q in [0, 100]
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, round(q / 100 * len(ordered) + 0.5) - 1))
+    return ordered[rank]
+
+
+def summarize(samples_ms):
+    return {
+        'runs': len(samples_ms),
+        'min_ms': min(samples_ms),
+        'mean_ms': statistics.fmean(samples_ms),
+        'p50_ms': percentile(samples_ms, 50),
+        'p95_ms': percentile(samples_ms, 95),
+        'p99_ms': percentile(samples_ms, 99),
+    }
+
+
+def measure(function, repeat=20, warmup=2):
+    for _ in range(warmup):
+        function()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        samples.append((time.perf_counter() - start) * 1000)
+    return summarize(samples)
+
+
+def write_results(filename, results):
+    with open(filename, 'w') as file:
+        json.dump(results, file, indent=2, sort_keys=True)
+
+
+def read_results(filename):
+    with open(filename) as file:
+        return json.load(file)
+
+
+def compare_results(baseline, results, metric='p50_ms'):
+    # {name: (baseline, current, ratio)} for the entries present in both
+    comparison = {}
+    for name, current in results.items():
+        if name in baseline and baseline[name].get(metric) and current.get(metric) is not None:
+            comparison[name] = (baseline[name][metric], current[metric], current[metric] / baseline[name][metric])
+    return comparison
+
+
+def run_load(urls, concurrency, duration, headers=None):
+    # closed-loop HTTP load: `concurrency` clients, each with its own keep-alive connection,
+    # sending GET requests back to back over `urls` for `duration` seconds
+    deadline = time.perf_counter() + duration
+    targets = [urlsplit(url) for url in urls]
+
+    def connect():
+        return http.client.HTTPConnection(targets[0].hostname, targets[0].port, timeout=60)
+
+    def client(position):
+        samples, errors = [], 0
+        connection = connect()
+        while time.perf_counter() < deadline:
+            target = targets[position % len(targets)]
+            position += 1
+            start = time.perf_counter()
+            try:
+                connection.request('GET', f'{target.path}?{target.query}' if target.query else target.path, headers=headers or {})
+                response = connection.getresponse()
+                response.read()
+            except (OSError, http.client.HTTPException):
+                errors += 1
+                connection.close()
+                connection = connect()
+                continue
+            if response.status >= 400:
+                errors += 1
+            else:
+                samples.append((time.perf_counter() - start) * 1000)
+        connection.close()
+        return samples, errors
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(client, range(concurrency)))
+    seconds = time.perf_counter() - start
+
+    samples = [sample for client_samples, _ in results for sample in client_samples]
+    summary = summarize(samples) if samples else {'runs': 0}
+    summary.update({
+        'concurrency': concurrency,
+        'errors': sum(errors for _, errors in results),
+        'rps': len(samples) / seconds,
+    })
+    return summary
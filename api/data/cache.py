@@ -0,0 +1,184 @@
+import hashlib
+import inspect
+import threading
+from collections import Counter
+from functools import wraps
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils.http import http_date, parse_etags, parse_http_date_safe
+from rest_framework.response import Response
+from .versions import EPOCH_KEY, generation_key, get_cache, get_versions, is_shared, version_key
+from .routers import is_fresh
+from .timing import timed
+
+# doc: https://docs.djangoproject.com/en/4.2/topics/cache/
+# doc: https://developer.mozilla.org/en-US/docs/Web/HTTP/Conditional_requests
+# read-through cache of the serialized response data of the GET endpoints.
+# Entries are keyed by the request URL and the versions of what the response depends on
+# (versions.py), writes bump those versions (signals.py) so stale entries are never read
+# again and simply expire (TIMEOUT) or get evicted (MAX_ENTRIES).
+# The same digest is the response ETag and the newest version its Last-Modified, so
+# conditional requests get a 304 without running the view (queries and serialization).
+# A response read from a replica that may miss the newest versions (routers.py) is neither
+# stored nor given validators. Without a shared cache backend (versions.is_shared) the versions
+# miss the writes of the other processes: no cache and no validators then
+
+IF_EXISTS = 'if-exists'
+
+_stats = Counter()
+_stats_lock = threading.Lock()
+
+
+def is_enabled():
+    return getattr(settings, 'DATA_RESPONSE_CACHE', True)
+
+
+def record(event):
+    with _stats_lock:
+        _stats[event] += 1
+
+
+def get_stats():
+    # counters of the current process
+    with _stats_lock:
+        hits, misses, not_modified = _stats['hit'], _stats['miss'], _stats['not_modified']
+    return {
+        'enabled': is_enabled(),
+        'hits': hits,
+        'misses': misses,
+        'not_modified': not_modified,
+        'hit_ratio': round(hits / (hits + misses), 4) if hits + misses else None,
+    }
+
+
+def reset_stats():
+    with _stats_lock:
+        _stats.clear()
+
+
+def get_dependency_keys(dependencies, kwargs, request=None):
+    # a model depends on the model generation, a (model, url kwarg) pair on the row version,
+    # a function on the dependencies it returns for the request (e.g. query params)
+    keys = [EPOCH_KEY]
+    for dependency in dependencies:
+        if inspect.isfunction(dependency):
+            keys.extend(get_dependency_keys(dependency(request), kwargs, request)[1:])
+        elif isinstance(dependency, tuple):
+            model, kwarg = dependency
+            keys.append(version_key(model, kwargs[kwarg]))
+        else:
+            keys.append(generation_key(dependency))
+    return keys
+
+
+def response_digest(request, versions):
+    # the absolute URL, pagination links in the response contain the host
+    key = '|'.join([request.build_absolute_uri(), *map(str, versions)])
+    return hashlib.md5(key.encode()).hexdigest()
+
+
+def is_not_modified(request, etag, last_modified):
+    # True, False or IF_EXISTS (If-None-Match: *, decided once the view ran)
+    # If-Modified-Since is only evaluated without If-None-Match (RFC 9110 13.2.2)
+    if_none_match = request.headers.get('If-None-Match')
+    if if_none_match:
+        etags = parse_etags(if_none_match)
+        if etag in etags or f'W/{etag}' in etags:
+            return True
+        return IF_EXISTS if '*' in etags else False
+    if_modified_since = request.headers.get('If-Modified-Since')
+    if if_modified_since:
+        if_modified_since = parse_http_date_safe(if_modified_since)
+        return if_modified_since is not None and last_modified <= if_modified_since
+    return False
+
+
+@timed('cache')
+def get_validators(request, dependencies, arguments):
+    versions = get_versions(get_dependency_keys(dependencies, arguments, request))
+    digest = response_digest(request, versions)
+    # versions are ns timestamps, HTTP dates have a 1 second resolution
+    last_modified = max(versions) // 1_000_000_000
+    validators = {'ETag': f'"{digest}"', 'Last-Modified': http_date(last_modified)}
+    return f'response:{digest}', validators, is_not_modified(request, validators['ETag'], last_modified), max(versions)
+
+
+@timed('cache')
+def get_cached_response(key):
+    cached = get_cache().get(key)
+    if cached is None:
+        record('miss')
+        return None
+    record('hit')
+    data, status, headers = cached
+    return Response(data, status=status, headers=headers)
+
+
+@timed('cache')
+def set_cached_response(key, response):
+    if response.status_code == 200:
+        get_cache().set(key, (response.data, response.status_code, dict(response.headers)))
+
+
+def add_validators(response, validators):
+    if response.status_code == 200:
+        for header, value in validators.items():
+            response[header] = value
+    return response
+
+
+def not_modified_response(validators):
+    record('not_modified')
+    return Response(status=304, headers=validators)
+
+
+def finish_response(response, key, validators, not_modified, version, cached):
+    # If-None-Match: * only holds for a resource that exists, the view tells
+    if not_modified == IF_EXISTS and response.status_code == 200:
+        return not_modified_response(validators)
+    if not cached:
+        if not is_fresh(version):
+            return response
+        if is_enabled():
+            set_cached_response(key, response)
+    return add_validators(response, validators)
+
+
+def cached_response(*dependencies):
+    # goes below @permission_classes (@async_api_view for async views), so only
+    # authenticated requests reach the cache.
+    # note: async views reach the cache backend through sync_to_async, the file based
+    # backend (default) would block the event loop on its file I/O
+    def decorator(view):
+        signature = inspect.signature(view)
+
+        if inspect.iscoroutinefunction(view):
+            @wraps(view)
+            async def async_wrapper(request, *args, **kwargs):
+                if request.method not in ('GET', 'HEAD') or not is_shared():
+                    return await view(request, *args, **kwargs)
+
+                key, validators, not_modified, version = await sync_to_async(get_validators)(request, dependencies, signature.bind(request, *args, **kwargs).arguments)
+                if not_modified is True:
+                    return not_modified_response(validators)
+                response = await sync_to_async(get_cached_response)(key) if is_enabled() else None
+                if response is not None:
+                    return finish_response(response, key, validators, not_modified, version, cached=True)
+                response = await view(request, *args, **kwargs)
+                return await sync_to_async(finish_response)(response, key, validators, not_modified, version, cached=False)
+            return async_wrapper
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD') or not is_shared():
+                return view(request, *args, **kwargs)
+
+            key, validators, not_modified, version = get_validators(request, dependencies, signature.bind(request, *args, **kwargs).arguments)
+            if not_modified is True:
+                return not_modified_response(validators)
+            response = get_cached_response(key) if is_enabled() else None
+            if response is not None:
+                return finish_response(response, key, validators, not_modified, version, cached=True)
+            return finish_response(view(request, *args, **kwargs), key, validators, not_modified, version, cached=False)
+        return wrapper
+    return decorator
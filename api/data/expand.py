@@ -0,0 +1,95 @@
+from django.db.models import Prefetch
+from rest_framework.exceptions import ValidationError
+from .models import Address, HealthCareProvider, HealthCareOrganization, Affiliation
+from .plans import ADDRESS_PLAN, AFFILIATION_LINK_COLUMNS, AFFILIATION_PLAN, NO_LINK_COLUMNS, ORGANIZATION_PLAN, PROVIDER_PLAN
+from .timing import timed
+
+# doc: https://docs.djangoproject.com/en/4.2/ref/models/querysets/#prefetch-objects
+# compound responses of the HCP/HCO endpoints (?expand=addresses,affiliations,affiliations.child):
+# the related rows of the whole page are loaded with one prefetch query per relation, and the
+# linked entities are joined to the affiliations, so the number of queries does not depend on
+# the page size nor on the fan-out. Without `expand` the endpoints keep their field plan
+
+EXPAND_QUERY_PARAM = 'expand'
+EXPANSIONS = ('addresses', 'affiliations', 'affiliations.parent', 'affiliations.child')
+LINK_SIDES = ('parent', 'child')
+
+# entity model -> reverse relations (related_name) of the affiliations where it is the parent, the child
+AFFILIATION_RELATIONS = {
+    HealthCareProvider: ('parent_hcp_link', 'child_hcp_link'),
+    HealthCareOrganization: ('parent_hco_link', 'child_hco_link'),
+}
+# affiliation link column -> plan of the linked entity
+LINK_PLANS = {
+    'parent_hcp_link_id': PROVIDER_PLAN,
+    'child_hcp_link_id': PROVIDER_PLAN,
+    'parent_hco_link_id': ORGANIZATION_PLAN,
+    'child_hco_link_id': ORGANIZATION_PLAN,
+}
+# an expanded response embeds rows of all the models, a write to any of them invalidates it
+EXPAND_DEPENDENCIES = (HealthCareProvider, HealthCareOrganization, Address, Affiliation)
+
+
+def get_expansions(request):
+    value = request.query_params.get(EXPAND_QUERY_PARAM, '')
+    expansions = {name.strip() for name in value.split(',') if name.strip()}
+    if not expansions.issubset(EXPANSIONS):
+        raise ValidationError({EXPAND_QUERY_PARAM: f'Must be a comma separated list of {", ".join(EXPANSIONS)}.'})
+    # expanding the affiliation links expands the affiliations
+    if expansions.intersection(f'affiliations.{side}' for side in LINK_SIDES):
+        expansions.add('affiliations')
+    return frozenset(expansions)
+
+
+def get_expand_dependencies(request):
+    # cached_response dependency of the HCP/HCO endpoints
+    return EXPAND_DEPENDENCIES if request.GET.get(EXPAND_QUERY_PARAM) else ()
+
+
+def get_plan(request, plan):
+    # plan of an HCP/HCO endpoint for the `expand` query param of the request
+    expansions = get_expansions(request)
+    return ExpandedPlan(plan, expansions) if expansions else plan
+
+
+class ExpandedPlan:
+    # same interface as FieldPlan, on model instances with their prefetched relations
+
+    def __init__(self, plan, expansions):
+        self.plan = plan
+        self.expansions = expansions
+
+    def rows(self, query_set):
+        lookups = []
+        if 'addresses' in self.expansions:
+            lookups.append(Prefetch('addresses', queryset=Address.objects.order_by('id'), to_attr='expanded_addresses'))
+        if 'affiliations' in self.expansions:
+            links = [f'{side}_{entity}_link' for side in LINK_SIDES if f'affiliations.{side}' in self.expansions for entity in ('hcp', 'hco')]
+            parent_relation, child_relation = AFFILIATION_RELATIONS[query_set.model]
+            lookups.append(Prefetch(parent_relation, queryset=Affiliation.objects.select_related(*links).order_by('id'), to_attr='expanded_parent_affiliations'))
+            lookups.append(Prefetch(child_relation, queryset=Affiliation.objects.select_related(*links).order_by('id'), to_attr='expanded_child_affiliations'))
+        return query_set.prefetch_related(*lookups)
+
+    @timed('serialize')
+    def serialize(self, instances):
+        return [self.serialize_one(instance) for instance in instances]
+
+    @timed('serialize')
+    def serialize_one(self, instance):
+        data = self.plan.serialize_one(self.plan.from_instance(instance))
+        if 'addresses' in self.expansions:
+            data['addresses'] = [ADDRESS_PLAN.serialize_one(ADDRESS_PLAN.from_instance(address)) for address in instance.expanded_addresses]
+        if 'affiliations' in self.expansions:
+            # as the affiliation endpoints: the entity is the parent or the child, ordered by id
+            affiliations = {affiliation.id: affiliation for affiliation in instance.expanded_parent_affiliations + instance.expanded_child_affiliations}
+            data['affiliations'] = [self.serialize_affiliation(affiliations[id]) for id in sorted(affiliations)]
+        return data
+
+    def serialize_affiliation(self, affiliation):
+        data = AFFILIATION_PLAN.serialize_one(AFFILIATION_PLAN.from_instance(affiliation))
+        for side, column in zip(LINK_SIDES, AFFILIATION_LINK_COLUMNS.get(affiliation.type, NO_LINK_COLUMNS)):
+            if f'affiliations.{side}' in self.expansions:
+                # joined by select_related, no query
+                entity = getattr(affiliation, column.removesuffix('_id')) if column else None
+                data[side] = None if entity is None else LINK_PLANS[column].serialize_one(LINK_PLANS[column].from_instance(entity))
+        return data
@@ -0,0 +1,44 @@
+from itertools import islice
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
+from .renderers import FastJSONRenderer
+
+# doc: https://docs.djangoproject.com/en/4.2/ref/request-response/#streaminghttpresponse-objects
+# doc: https://docs.djangoproject.com/en/4.2/ref/models/querysets/#iterator
+# doc: https://docs.djangoproject.com/en/4.2/ref/request-response/#streaming-behavior
+# full-table exports as NDJSON (one JSON object per line). Rows are read with a chunked
+# server-side cursor (PostgreSQL) and written as they are serialized, so the worker memory
+# stays bounded by the chunk size whatever the table size.
+# The ASGI handler reads a sync iterator into a list before sending it (whole export in memory):
+# under ASGI the response gets an async iterator reading each chunk in the thread of the view
+# (thread sensitive sync_to_async, the one holding the connection and its cursor)
+
+NDJSON_CONTENT_TYPE = 'application/x-ndjson'
+
+
+def iter_ndjson(query_set, plan, chunk_size):
+    # same representation (field plan) and encoding (renderer) as the paginated endpoints
+    renderer = FastJSONRenderer()
+    rows = plan.rows(query_set).iterator(chunk_size=chunk_size)
+    while chunk := list(islice(rows, chunk_size)):
+        yield b''.join(renderer.render(row) + b'\n' for row in plan.serialize(chunk))
+
+
+async def aiter_ndjson(chunks):
+    next_chunk = sync_to_async(next, thread_sensitive=True)
+    try:
+        while (chunk := await next_chunk(chunks, None)) is not None:
+            yield chunk
+    finally:
+        # closes the cursor when the client went away
+        await sync_to_async(chunks.close, thread_sensitive=True)()
+
+
+def build_export_response(request, query_set, plan):
+    chunk_size = getattr(settings, 'DATA_EXPORT_CHUNK_SIZE', 2000)
+    chunks = iter_ndjson(query_set, plan, chunk_size)
+    if isinstance(getattr(request, '_request', request), ASGIRequest):
+        chunks = aiter_ndjson(chunks)
+    return StreamingHttpResponse(chunks, content_type=NDJSON_CONTENT_TYPE)
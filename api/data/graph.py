@@ -0,0 +1,399 @@
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from collections import defaultdict
+from functools import partial
+from itertools import accumulate, compress
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from rest_framework.exceptions import ValidationError
+from .models import Affiliation
+from .network import HCO, HCP, LINK_COLUMNS
+from .versions import get_generation, is_shared
+
+# in-process index of the affiliation graph, for neighbour, degree and shortest path queries
+# without SQL. Compressed sparse rows (CSR) of integer arrays:
+# - nodes: sorted node keys (id * 2, + 1 for an HCO), the position of a key is the node index
+# - offsets: the adjacency of node i is offsets[i]:offsets[i + 1] of the arrays below
+# - targets: node index of the other end, edge_ids: affiliation id, tags: type | status | direction
+# Every affiliation is in the adjacency of both ends (tagged OUTGOING on the parent side).
+# Writes through the ORM (signals below) go to a small overlay (added / removed affiliations) merged
+# in the queries and compacted into new arrays past DATA_GRAPH_INDEX_MAX_DELTA changes. Writes of
+# other processes (or bulk ingestion) change the Affiliation generation (versions.py), the index
+# is then rebuilt on its next use.
+# Memory: 26 bytes per affiliation (2 x (4 target + 8 edge id + 1 tag)) and 16 bytes per node
+# (key + offset), e.g. ~310 MB for 10M affiliations between 3M entities. The build reads the
+# affiliations into arrays first (25 bytes each) next to a key -> node index map (4 bytes per key up
+# to the largest): it peaks at about 2.2x the index, measured with tracemalloc at 79 MB for 1M
+# affiliations between 580k entities (35 MB index, 151 MB with the former tuple / dict build),
+# so ~700 MB for the example above
+
+KINDS = (HCP, HCO)
+TYPES = tuple(type for type, _ in Affiliation.TYPE_ENUM)
+TYPE_MASK = 0b11
+INACTIVE = 0b100
+OUTGOING = 0b1000
+
+_graph = None
+_graph_lock = threading.Lock()
+
+
+def node_key(kind, id):
+    return int(id) * 2 + KINDS.index(kind)
+
+
+def key_node(key):
+    # (kind, id) of a node key
+    return KINDS[key & 1], key >> 1
+
+
+def edge_tag(type, status):
+    return TYPES.index(type) | (INACTIVE if status != 'A' else 0)
+
+
+def tag_status(tag):
+    return 'I' if tag & INACTIVE else 'A'
+
+
+def tag_type(tag):
+    return TYPES[tag & TYPE_MASK]
+
+
+def affiliation_edge(parent_hcp, parent_hco, child_hcp, child_hco, type, status):
+    # (parent key, child key, tag), None for an affiliation without both ends
+    parent = node_key(HCP, parent_hcp) if parent_hcp is not None else node_key(HCO, parent_hco) if parent_hco is not None else None
+    child = node_key(HCP, child_hcp) if child_hcp is not None else node_key(HCO, child_hco) if child_hco is not None else None
+    if parent is None or child is None or type not in TYPES:
+        return None
+    return parent, child, edge_tag(type, status)
+
+
+class GraphIndex:
+    def __init__(self, edges, generation):
+        # edges: iterable of (affiliation id, parent key, child key, tag). Built with arrays only, no
+        # Python object kept per edge or node (build peak above)
+        self.generation = generation
+        self.built_at = time.time()
+        edge_ids, parents, children, tags = array('q'), array('q'), array('q'), array('B')
+        for edge_id, parent, child, tag in edges:
+            edge_ids.append(edge_id)
+            parents.append(parent)
+            children.append(child)
+            tags.append(tag)
+
+        # sorted keys of the nodes from a presence map of the key range, keys are ids * 2 (serial ids)
+        present = bytearray(max(max(parents, default=-1), max(children, default=-1)) + 1)
+        for keys in (parents, children):
+            for key in keys:
+                present[key] = 1
+        self.nodes = array('q', compress(range(len(present)), present))
+        del present
+        # node index of a key
+        index = array('i', bytes(4 * (self.nodes[-1] + 1 if self.nodes else 0)))
+        for position, key in enumerate(self.nodes):
+            index[key] = position
+        degrees = array('q', bytes(8 * (len(self.nodes) + 1)))
+        for keys in (parents, children):
+            for key in keys:
+                degrees[index[key] + 1] += 1
+        self.offsets = array('q', accumulate(degrees))
+        del degrees
+
+        size = 2 * len(edge_ids)
+        self.targets, self.edge_ids, self.tags = array('i', bytes(4 * size)), array('q', bytes(8 * size)), array('B', bytes(size))
+        slots = self.offsets[:-1]
+        for position, edge_id in enumerate(edge_ids):
+            parent, child = index[parents[position]], index[children[position]]
+            for node, target, tag in ((parent, child, tags[position] | OUTGOING), (child, parent, tags[position])):
+                slot = slots[node]
+                slots[node] += 1
+                self.targets[slot], self.edge_ids[slot], self.tags[slot] = target, edge_id, tag
+
+        # overlay of the writes since the build: affiliation id -> (parent key, child key, tag)
+        self.added = {}
+        self.added_by_node = defaultdict(set)
+        # affiliations of the arrays deleted or changed since the build
+        self.removed = set()
+
+    @staticmethod
+    def from_database(chunk_size=10000):
+        # the generation is read first, a write during the build makes the index stale (rebuilt).
+        # Read from the primary, a lagging replica could miss the writes of the generation (routers.py)
+        generation = get_generation(Affiliation)
+        rows = Affiliation.objects.using(DEFAULT_DB_ALIAS).values_list('id', *LINK_COLUMNS, 'type', 'status').iterator(chunk_size=chunk_size)
+        edges = ((id, *edge) for id, *row in rows if (edge := affiliation_edge(*row)) is not None)
+        return GraphIndex(edges, generation)
+
+    def get_index(self, key):
+        position = bisect_left(self.nodes, key)
+        return position if position < len(self.nodes) and self.nodes[position] == key else None
+
+    def adjacency(self, key, status=None):
+        # (other node key, affiliation id, tag) of the affiliations of a node, once per affiliation
+        # (an affiliation of the node with itself has both slots in the arrays, the incoming one is skipped)
+        position = self.get_index(key)
+        if position is not None:
+            for slot in range(self.offsets[position], self.offsets[position + 1]):
+                edge_id, tag = self.edge_ids[slot], self.tags[slot]
+                if not tag & OUTGOING and self.targets[slot] == position:
+                    continue
+                if edge_id not in self.removed and (status is None or tag_status(tag) == status):
+                    yield self.nodes[self.targets[slot]], edge_id, tag
+        # tuple(): a snapshot, the overlay changes while other threads read it
+        for edge_id in tuple(self.added_by_node.get(key, ())):
+            edge = self.added.get(edge_id)
+            if edge is None:
+                continue
+            parent, child, tag = edge
+            if status is not None and tag_status(tag) != status:
+                continue
+            if parent == key:
+                yield child, edge_id, tag | OUTGOING
+            elif child == key:
+                yield parent, edge_id, tag
+
+    def neighbours(self, kind, id, status=None):
+        return sorted(self.adjacency(node_key(kind, id), status), key=lambda entry: entry[1])
+
+    def degree(self, kind, id, status=None):
+        return sum(1 for _ in self.adjacency(node_key(kind, id), status))
+
+    def shortest_path(self, source, target, status=None, max_depth=None):
+        # breadth first from both ends, one level of the smaller frontier at a time.
+        # (node keys, [(affiliation id, parent key, child key, tag)]) from source to target, None without a path
+        source, target = node_key(*source), node_key(*target)
+        if source == target:
+            return [source], []
+        # node key -> (depth, previous node key, affiliation id, tag from the previous node adjacency)
+        forward_seen, backward_seen = {source: (0, None, None, None)}, {target: (0, None, None, None)}
+        forward, backward = [source], [target]
+        length = 0
+        while forward and backward and (max_depth is None or length < max_depth):
+            length += 1
+            expand_forward = len(forward) <= len(backward)
+            frontier, seen, other = (forward, forward_seen, backward_seen) if expand_forward else (backward, backward_seen, forward_seen)
+            next_frontier, meetings = [], []
+            for key in frontier:
+                depth = seen[key][0] + 1
+                for neighbour, edge_id, tag in self.adjacency(key, status):
+                    if neighbour in seen:
+                        continue
+                    seen[neighbour] = (depth, key, edge_id, tag)
+                    if neighbour in other:
+                        meetings.append((depth + other[neighbour][0], neighbour))
+                    next_frontier.append(neighbour)
+            if meetings:
+                # the whole level is expanded, the meeting nodes can be at different depths of the other side
+                return self.join_path(forward_seen, backward_seen, min(meetings)[1])
+            if expand_forward:
+                forward = next_frontier
+            else:
+                backward = next_frontier
+        return None
+
+    @staticmethod
+    def join_path(forward_seen, backward_seen, meeting):
+        nodes, edges, key = [meeting], [], meeting
+        while forward_seen[key][1] is not None:
+            _, previous, edge_id, tag = forward_seen[key]
+            # tag of the previous node adjacency, OUTGOING when the previous node is the parent
+            edges.append((edge_id, previous, key, tag & ~OUTGOING) if tag & OUTGOING else (edge_id, key, previous, tag))
+            nodes.append(previous)
+            key = previous
+        nodes.reverse()
+        edges.reverse()
+        key = meeting
+        while backward_seen[key][1] is not None:
+            _, following, edge_id, tag = backward_seen[key]
+            edges.append((edge_id, following, key, tag & ~OUTGOING) if tag & OUTGOING else (edge_id, key, following, tag))
+            nodes.append(following)
+            key = following
+        return nodes, edges
+
+    def walk_levels(self, node, depth, status, max_nodes):
+        # same result as network.walk_levels, without queries
+        levels, visited = [{node}], {node}
+        while len(levels) <= depth and levels[-1] and len(visited) <= max_nodes:
+            level = {key_node(neighbour) for kind, id in levels[-1] for neighbour, _, _ in self.adjacency(node_key(kind, id), status)}
+            level.difference_update(visited)
+            visited.update(level)
+            levels.append(level)
+        return levels
+
+    def edges(self):
+        # current (affiliation id, parent key, child key, tag)
+        for position, key in enumerate(self.nodes):
+            for slot in range(self.offsets[position], self.offsets[position + 1]):
+                edge_id, tag = self.edge_ids[slot], self.tags[slot]
+                if tag & OUTGOING and edge_id not in self.removed:
+                    yield edge_id, key, self.nodes[self.targets[slot]], tag & ~OUTGOING
+        for edge_id, (parent, child, tag) in self.added.items():
+            yield edge_id, parent, child, tag
+
+    def save_edge(self, edge_id, edge):
+        self.delete_edge(edge_id)
+        if edge is not None:
+            parent, child, _ = edge
+            self.added[edge_id] = edge
+            self.added_by_node[parent].add(edge_id)
+            self.added_by_node[child].add(edge_id)
+
+    def delete_edge(self, edge_id):
+        edge = self.added.pop(edge_id, None)
+        if edge is not None:
+            self.added_by_node[edge[0]].discard(edge_id)
+            self.added_by_node[edge[1]].discard(edge_id)
+        self.removed.add(edge_id)
+
+    def get_delta(self):
+        return len(self.added) + len(self.removed)
+
+    def compact(self):
+        graph = GraphIndex(self.edges(), self.generation)
+        # same data as the index, not a newer read of the database (get_max_age)
+        graph.built_at = self.built_at
+        return graph
+
+    def get_memory_bytes(self):
+        return sum(len(values) * values.itemsize for values in (self.nodes, self.offsets, self.targets, self.edge_ids, self.tags))
+
+    def get_stats(self):
+        return {
+            'nodes': len(self.nodes),
+            'edges': len(self.edge_ids) // 2,
+            'added': len(self.added),
+            'removed': len(self.removed),
+            'memory_bytes': self.get_memory_bytes(),
+            'built_at': self.built_at,
+        }
+
+
+def is_enabled():
+    # built at startup (api/wsgi.py, api/asgi.py) and used by the network endpoints
+    return getattr(settings, 'DATA_GRAPH_INDEX', False)
+
+
+def get_graph_index():
+    # built on first use, rebuilt when the affiliations were changed by another process
+    global _graph
+    graph = _graph
+    if is_current(graph):
+        return graph
+    with _graph_lock:
+        if not is_current(_graph):
+            _graph = GraphIndex.from_database()
+        return _graph
+
+
+def warm_up_graph_index():
+    # at server startup (api/wsgi.py, api/asgi.py), when enabled
+    if is_enabled():
+        get_graph_index()
+
+
+def reset_graph_index():
+    global _graph
+    with _graph_lock:
+        _graph = None
+
+
+def get_max_age():
+    # seconds an index is used when the version counters are per process (versions.is_shared):
+    # the writes of the other processes and ingest_data do not change its generation then
+    return getattr(settings, 'DATA_GRAPH_INDEX_MAX_AGE', 300)
+
+
+def is_current(graph):
+    if graph is None or graph.generation != get_generation(Affiliation):
+        return False
+    return is_shared() or time.time() - graph.built_at < get_max_age()
+
+
+def get_graph_walk():
+    # walk of the network endpoints (network.get_network), the database one without the index
+    return walk_graph_levels if is_enabled() else None
+
+
+def walk_graph_levels(node, depth, status, max_nodes):
+    return get_graph_index().walk_levels(node, depth, status, max_nodes)
+
+
+def get_node_param(request, name):
+    # `HCP:1` / `HCO:1` query param
+    kind, _, id = request.query_params.get(name, '').partition(':')
+    if kind.upper() not in KINDS or not id.isdigit():
+        raise ValidationError({name: 'Must be HCP:<id> or HCO:<id>.'})
+    return kind.upper(), int(id)
+
+
+def edge_data(edge_id, parent, child, tag):
+    # AffiliationSerializer representation
+    return {'id': edge_id, 'status': tag_status(tag), 'type': tag_type(tag), 'parent_link': key_node(parent)[1], 'child_link': key_node(child)[1]}
+
+
+def node_data(key):
+    kind, id = key_node(key)
+    return {'type': kind, 'id': id}
+
+
+def get_neighbours_data(node, status):
+    # affiliations of an entity (ordered by id) with the entity at the other end
+    key = node_key(*node)
+    neighbours = []
+    for neighbour, edge_id, tag in get_graph_index().neighbours(*node, status):
+        parent, child = (key, neighbour) if tag & OUTGOING else (neighbour, key)
+        neighbours.append({**node_data(neighbour), 'affiliation': edge_data(edge_id, parent, child, tag & ~OUTGOING)})
+    return {**node_data(key), 'degree': len(neighbours), 'neighbours': neighbours}
+
+
+def get_path_data(source, target, status, max_depth=None):
+    path = get_graph_index().shortest_path(source, target, status, max_depth)
+    if path is None:
+        return {'length': None, 'nodes': [], 'edges': []}
+    nodes, edges = path
+    return {'length': len(edges), 'nodes': [node_data(key) for key in nodes], 'edges': [edge_data(*edge) for edge in edges]}
+
+
+def get_graph_stats():
+    graph = _graph
+    return {'enabled': is_enabled(), 'built': graph is not None, **(graph.get_stats() if graph is not None else {})}
+
+
+# kept in sync with the committed writes of this process. The Affiliation generation is bumped
+# on commit by signals.py (connected first, its callback runs first): an index that was current
+# before the write and still has the generation preceding that bump applies the write and takes
+# the new generation. A stale index (writes of other processes, writes it did not apply) is
+# rebuilt on its next use
+
+@receiver(pre_save, sender=Affiliation)
+@receiver(pre_delete, sender=Affiliation)
+def handle_affiliation_pre_change(sender, instance, **kwargs):
+    instance._graph_current = is_current(_graph)
+
+
+@receiver(post_save, sender=Affiliation)
+@receiver(post_delete, sender=Affiliation)
+def handle_affiliation_graph_changed(sender, instance, signal, using, **kwargs):
+    graph = _graph
+    if graph is None or not getattr(instance, '_graph_current', False):
+        return
+    edge = None if signal is post_delete else affiliation_edge(*(getattr(instance, column) for column in LINK_COLUMNS), instance.type, instance.status)
+    transaction.on_commit(partial(apply_change, graph, instance, instance.pk, edge), using=using)
+
+
+def apply_change(graph, instance, edge_id, edge):
+    # after the bump of signals.bump_entity, which set the generations on the instance
+    global _graph
+    with _graph_lock:
+        if _graph is not graph or graph.generation != getattr(instance, '_previous_generation', None):
+            return
+        if edge is None:
+            graph.delete_edge(edge_id)
+        else:
+            graph.save_edge(edge_id, edge)
+        graph.generation = instance._generation
+        if graph.get_delta() > getattr(settings, 'DATA_GRAPH_INDEX_MAX_DELTA', 100000):
+            _graph = graph.compact()
@@ -0,0 +1,42 @@
+from django.db.models.functions import Upper
+from .models import Address
+
+# doc: https://docs.djangoproject.com/en/4.2/ref/models/indexes/#expressions
+# doc: https://www.postgresql.org/docs/current/indexes-opclass.html
+# location filters (?state=&city=&zip=) of the address endpoints (addresses in the location) and of
+# the HCP/HCO lists (entities with an active address in the location). state and city are case
+# insensitive: compared in upper case, the expressions of the address indexes (models.py), zip is
+# a prefix (varchar_pattern_ops index on PostgreSQL). Each filter is an index range scan
+
+LOCATION_PARAMS = ('state', 'city', 'zip')
+UPPER_PARAMS = ('state', 'city')
+
+
+def get_location_filters(request):
+    return {name: request.GET[name].strip() for name in LOCATION_PARAMS if request.GET.get(name, '').strip()}
+
+
+def get_location_dependencies(request):
+    # cached_response dependency of the HCP/HCO lists, filtered on their addresses
+    return (Address,) if get_location_filters(request) else ()
+
+
+def filter_addresses(query_set, filters, prefix=''):
+    # prefix: path of the address from the query set model, e.g. 'address__'
+    for name in UPPER_PARAMS:
+        if name in filters:
+            alias = f'{name}_upper'
+            query_set = query_set.alias(**{alias: Upper(f'{prefix}{name}')}).filter(**{alias: filters[name].upper()})
+    if 'zip' in filters:
+        query_set = query_set.filter(**{f'{prefix}zip__startswith': filters['zip']})
+    return query_set
+
+
+def filter_by_addresses(query_set, filters):
+    # HCPs/HCOs with an active address matching the filters: semi-join (IN) of the matching addresses
+    # (index range scan) through the m2m table, each entity once whatever its matching addresses
+    if not filters:
+        return query_set
+    entity_column = f'{query_set.model._meta.model_name}_id'
+    links = filter_addresses(query_set.model.addresses.through.objects.filter(address__status='A'), filters, 'address__')
+    return query_set.filter(id__in=links.values(entity_column))
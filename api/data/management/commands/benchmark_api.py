@@ -0,0 +1,157 @@
+import random
+from urllib.parse import urlencode
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Max, Min
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+from data import urls as data_urls
+from data.benchmarks import compare_results, read_results, run_load, write_results
+from data.models import Address, HealthCareProvider, HealthCareOrganization, Affiliation
+
+# load test of every endpoint of data/urls.py on a running server, one endpoint at a time at each
+# concurrency level, requests spread over --samples entities picked at random in the database the
+# command runs against (the server's, e.g. filled with generate_data). Throughput and p50/p95/p99
+# latency per endpoint and level; --compare fails on the regressions beyond --tolerance:
+#   python3 manage.py generate_data --providers 1000000 --organizations 100000 --copy
+#   python3 manage.py benchmark_api --user admin --concurrency 1 10 50 --output baseline.json
+#   python3 manage.py benchmark_api --user admin --concurrency 1 10 50 --compare baseline.json
+# Run the server with DATA_RESPONSE_CACHE=0 to measure the database path. The exports stream every
+# row matching their filters (a zip code, one affiliation type), exclude them with --endpoints
+
+MULTI_GET_MODELS = {
+    'get_providers_by_ids': HealthCareProvider,
+    'get_organizations_by_ids': HealthCareOrganization,
+    'get_addresses_by_ids': Address,
+    'get_affiliations_by_ids': Affiliation,
+}
+MULTI_GET_IDS = 50
+EXPORT_AFFILIATION_TYPE = 'HCO_HCO'
+
+
+class Command(BaseCommand):
+    help = "Benchmark throughput and latency of every API endpoint on a running server"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--url", dest="url", type=str, default="http://127.0.0.1:8000")
+        parser.add_argument("--user", dest="user", type=str, required=True, help="username authenticating the requests (token)")
+        parser.add_argument("--endpoints", dest="endpoints", type=str, nargs="+", default=None, help="URL names, default: every endpoint")
+        parser.add_argument("--concurrency", dest="concurrency", type=int, nargs="+", default=[1, 10, 50])
+        parser.add_argument("--duration", dest="duration", type=float, default=5, help="seconds per endpoint and concurrency level")
+        parser.add_argument("--samples", dest="samples", type=int, default=20, help="entities the requests are spread over")
+        parser.add_argument("--seed", dest="seed", type=int, default=0)
+        parser.add_argument("--output", dest="output", type=str, default=None, help="write results to a JSON file")
+        parser.add_argument("--compare", dest="compare", type=str, default=None, help="compare with a baseline results file")
+        parser.add_argument("--tolerance", dest="tolerance", type=float, default=0.15, help="regression threshold of --compare, 0.15 = 15%%")
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['user'])
+        except User.DoesNotExist:
+            raise CommandError(f"User {options['user']} does not exist")
+        token, _ = Token.objects.get_or_create(user=user)
+        headers = {'Authorization': f'Token {token.key}'}
+
+        endpoints = Command.get_endpoint_paths(options['samples'], random.Random(options['seed']))
+        if options['endpoints']:
+            unknown = set(options['endpoints']) - set(endpoints)
+            if unknown:
+                raise CommandError(f"Unknown endpoints: {', '.join(sorted(unknown))}")
+            endpoints = {name: endpoints[name] for name in options['endpoints']}
+
+        base_url = options['url'].rstrip('/')
+        results = {}
+        for name, paths in endpoints.items():
+            for concurrency in options['concurrency']:
+                key = f'{name}@{concurrency}'
+                results[key] = run_load([base_url + path for path in paths], concurrency, options['duration'], headers)
+                self.stdout.write(
+                    f"{key}: {results[key]['rps']:.0f} req/s, p50 {results[key].get('p50_ms', 0):.2f}ms, "
+                    f"p95 {results[key].get('p95_ms', 0):.2f}ms, p99 {results[key].get('p99_ms', 0):.2f}ms, errors {results[key]['errors']}"
+                )
+
+        if options['output']:
+            write_results(options['output'], results)
+        if options['compare']:
+            regressions = self.compare(read_results(options['compare']), results, options['tolerance'])
+            if regressions:
+                raise CommandError(f"{len(regressions)} regressions: {', '.join(regressions)}")
+            self.stdout.write(self.style.SUCCESS('No regression'))
+
+    def compare(self, baseline, results, tolerance):
+        # names of the results slower (p50, p99) or with less throughput than the baseline beyond tolerance
+        regressions = []
+        self.stdout.write('\nCompared with baseline:')
+        for metric, higher_is_better in (('rps', True), ('p50_ms', False), ('p99_ms', False)):
+            for name, (before, after, ratio) in compare_results(baseline, results, metric).items():
+                regressed = ratio < 1 / (1 + tolerance) if higher_is_better else ratio > 1 + tolerance
+                self.stdout.write(f"{name}: {metric} {before:.2f} -> {after:.2f} (x{ratio:.2f}){' REGRESSION' if regressed else ''}")
+                if regressed:
+                    regressions.append(f'{name} {metric}')
+        if errors := [name for name, result in results.items() if result['errors'] and not baseline.get(name, {}).get('errors')]:
+            self.stdout.write(f"Errors: {', '.join(errors)}")
+            regressions.extend(f'{name} errors' for name in errors)
+        return regressions
+
+    @staticmethod
+    def get_endpoint_paths(samples, rng):
+        # {URL name: request paths}, one per sampled entity, for every pattern of data/urls.py
+        entities = [Command.sample_entities(rng) for _ in range(samples)]
+        endpoints = {}
+        for pattern in data_urls.urlpatterns:
+            paths = []
+            for entity in entities:
+                converters = pattern.pattern.converters
+                # the address of the entity of the URL
+                address = 'provider_address_id' if 'provider_id' in converters else 'organization_address_id'
+                kwargs = {name: entity[address if name == 'address_id' else name] for name in converters}
+                params = Command.get_params(pattern.name, entity, rng)
+                paths.append(reverse(pattern.name, kwargs=kwargs) + (f'?{urlencode(params)}' if params else ''))
+            endpoints[pattern.name] = list(dict.fromkeys(paths))
+        return endpoints
+
+    @staticmethod
+    def get_params(name, entity, rng):
+        model = MULTI_GET_MODELS.get(name)
+        if model:
+            return {'ids': ','.join(map(str, Command.random_rows(model.objects.all(), rng).values_list('id', flat=True)[:MULTI_GET_IDS]))}
+        if name == 'get_affiliation_path':
+            return {'source': f"HCP:{entity['provider_id']}", 'target': f"HCO:{entity['organization_id']}"}
+        if name == 'search_providers':
+            return {'q': entity['provider_name'].split()[0]}
+        if name == 'search_organizations':
+            return {'q': entity['organization_name'].split()[0]}
+        if name in ('export_providers', 'export_organizations', 'export_addresses'):
+            return {'zip': entity['zip']}
+        if name == 'export_affiliations':
+            return {'type': EXPORT_AFFILIATION_TYPE}
+        return {}
+
+    @staticmethod
+    def random_rows(query_set, rng, field='id'):
+        # rows from a random id on, without scanning the table (ORDER BY random())
+        bounds = query_set.aggregate(low=Min(field), high=Max(field))
+        if bounds['low'] is None:
+            raise CommandError(f'No {query_set.model._meta.verbose_name} rows, fill the database first (generate_data)')
+        start = rng.randint(bounds['low'], bounds['high'])
+        return query_set.filter(**{f'{field}__gte': start}).order_by(field)
+
+    @staticmethod
+    def sample_entities(rng):
+        # an active HCP and HCO with one of their active addresses, and an active affiliation
+        entity = {}
+        for prefix, model in (('provider', HealthCareProvider), ('organization', HealthCareOrganization)):
+            column = f'{model._meta.model_name}_id'
+            links = model.addresses.through.objects.filter(**{f'{model._meta.model_name}__status': 'A', 'address__status': 'A'})
+            link = Command.random_rows(links, rng, column).values(column, 'address_id', f'{model._meta.model_name}__name', 'address__zip').first()
+            if link is None:
+                raise CommandError(f'No active {model._meta.verbose_name} with an active address, fill the database first (generate_data)')
+            entity[f'{prefix}_id'] = link[column]
+            entity[f'{prefix}_address_id'] = link['address_id']
+            entity[f'{prefix}_name'] = link[f'{model._meta.model_name}__name']
+            entity.setdefault('zip', link['address__zip'])
+        affiliation = Command.random_rows(Affiliation.objects.filter(status='A'), rng).values_list('id', flat=True).first()
+        if affiliation is None:
+            raise CommandError('No active affiliation, fill the database first (generate_data)')
+        entity['affiliation_id'] = affiliation
+        return entity
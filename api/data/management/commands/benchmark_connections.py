@@ -0,0 +1,101 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.backends.postgresql.psycopg_any import is_psycopg3
+from data.backends.postgresql import base as pool_backend
+from data.benchmarks import compare_results, measure, read_results, write_results
+from data.models import HealthCareProvider
+
+# per-request database cost of the connection handling of settings.py (data/backends/postgresql),
+# on the configured PostgreSQL database: each "request" runs --queries detail queries then ends as a
+# Django request does (close_if_unusable_or_obsolete), with
+# - new_connection: a new connection per request (CONN_MAX_AGE=0, the default backend)
+# - persistent: one connection kept by the thread (CONN_MAX_AGE=None)
+# - pool: connections taken from and given back to the pool (DB_POOL=1)
+# - pool_prepared: the pool with server-side binding and prepared statements (DB_PREPARE_THRESHOLD)
+#   python3 manage.py benchmark_connections --output before.json
+#   python3 manage.py benchmark_connections --compare before.json
+
+ALIAS = 'benchmark_connections'
+POOL = {'min_size': 1, 'max_size': 1, 'timeout': 10}
+# OPTIONS set by the modes, ignored in the default database settings
+MODE_OPTIONS = ('pool', 'server_side_binding', 'prepare_threshold', 'prepared_max')
+
+
+class Command(BaseCommand):
+    help = "Benchmark a request's database cost with new, persistent and pooled connections"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--queries", dest="queries", type=int, default=3, help="detail queries per request")
+        parser.add_argument("--prepare-threshold", dest="prepare_threshold", type=int, default=2)
+        parser.add_argument("--repeat", dest="repeat", type=int, default=200)
+        parser.add_argument("--output", dest="output", type=str, default=None, help="write results to a JSON file")
+        parser.add_argument("--compare", dest="compare", type=str, default=None, help="compare with a previous results file")
+
+    def handle(self, *args, **options):
+        if connections['default'].vendor != 'postgresql':
+            raise CommandError('benchmark_connections requires a PostgreSQL database')
+        modes = Command.get_modes(options['prepare_threshold'])
+        if pool_backend.ConnectionPool is None or not is_psycopg3:
+            self.stdout.write('psycopg 3 and psycopg_pool are not installed, skipping the pool modes')
+            modes = {name: mode for name, mode in modes.items() if 'pool' not in mode[1]}
+        ids = list(HealthCareProvider.objects.order_by('id').values_list('id', flat=True)[:options['queries']])
+        if not ids:
+            raise CommandError('No provider rows, fill the database first (generate_data)')
+
+        results = {}
+        for name, (conn_max_age, database_options) in modes.items():
+            connection = Command.open_alias(conn_max_age, database_options)
+            try:
+                results[name] = measure(lambda: Command.run_request(connection, ids), options['repeat'])
+            finally:
+                Command.close_alias(connection)
+        base = results['new_connection']['p50_ms']
+        for name, result in results.items():
+            self.stdout.write(f'{name}: p50 {result["p50_ms"]:.3f}ms, p95 {result["p95_ms"]:.3f}ms (x{base / result["p50_ms"]:.2f} faster)')
+
+        if options['output']:
+            write_results(options['output'], results)
+        if options['compare']:
+            self.stdout.write('\nCompared with baseline (p50):')
+            for name, (before, after, ratio) in compare_results(read_results(options['compare']), results).items():
+                self.stdout.write(f'{name}: {before:.3f}ms -> {after:.3f}ms (speedup x{1 / ratio:.2f})')
+
+    @staticmethod
+    def get_modes(prepare_threshold):
+        # name: (CONN_MAX_AGE, OPTIONS)
+        return {
+            'new_connection': (0, {}),
+            'persistent': (None, {}),
+            'pool': (0, {'pool': POOL}),
+            'pool_prepared': (0, {'pool': POOL, 'server_side_binding': True, 'prepare_threshold': prepare_threshold}),
+        }
+
+    @staticmethod
+    def open_alias(conn_max_age, database_options):
+        # a copy of the default database under another alias, with the backend of settings.py and
+        # only the connection options of the mode
+        options = {
+            name: value for name, value in connections['default'].settings_dict['OPTIONS'].items()
+            if name not in MODE_OPTIONS
+        }
+        connections.settings[ALIAS] = {
+            **connections['default'].settings_dict,
+            'ENGINE': 'data.backends.postgresql',
+            'CONN_MAX_AGE': conn_max_age,
+            'OPTIONS': {**options, **database_options},
+        }
+        return connections[ALIAS]
+
+    @staticmethod
+    def close_alias(connection):
+        connection.close()
+        connection.close_pool()
+        del connections[ALIAS]
+        del connections.settings[ALIAS]
+
+    @staticmethod
+    def run_request(connection, ids):
+        for id in ids:
+            list(HealthCareProvider.objects.using(connection.alias).filter(id=id).values('id', 'name', 'status'))
+        # end of the request (django.db.close_old_connections)
+        connection.close_if_unusable_or_obsolete()
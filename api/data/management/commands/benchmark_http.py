@@ -0,0 +1,69 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.authtoken.models import Token
+from data.benchmarks import compare_results, read_results, run_load, write_results
+from data.models import HealthCareProvider, HealthCareOrganization
+
+# HTTP load generator for a running server, to compare the WSGI (sync views) and ASGI (async views)
+# deployments at the same concurrency. Run the server with DATA_RESPONSE_CACHE=0 to measure the
+# database path, and the command against the same database (ids and token are read from it):
+#   gunicorn api.wsgi -w 4 --threads 8 -b 127.0.0.1:8000
+#   python3 manage.py benchmark_http --user admin --concurrency 100 200 --output wsgi.json
+#   uvicorn api.asgi:application --workers 4 --port 8000
+#   python3 manage.py benchmark_http --user admin --concurrency 100 200 --compare wsgi.json
+
+class Command(BaseCommand):
+    help = "Benchmark requests/sec and latency of a running API server"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--url", dest="url", type=str, default="http://127.0.0.1:8000")
+        parser.add_argument("--user", dest="user", type=str, required=True, help="username authenticating the requests (token)")
+        parser.add_argument("--paths", dest="paths", type=str, nargs="+", default=None, help="default: list, detail and affiliation endpoints")
+        parser.add_argument("--concurrency", dest="concurrency", type=int, nargs="+", default=[100])
+        parser.add_argument("--duration", dest="duration", type=float, default=10, help="seconds per concurrency level")
+        parser.add_argument("--output", dest="output", type=str, default=None, help="write results to a JSON file")
+        parser.add_argument("--compare", dest="compare", type=str, default=None, help="compare with a previous results file")
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['user'])
+        except User.DoesNotExist:
+            raise CommandError(f"User {options['user']} does not exist")
+        token, _ = Token.objects.get_or_create(user=user)
+        headers = {'Authorization': f'Token {token.key}'}
+
+        urls = [options['url'].rstrip('/') + path for path in options['paths'] or Command.get_default_paths()]
+        results = {}
+        for concurrency in options['concurrency']:
+            name = f'concurrency_{concurrency}'
+            results[name] = run_load(urls, concurrency, options['duration'], headers)
+            self.stdout.write(
+                f"{name}: {results[name]['rps']:.0f} req/s, p50 {results[name].get('p50_ms', 0):.2f}ms, "
+                f"p99 {results[name].get('p99_ms', 0):.2f}ms, errors {results[name]['errors']}"
+            )
+
+        if options['output']:
+            write_results(options['output'], results)
+        if options['compare']:
+            baseline = read_results(options['compare'])
+            self.stdout.write('\nCompared with baseline:')
+            for name, (before, after, ratio) in compare_results(baseline, results, 'rps').items():
+                self.stdout.write(f'{name}: {before:.0f} -> {after:.0f} req/s (x{ratio:.2f})')
+            for name, (before, after, ratio) in compare_results(baseline, results, 'p99_ms').items():
+                self.stdout.write(f'{name}: p99 {before:.2f}ms -> {after:.2f}ms (x{ratio:.2f})')
+
+    @staticmethod
+    def get_default_paths():
+        provider = HealthCareProvider.objects.filter(status='A').order_by('id').first()
+        organization = HealthCareOrganization.objects.filter(status='A').order_by('id').first()
+        if provider is None or organization is None:
+            raise CommandError('No data, seed the database first (e.g. benchmark_queries --seed-providers) or pass --paths')
+        return [
+            '/api/v1/admin/hcp/',
+            '/api/v1/admin/affiliation/',
+            f'/api/v1/hcp/{provider.id}/',
+            f'/api/v1/hcp/{provider.id}/address/',
+            f'/api/v1/hcp/{provider.id}/affiliation/',
+            f'/api/v1/hco/{organization.id}/',
+            f'/api/v1/hco/{organization.id}/affiliation/',
+        ]
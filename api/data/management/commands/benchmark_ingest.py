@@ -0,0 +1,57 @@
+import tempfile
+import time
+from django.core.management.base import BaseCommand
+from django.db.models import Max
+from data.models import Address, HealthCareProvider, HealthCareOrganization, Affiliation
+from data.synthetic import write_dataset
+from .ingest_data import DEFAULT_BATCH_SIZE, ParallelDataProcessor
+
+# measures ingest_data throughput from 1 to N worker processes on a generated dataset
+# note: rows are written to the configured database and deleted again after each run
+
+# to run: python3 manage.py benchmark_ingest --providers 100000 --organizations 20000 --workers 1 2 4 8
+
+class Command(BaseCommand):
+    help = "Benchmark parallel ingestion on a generated dataset"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--providers", dest="providers", type=int, default=20000)
+        parser.add_argument("--organizations", dest="organizations", type=int, default=5000)
+        parser.add_argument("--degree", dest="degree", type=int, default=2, help="average affiliations per entity")
+        parser.add_argument("--workers", dest="workers", type=int, nargs="+", default=[1, 2, 4])
+        parser.add_argument("--batch-size", dest="batch_size", type=int, default=DEFAULT_BATCH_SIZE)
+        parser.add_argument("--copy", dest="copy", action="store_true")
+
+    def handle(self, *args, **options):
+        with tempfile.TemporaryDirectory() as directory:
+            filenames, _ = write_dataset(directory, options['organizations'], options['providers'], options['degree'])
+            self.stdout.write(f'Generated dataset in {directory}')
+
+            baseline = None
+            for workers in options['workers']:
+                high_water_marks = Command.high_water_marks()
+                processor = ParallelDataProcessor(workers, batch_size=options['batch_size'], use_copy=options['copy'])
+
+                start = time.perf_counter()
+                processor.save_entities(processor.read_data_files(filenames))
+                seconds = time.perf_counter() - start
+
+                rows = sum(stats['rows'] for stats in processor.stats.values())
+                baseline = baseline or seconds
+                self.stdout.write(
+                    self.style.SUCCESS(f'workers={workers}: {rows} rows in {seconds:.2f}s ({rows / seconds:.0f} rows/sec, speedup x{baseline / seconds:.2f})')
+                )
+                Command.cleanup(high_water_marks)
+
+    @staticmethod
+    def high_water_marks():
+        return {
+            model: model.objects.aggregate(max_id=Max('id'))['max_id'] or 0
+            for model in (Affiliation, HealthCareProvider, HealthCareOrganization, Address)
+        }
+
+    @staticmethod
+    def cleanup(high_water_marks):
+        # delete the rows inserted by the run (address links cascade with their entities)
+        for model, max_id in high_water_marks.items():
+            model.objects.filter(id__gt=max_id).delete()
@@ -0,0 +1,85 @@
+from django.core.management.base import BaseCommand
+from django.db import connection
+from data.benchmarks import compare_results, measure, read_results, write_results
+from data.models import Address, HealthCareProvider, HealthCareOrganization, Affiliation
+from data.synthetic import generate_dataset
+from .ingest_data import BulkDataProcessor
+
+# times the query shapes issued by the list and per-entity endpoints, to compare a database
+# before and after the index migration (data 0002_indexes):
+#   python3 manage.py benchmark_queries --seed-providers 1000000 --seed-organizations 200000
+#   python3 manage.py migrate data 0001 && python3 manage.py benchmark_queries --output before.json
+#   python3 manage.py migrate data && python3 manage.py benchmark_queries --compare before.json
+
+PAGE_SIZE = 100
+
+
+class Command(BaseCommand):
+    help = "Benchmark the list and affiliation queries issued by the API views"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--seed-providers", dest="seed_providers", type=int, default=0, help="insert a generated dataset first")
+        parser.add_argument("--seed-organizations", dest="seed_organizations", type=int, default=0)
+        parser.add_argument("--degree", dest="degree", type=int, default=3)
+        parser.add_argument("--repeat", dest="repeat", type=int, default=20)
+        parser.add_argument("--explain", dest="explain", action="store_true", help="print the query plans")
+        parser.add_argument("--output", dest="output", type=str, default=None, help="write results to a JSON file")
+        parser.add_argument("--compare", dest="compare", type=str, default=None, help="compare with a previous results file")
+
+    def handle(self, *args, **options):
+        if options['seed_providers'] or options['seed_organizations']:
+            processor = BulkDataProcessor(batch_size=5000, use_copy=True)
+            processor.save_entities(generate_dataset(options['seed_organizations'], options['seed_providers'], options['degree']))
+            self.stdout.write(f"Seeded dataset: { {entity: stats['rows'] for entity, stats in processor.stats.items()} }")
+            if connection.vendor == 'postgresql':
+                with connection.cursor() as cursor:
+                    cursor.execute('ANALYZE')
+
+        results = {}
+        querysets = Command.get_querysets()
+        for name, queryset in querysets.items():
+            if options['explain']:
+                self.stdout.write(f'{name}:\n{queryset.explain()}\n')
+            results[name] = measure(lambda: list(queryset.all()), options['repeat'])
+            self.stdout.write(f"{name}: p50 {results[name]['p50_ms']:.2f}ms, p95 {results[name]['p95_ms']:.2f}ms")
+        for name, queryset in Command.get_count_querysets().items():
+            results[name] = measure(queryset.count, options['repeat'])
+            self.stdout.write(f"{name}: p50 {results[name]['p50_ms']:.2f}ms, p95 {results[name]['p95_ms']:.2f}ms")
+
+        if options['output']:
+            write_results(options['output'], results)
+        if options['compare']:
+            self.stdout.write('\nCompared with baseline (p50):')
+            for name, (before, after, ratio) in compare_results(read_results(options['compare']), results).items():
+                self.stdout.write(f'{name}: {before:.2f}ms -> {after:.2f}ms (speedup x{1 / ratio:.2f})')
+
+    @staticmethod
+    def get_querysets():
+        provider_ids = HealthCareProvider.objects.filter(status='A').order_by('id').values_list('id', flat=True)
+        organization_ids = HealthCareOrganization.objects.filter(status='A').order_by('id').values_list('id', flat=True)
+        provider_count = provider_ids.count()
+        deep_offset = max(0, provider_count * 9 // 10)
+        deep_id = provider_ids[deep_offset] if provider_count else 0
+        provider_id = provider_ids[provider_count // 2] if provider_count else 0
+        organization_id = organization_ids[organization_ids.count() // 2] if organization_ids.exists() else 0
+
+        return {
+            'hcp_list_first_page': HealthCareProvider.objects.filter(status='A').order_by('id')[:PAGE_SIZE],
+            'hcp_list_deep_offset': HealthCareProvider.objects.filter(status='A').order_by('id')[deep_offset:deep_offset + PAGE_SIZE],
+            'hcp_list_deep_keyset': HealthCareProvider.objects.filter(status='A', id__gt=deep_id).order_by('id')[:PAGE_SIZE],
+            'address_list_by_type': Address.objects.filter(status='A', parent_type='HCP').order_by('id')[:PAGE_SIZE],
+            'address_list_inactive': Address.objects.filter(status='I').order_by('id')[:PAGE_SIZE],
+            'affiliation_list_by_type': Affiliation.objects.filter(status='A', type='HCP_HCO').order_by('id')[:PAGE_SIZE],
+            'affiliation_by_provider_or': Affiliation.filter_by_provider(provider_id)[:PAGE_SIZE],
+            'affiliation_by_provider_union': Affiliation.objects.filter(parent_hcp_link_id=provider_id).union(Affiliation.objects.filter(child_hcp_link_id=provider_id)).order_by('id')[:PAGE_SIZE],
+            'affiliation_by_organization_or': Affiliation.filter_by_organization(organization_id)[:PAGE_SIZE],
+            'affiliation_by_organization_union': Affiliation.objects.filter(parent_hco_link_id=organization_id).union(Affiliation.objects.filter(child_hco_link_id=organization_id)).order_by('id')[:PAGE_SIZE],
+        }
+
+    @staticmethod
+    def get_count_querysets():
+        return {
+            'hcp_count': HealthCareProvider.objects.filter(status='A'),
+            'address_count_by_type': Address.objects.filter(status='A', parent_type='HCP'),
+            'affiliation_count_by_type': Affiliation.objects.filter(status='A', type='HCP_HCO'),
+        }
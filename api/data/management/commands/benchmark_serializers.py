@@ -0,0 +1,76 @@
+import random
+from django.core.management.base import BaseCommand
+from rest_framework.renderers import JSONRenderer
+from data.benchmarks import compare_results, measure, read_results, write_results
+from data.models import Address, HealthCareProvider, HealthCareOrganization, Affiliation
+from data.plans import ADDRESS_PLAN, AFFILIATION_PLAN, ORGANIZATION_PLAN, PROVIDER_PLAN
+from data.renderers import FastJSONRenderer
+from data.serializers import AddressSerializer, HealthCareProviderSerializer, HealthCareOrganizationSerializer, AffiliationSerializer
+
+# micro-benchmark of the serialization + rendering of one page, per representation: the
+# ModelSerializer + JSONRenderer path (model instances) against the field plan + FastJSONRenderer
+# path (values() rows). In memory, no database: the query time is measured by benchmark_queries
+#   python3 manage.py benchmark_serializers --rows 100 --output before.json
+#   python3 manage.py benchmark_serializers --rows 100 --compare before.json
+
+LINK_COLUMNS = ['parent_hcp_link_id', 'parent_hco_link_id', 'child_hcp_link_id', 'child_hco_link_id']
+
+
+class Command(BaseCommand):
+    help = "Benchmark the serializers against the field plans used by the read endpoints"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", dest="rows", type=int, default=100, help="rows per page")
+        parser.add_argument("--repeat", dest="repeat", type=int, default=200)
+        parser.add_argument("--output", dest="output", type=str, default=None, help="write results to a JSON file")
+        parser.add_argument("--compare", dest="compare", type=str, default=None, help="compare with a previous results file")
+
+    def handle(self, *args, **options):
+        results = {}
+        for name, (serializer_class, plan, model, rows) in Command.get_cases(options['rows']).items():
+            instances = [model(**row) for row in rows]
+            values = [{column: row.get(column) for column in plan.columns} for row in rows]
+            serializer_output = JSONRenderer().render(serializer_class(instances, many=True).data)
+            plan_output = FastJSONRenderer().render(plan.serialize(values))
+            if serializer_output != plan_output:
+                self.stderr.write(f'{name}: field plan output differs from the serializer output')
+
+            results[f'{name}_serializer'] = measure(lambda: JSONRenderer().render(serializer_class(instances, many=True).data), options['repeat'])
+            results[f'{name}_plan'] = measure(lambda: FastJSONRenderer().render(plan.serialize(values)), options['repeat'])
+            before, after = results[f'{name}_serializer']['p50_ms'], results[f'{name}_plan']['p50_ms']
+            self.stdout.write(f'{name}: serializer p50 {before:.3f}ms, plan p50 {after:.3f}ms (x{before / after:.2f})')
+
+        if options['output']:
+            write_results(options['output'], results)
+        if options['compare']:
+            self.stdout.write('\nCompared with baseline (p50):')
+            for name, (before, after, ratio) in compare_results(read_results(options['compare']), results).items():
+                self.stdout.write(f'{name}: {before:.3f}ms -> {after:.3f}ms (speedup x{1 / ratio:.2f})')
+
+    @staticmethod
+    def get_cases(count):
+        # {name: (serializer class, field plan, model, rows as model field values)}
+        rng = random.Random(0)
+        entities = [{'id': position, 'name': f'Entity {position} ÄÖ', 'status': rng.choice('AI')} for position in range(1, count + 1)]
+        addresses = [
+            {
+                'id': position, 'parent_type': rng.choice(['HCP', 'HCO']), 'addr1': f'{position} Main Street',
+                'addr2': rng.choice([None, 'Suite 1']), 'city': f'City {position % 500}', 'state': 'NY',
+                'zip': f'{position:05d}', 'status': 'A',
+            }
+            for position in range(1, count + 1)
+        ]
+        affiliations = []
+        for position in range(1, count + 1):
+            type = rng.choice(['HCP_HCO', 'HCO_HCP', 'HCO_HCO', 'HCP_HCP'])
+            row = dict.fromkeys(LINK_COLUMNS)
+            row.update({'id': position, 'status': 'A', 'type': type})
+            row[f'parent_{type[:3].lower()}_link_id'] = position
+            row[f'child_{type[4:].lower()}_link_id'] = position + 1
+            affiliations.append(row)
+        return {
+            'hcp': (HealthCareProviderSerializer, PROVIDER_PLAN, HealthCareProvider, entities),
+            'hco': (HealthCareOrganizationSerializer, ORGANIZATION_PLAN, HealthCareOrganization, entities),
+            'address': (AddressSerializer, ADDRESS_PLAN, Address, addresses),
+            'affiliation': (AffiliationSerializer, AFFILIATION_PLAN, Affiliation, affiliations),
+        }
@@ -0,0 +1,56 @@
+from django.core.management.base import BaseCommand
+from django.http import HttpResponse
+from django.test import RequestFactory, override_settings
+from data.benchmarks import compare_results, measure, read_results, write_results
+from data.metrics import metrics_middleware
+from data.plans import PROVIDER_PLAN
+from data.renderers import FastJSONRenderer
+from data.timing import server_timing_middleware
+
+# micro-benchmark of the Server-Timing instrumentation (timing.py) on the serialization +
+# rendering of one page: the view alone, through the middleware when the request is not sampled
+# (DATA_SERVER_TIMING_SAMPLE_RATE=0, the hooks only read the context variable), when it is, and
+# through the request metrics middleware (metrics.py).
+# In memory, no database: the per-query wrappers are not measured
+#   python3 manage.py benchmark_timing --rows 100 --output before.json
+#   python3 manage.py benchmark_timing --rows 100 --compare before.json
+
+
+class Command(BaseCommand):
+    help = "Benchmark the overhead of the Server-Timing instrumentation and the request metrics"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", dest="rows", type=int, default=100, help="rows per page")
+        parser.add_argument("--repeat", dest="repeat", type=int, default=500)
+        parser.add_argument("--output", dest="output", type=str, default=None, help="write results to a JSON file")
+        parser.add_argument("--compare", dest="compare", type=str, default=None, help="compare with a previous results file")
+
+    def handle(self, *args, **options):
+        rows = [{'id': position, 'name': f'Entity {position}', 'status': 'A'} for position in range(1, options['rows'] + 1)]
+
+        def view(request):
+            return HttpResponse(FastJSONRenderer().render(PROVIDER_PLAN.serialize(rows)), content_type='application/json')
+
+        request = RequestFactory().get('/api/v1/admin/hcp/')
+        middleware = server_timing_middleware(view)
+        cases = {
+            'view': (view, 0),
+            'not_sampled': (middleware, 0),
+            'sampled': (middleware, 1),
+            'metrics': (metrics_middleware(view), 0),
+        }
+
+        results = {}
+        for name, (handler, rate) in cases.items():
+            with override_settings(DATA_SERVER_TIMING_SAMPLE_RATE=rate, DATA_METRICS=True):
+                results[name] = measure(lambda: handler(request), options['repeat'])
+        base = results['view']['p50_ms']
+        for name, result in results.items():
+            self.stdout.write(f'{name}: p50 {result["p50_ms"]:.3f}ms, p99 {result["p99_ms"]:.3f}ms (x{result["p50_ms"] / base:.2f})')
+
+        if options['output']:
+            write_results(options['output'], results)
+        if options['compare']:
+            self.stdout.write('\nCompared with baseline (p50):')
+            for name, (before, after, ratio) in compare_results(read_results(options['compare']), results).items():
+                self.stdout.write(f'{name}: {before:.3f}ms -> {after:.3f}ms (speedup x{1 / ratio:.2f})')
@@ -0,0 +1,64 @@
+import os
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from data.synthetic import generate_dataset, write_dataset
+from .ingest_data import DEFAULT_BATCH_SIZE, BulkDataProcessor, ParallelDataProcessor
+
+# generates a synthetic dataset (data/synthetic.py) at any scale, streamed: written straight to the
+# configured database with the bulk loader of ingest_data, or to ingest-ready files:
+#   python3 manage.py generate_data --providers 5000000 --organizations 500000 --degree 3 --copy --workers 4
+#   python3 manage.py generate_data --providers 100000 --organizations 10000 --output-dir /tmp/dataset
+#   python3 manage.py ingest_data --hco /tmp/dataset/hco.ndjson --hcp /tmp/dataset/hcp.ndjson ...
+# The same --seed always generates the same dataset
+
+
+class Command(BaseCommand):
+    help = "Generate a synthetic HCP/HCO/address/affiliation dataset into the database or ingest files"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--providers", dest="providers", type=int, default=100000)
+        parser.add_argument("--organizations", dest="organizations", type=int, default=10000)
+        parser.add_argument("--degree", dest="degree", type=int, default=3, help="mean affiliations per entity")
+        parser.add_argument("--seed", dest="seed", type=int, default=0)
+        parser.add_argument("--output-dir", dest="output_dir", type=str, default=None, help="write ingest files instead of database rows")
+        parser.add_argument("--format", dest="format", choices=['ndjson', 'csv'], default='ndjson', help="format of the ingest files")
+        parser.add_argument("--batch-size", dest="batch_size", type=int, default=DEFAULT_BATCH_SIZE)
+        parser.add_argument("--copy", dest="copy", action="store_true", help="use COPY FROM STDIN on PostgreSQL")
+        parser.add_argument("--workers", dest="workers", type=int, default=1, help="insert batches with N worker processes")
+
+    def handle(self, *args, **options):
+        if options['providers'] < 0 or options['organizations'] < 0 or options['degree'] < 0:
+            raise CommandError('--providers, --organizations and --degree must be positive')
+        if options['output_dir']:
+            self.write_files(options)
+        else:
+            self.write_database(options)
+
+    def write_files(self, options):
+        os.makedirs(options['output_dir'], exist_ok=True)
+        start = time.perf_counter()
+        filenames, rows = write_dataset(
+            options['output_dir'], options['organizations'], options['providers'], options['degree'], options['seed'], options['format'],
+        )
+        seconds = time.perf_counter() - start
+        for entity, filename in filenames.items():
+            self.stdout.write(self.style.SUCCESS(f'{entity}: {rows[entity]} rows in {filename}'))
+        self.stdout.write(self.style.SUCCESS(f'Generated {sum(rows.values())} rows in {seconds:.2f}s'))
+        arguments = ' '.join(f'--{entity} {filename}' for entity, filename in filenames.items())
+        self.stdout.write(f'Ingest with: python3 manage.py ingest_data --bulk {arguments}')
+
+    def write_database(self, options):
+        if options['workers'] > 1:
+            processor = ParallelDataProcessor(options['workers'], batch_size=options['batch_size'], use_copy=options['copy'])
+        else:
+            processor = BulkDataProcessor(batch_size=options['batch_size'], use_copy=options['copy'])
+        processor.save_entities(generate_dataset(options['organizations'], options['providers'], options['degree'], options['seed']))
+        if connection.vendor == 'postgresql':
+            # planner statistics of the new rows
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+        for entity, stats in processor.stats.items():
+            self.stdout.write(
+                self.style.SUCCESS(f"{entity}: {stats['rows']} rows in {stats['seconds']:.2f}s ({stats['rows_per_second']:.0f} rows/sec)")
+            )
@@ -1,44 +1,73 @@
-import json
+import csv
+import io
+import time
+from array import array
+from contextlib import contextmanager
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import groupby, islice
+from operator import itemgetter
 from django.core.management.base import BaseCommand
+import django
+from django.apps import apps
+from django.db import connection, connections, transaction
+from django.db.backends.postgresql.psycopg_any import is_psycopg3
 from data.models import Address, HealthCareProvider, HealthCareOrganization, Affiliation
+from data.readers import iter_records
+from data.signals import DATA_MODELS
+from data.versions import bump_generation, invalidate_all
 
 # docs: https://docs.djangoproject.com/en/4.2/howto/custom-management-commands/
+# docs: https://docs.djangoproject.com/en/4.2/ref/models/querysets/#bulk-create
+# docs: https://www.postgresql.org/docs/14/sql-copy.html
 
 # to run: python3 manage.py ingest_data --hco '../config/hco.json' --hcp '../config/hcp.json' --address '../config/addresses.json' --affiliation '../config/affiliations.json'
+# bulk mode: python3 manage.py ingest_data --bulk --batch-size 5000 [--copy] --hco ...
+# parallel mode: python3 manage.py ingest_data --workers 4 --batch-size 5000 --hco ...
+# input files are streamed and can be JSON arrays (.json), NDJSON (.ndjson/.jsonl) or CSV (.csv)
+
+DEFAULT_BATCH_SIZE = 1000
 
 class Command(BaseCommand):
     help = "Ingest example data"
 
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        self.data_processor = DataProcessor()
-
     def add_arguments(self, parser):
         parser.add_argument("--address", dest="address", type=str, required=False, default=None)
         parser.add_argument("--hco", dest="hco", type=str, required=False, default=None)
         parser.add_argument("--hcp", dest="hcp", type=str, required=False, default=None)
         parser.add_argument("--affiliation", dest="affiliation", type=str, required=False, default=None)
+        parser.add_argument("--bulk", dest="bulk", action="store_true", help="insert rows in batches, one transaction per batch")
+        parser.add_argument("--batch-size", dest="batch_size", type=int, default=DEFAULT_BATCH_SIZE)
+        parser.add_argument("--copy", dest="copy", action="store_true", help="use COPY FROM STDIN on PostgreSQL (implies --bulk)")
+        parser.add_argument("--workers", dest="workers", type=int, default=1, help="insert batches with N worker processes (implies --bulk)")
 
     def handle(self, *args, **options):
+        if options.get('workers', 1) > 1:
+            data_processor = ParallelDataProcessor(options['workers'], batch_size=options['batch_size'], use_copy=options.get('copy'))
+        elif options.get('bulk') or options.get('copy'):
+            data_processor = BulkDataProcessor(batch_size=options['batch_size'], use_copy=options.get('copy'))
+        else:
+            data_processor = DataProcessor()
+
         filenames_args = {
-            'address': options.get('address'), 
-            'hco': options.get('hco'), 
+            'address': options.get('address'),
+            'hco': options.get('hco'),
             'hcp': options.get('hcp'),
             'affiliation': options.get('affiliation')
         }
-        data = self.data_processor.read_data_files(filenames_args)
+        data = data_processor.read_data_files(filenames_args)
 
         self.stdout.write(
             self.style.SUCCESS('Successfully read input files')
         )
 
-        self.data_processor.save_entities(data)
-        
+        data_processor.save_entities(data)
+
         report = {
-            'address': len(data.get('address')),
-            'hcp': len(data.get('hcp')),
-            'hco': len(data.get('hco')),
-            'affiliation': len(data.get('affiliation'))
+            'address': data_processor.stats['address']['rows'],
+            'hcp': data_processor.stats['hcp']['rows'],
+            'hco': data_processor.stats['hco']['rows'],
+            'affiliation': data_processor.stats['affiliation']['rows']
         }
         self.stdout.write(
             self.style.SUCCESS('Finished ingesting sample data')
@@ -46,85 +75,155 @@ class Command(BaseCommand):
         self.stdout.write(
             self.style.SUCCESS(f'Report: {report}')
         )
+        for entity, stats in data_processor.stats.items():
+            self.stdout.write(
+                self.style.SUCCESS(f"{entity}: {stats['rows']} rows in {stats['seconds']:.2f}s ({stats['rows_per_second']:.0f} rows/sec)")
+            )
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
 
 
 class DataProcessor:
+    # input records are consumed as iterators; only the "input position -> database id"
+    # mapping is kept in memory, as compact arrays of 64 bit ints
+
+    def __init__(self):
+        self.stats = {}
+
+    @contextmanager
+    def timed(self, entity):
+        stats = {'rows': 0}
+        start = time.perf_counter()
+        yield stats
+        seconds = time.perf_counter() - start
+        stats['seconds'] = seconds
+        stats['rows_per_second'] = stats['rows'] / seconds if seconds else 0
+        self.stats[entity] = stats
 
     def read_data_files(self, filenames):
         data = {}
         for entity, filename in filenames.items():
             if filename:
-                with open(filename) as file:
-                    data[entity] = json.load(file)
+                data[entity] = iter_records(filename)
         return data
-    
+
     def save_entities(self, data):
-        address_entities = list(map(self.save_address, data.get('address', [])))
-        hco_entities = list(map(self.save_hco, data.get('hco', [])))
-        hcp_entities = list(map(self.save_hcp, data.get('hcp', [])))
-        
-        self.handle_address_relations(address_entities, hco_entities, hcp_entities)
-        self.handle_affiliations(data.get('affiliation', []), hco_entities, hcp_entities)
-        
+        with self.timed('address') as stats:
+            # every inserted address, those of other parent types are not linked
+            hco_address_ids, hcp_address_ids, stats['rows'] = self.save_addresses(data.get('address', []))
+        with self.timed('hco') as stats:
+            hco_ids = self.save_organizations(data.get('hco', []))
+            stats['rows'] = len(hco_ids)
+        with self.timed('hcp') as stats:
+            hcp_ids = self.save_providers(data.get('hcp', []))
+            stats['rows'] = len(hcp_ids)
+
+        with self.timed('address_link') as stats:
+            stats['rows'] = self.handle_address_relations(hco_address_ids, hcp_address_ids, hco_ids, hcp_ids)
+        with self.timed('affiliation') as stats:
+            stats['rows'] = self.handle_affiliations(data.get('affiliation', []), hco_ids, hcp_ids)
+
+        # bulk inserts do not send signals, invalidate everything derived from the data tables
+        bump_generation(*DATA_MODELS)
+        invalidate_all()
+
+    def save_addresses(self, addresses):
+        hco_address_ids, hcp_address_ids, total = array('q'), array('q'), 0
+        for address in map(self.save_address, addresses):
+            DataProcessor.append_address_id(address.parent_type, address.id, hco_address_ids, hcp_address_ids)
+            total += 1
+        return hco_address_ids, hcp_address_ids, total
+
+    def save_organizations(self, organizations):
+        return array('q', (organization.id for organization in map(self.save_hco, organizations)))
+
+    def save_providers(self, providers):
+        return array('q', (provider.id for provider in map(self.save_hcp, providers)))
+
     def save_address(self, address):
         address_entity = Address(**DataProcessor.map_address(address))
         address_entity.save()
         return address_entity
-    
+
     def save_hco(self, organization):
         organization_entity = HealthCareOrganization(**DataProcessor.map_hco(organization))
         organization_entity.save()
         return organization_entity
-    
+
     def save_hcp(self, provider):
         provider_entity = HealthCareProvider(**DataProcessor.map_hcp(provider))
         provider_entity.save()
         return provider_entity
-    
-    def save_affiliation(self, affiliation, **kwargs):
-        affiliation_entity = Affiliation.create(**DataProcessor.map_affiliation(affiliation, **kwargs))
-        affiliation_entity.save()
-        return affiliation_entity
-
-    def handle_address_relations(self, address_entities, hco_entities, hcp_entities):
-        address_hco_counter, address_hcp_counter = 0, 0
-        # use positions to determine which hco/hcp, since parent_link IDs from input are disregarded
-        for address in address_entities:
-            match address.parent_type:
-                case 'HCO':
-                    if len(hco_entities) >= address_hco_counter+1:
-                        hco = hco_entities[address_hco_counter]
-                        hco.addresses.set([address])
-                        hco.save()
-                    address_hco_counter += 1
-                case 'HCP':
-                    if len(hcp_entities) >= address_hcp_counter+1:
-                        hcp = hcp_entities[address_hcp_counter]
-                        hcp.addresses.set([address])
-                        hcp.save()
-                    address_hcp_counter += 1
-
-    def handle_affiliations(self, affiliations, hco_entities, hcp_entities):
-        # use parent/child link IDs from input data to determine which hco/hcp positions
+
+    def save_affiliation(self, affiliation, hco_ids, hcp_ids):
+        return Affiliation.objects.create(**DataProcessor.map_affiliation_row(affiliation, hco_ids, hcp_ids))
+
+    def handle_address_relations(self, hco_address_ids, hcp_address_ids, hco_ids, hcp_ids):
+        total = 0
+        for through, row in DataProcessor.address_links(hco_address_ids, hcp_address_ids, hco_ids, hcp_ids):
+            through.objects.create(**row)
+            total += 1
+        return total
+
+    def handle_affiliations(self, affiliations, hco_ids, hcp_ids):
+        total = 0
         for affiliation in affiliations:
-            match affiliation['type']:
-                case 'HCP_HCO':
-                    parent_hcp_link = hcp_entities[affiliation['parent_link']-1]
-                    child_hco_link = hco_entities[affiliation['child_link']-1]
-                    self.save_affiliation(affiliation, parent_hcp_link=parent_hcp_link, child_hco_link=child_hco_link)
-                case 'HCO_HCP':
-                    parent_hco_link = hco_entities[affiliation['parent_link']-1]
-                    child_hcp_link = hcp_entities[affiliation['child_link']-1]
-                    self.save_affiliation(affiliation, parent_hco_link=parent_hco_link, child_hcp_link=child_hcp_link)
-                case 'HCP_HCP':
-                    parent_hcp_link = hcp_entities[affiliation['parent_link']-1]
-                    child_hcp_link = hcp_entities[affiliation['child_link']-1]
-                    self.save_affiliation(affiliation, parent_hcp_link=parent_hcp_link, child_hcp_link=child_hcp_link)
-                case 'HCO_HCO':
-                    parent_hco_link = hco_entities[affiliation['parent_link']-1]
-                    child_hco_link = hco_entities[affiliation['child_link']-1]
-                    self.save_affiliation(affiliation, parent_hco_link=parent_hco_link, child_hco_link=child_hco_link)
-                    
+            self.save_affiliation(affiliation, hco_ids, hcp_ids)
+            total += 1
+        return total
+
+    @staticmethod
+    def append_address_id(parent_type, address_id, hco_address_ids, hcp_address_ids):
+        match parent_type:
+            case 'HCO':
+                hco_address_ids.append(address_id)
+            case 'HCP':
+                hcp_address_ids.append(address_id)
+
+    @staticmethod
+    def address_links(hco_address_ids, hcp_address_ids, hco_ids, hcp_ids):
+        # use positions to determine which hco/hcp, since parent_link IDs from input are disregarded:
+        # the n-th HCO address belongs to the n-th HCO (same for HCP)
+        hco_through = HealthCareOrganization.addresses.through
+        hcp_through = HealthCareProvider.addresses.through
+        for address_id, hco_id in zip(hco_address_ids, hco_ids):
+            yield hco_through, {'healthcareorganization_id': hco_id, 'address_id': address_id}
+        for address_id, hcp_id in zip(hcp_address_ids, hcp_ids):
+            yield hcp_through, {'healthcareprovider_id': hcp_id, 'address_id': address_id}
+
+    @staticmethod
+    def resolve_affiliation_links(affiliation, hco_ids, hcp_ids):
+        # use parent/child link IDs from input data to determine which hco/hcp positions
+        parent_position, child_position = int(affiliation['parent_link'])-1, int(affiliation['child_link'])-1
+        match affiliation['type']:
+            case 'HCP_HCO':
+                return {'parent_hcp_link': hcp_ids[parent_position], 'child_hco_link': hco_ids[child_position]}
+            case 'HCO_HCP':
+                return {'parent_hco_link': hco_ids[parent_position], 'child_hcp_link': hcp_ids[child_position]}
+            case 'HCP_HCP':
+                return {'parent_hcp_link': hcp_ids[parent_position], 'child_hcp_link': hcp_ids[child_position]}
+            case 'HCO_HCO':
+                return {'parent_hco_link': hco_ids[parent_position], 'child_hco_link': hco_ids[child_position]}
+        return {}
+
+    @staticmethod
+    def map_affiliation_row(affiliation, hco_ids, hcp_ids):
+        links = DataProcessor.resolve_affiliation_links(affiliation, hco_ids, hcp_ids)
+        data = DataProcessor.map_affiliation(affiliation, **links)
+        Affiliation.validate(**data)
+        return {
+            'type': data['type'],
+            'status': data['status'],
+            'parent_hco_link_id': data['parent_hco_link'],
+            'parent_hcp_link_id': data['parent_hcp_link'],
+            'child_hcp_link_id': data['child_hcp_link'],
+            'child_hco_link_id': data['child_hco_link']
+        }
+
     @staticmethod
     def map_address(address_entity):
         return {
@@ -136,21 +235,21 @@ class DataProcessor:
             'zip': address_entity['zip'],
             'status': address_entity['status'],
         }
-    
+
     @staticmethod
     def map_hco(organization_entity):
         return {
             'name': organization_entity['name'],
             'status': organization_entity['status'],
         }
-    
+
     @staticmethod
     def map_hcp(provider_entity):
         return {
             'name': provider_entity['name'],
             'status': provider_entity['status'],
         }
-    
+
     @staticmethod
     def map_affiliation(affiliation_entity, parent_hco_link=None, parent_hcp_link=None, child_hcp_link=None, child_hco_link=None):
         return {
@@ -161,3 +260,152 @@ class DataProcessor:
             'child_hcp_link': child_hcp_link,
             'child_hco_link': child_hco_link
         }
+
+
+class BulkDataProcessor(DataProcessor):
+    # writes every phase in batches, with one transaction per batch
+
+    def __init__(self, batch_size=DEFAULT_BATCH_SIZE, use_copy=False):
+        super().__init__()
+        self.batch_size = batch_size
+        self.use_copy = bool(use_copy) and connection.vendor == 'postgresql'
+
+    def save_addresses(self, addresses):
+        hco_address_ids, hcp_address_ids, total = array('q'), array('q'), 0
+        batches = batched(map(DataProcessor.map_address, addresses), self.batch_size)
+        for batch, ids in self.insert_batches(Address, batches, returning=True):
+            for row, address_id in zip(batch, ids):
+                DataProcessor.append_address_id(row['parent_type'], address_id, hco_address_ids, hcp_address_ids)
+            total += len(batch)
+        return hco_address_ids, hcp_address_ids, total
+
+    def save_organizations(self, organizations):
+        return self.bulk_save(HealthCareOrganization, map(DataProcessor.map_hco, organizations))
+
+    def save_providers(self, providers):
+        return self.bulk_save(HealthCareProvider, map(DataProcessor.map_hcp, providers))
+
+    def bulk_save(self, model, rows):
+        ids = array('q')
+        for _, batch_ids in self.insert_batches(model, batched(rows, self.batch_size), returning=True):
+            ids.extend(batch_ids)
+        return ids
+
+    def handle_address_relations(self, hco_address_ids, hcp_address_ids, hco_ids, hcp_ids):
+        # written straight into the m2m through tables
+        total = 0
+        links = DataProcessor.address_links(hco_address_ids, hcp_address_ids, hco_ids, hcp_ids)
+        for through, through_links in groupby(links, key=itemgetter(0)):
+            rows = (row for _, row in through_links)
+            for batch, _ in self.insert_batches(through, batched(rows, self.batch_size)):
+                total += len(batch)
+        return total
+
+    def handle_affiliations(self, affiliations, hco_ids, hcp_ids):
+        total = 0
+        rows = (DataProcessor.map_affiliation_row(affiliation, hco_ids, hcp_ids) for affiliation in affiliations)
+        for batch, _ in self.insert_batches(Affiliation, batched(rows, self.batch_size)):
+            total += len(batch)
+        return total
+
+    def insert_batches(self, model, batches, returning=False):
+        # yields (batch, ids) in input order
+        for batch in batches:
+            yield batch, self.insert_rows(model, batch, returning)
+
+    def insert_rows(self, model, rows, returning=False):
+        # rows are dicts keyed by field attname; returns the new ids when requested
+        with transaction.atomic():
+            if self.use_copy:
+                return self.copy_rows(model, rows, returning)
+            entities = model.objects.bulk_create([model(**row) for row in rows])
+            return [entity.id for entity in entities] if returning else []
+
+    def copy_rows(self, model, rows, returning):
+        table = model._meta.db_table
+        fields = [field for field in model._meta.concrete_fields if not field.primary_key]
+        columns = [field.column for field in fields]
+        quote_name = connection.ops.quote_name
+
+        with connection.cursor() as cursor:
+            ids = []
+            if returning:
+                # COPY cannot return generated keys, so reserve them from the sequence first
+                cursor.execute(
+                    "SELECT nextval(pg_get_serial_sequence(%s, 'id')) FROM generate_series(1, %s)",
+                    [table, len(rows)]
+                )
+                ids = [row[0] for row in cursor.fetchall()]
+                columns = ['id', *columns]
+
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            for position, row in enumerate(rows):
+                values = [BulkDataProcessor.copy_value(row.get(field.attname)) for field in fields]
+                writer.writerow([ids[position], *values] if returning else values)
+            buffer.seek(0)
+
+            sql = f"COPY {quote_name(table)} ({', '.join(map(quote_name, columns))}) FROM STDIN WITH (FORMAT csv, NULL '\\N')"
+            if is_psycopg3:
+                with cursor.copy(sql) as copy:
+                    copy.write(buffer.getvalue())
+            else:
+                cursor.copy_expert(sql, buffer)
+        return ids
+
+    @staticmethod
+    def copy_value(value):
+        return '\\N' if value is None else value
+
+
+class ParallelDataProcessor(BulkDataProcessor):
+    # same phases as BulkDataProcessor (entities first, then address links and affiliations),
+    # but the batches of each phase are inserted by a pool of worker processes, each one
+    # using its own database connection. Results are consumed in input order, so the
+    # "input position -> database id" mapping built in this process stays correct
+
+    def __init__(self, workers, batch_size=DEFAULT_BATCH_SIZE, use_copy=False):
+        super().__init__(batch_size=batch_size, use_copy=use_copy)
+        self.workers = workers
+        self.executor = None
+
+    def save_entities(self, data):
+        if self.workers <= 1:
+            return super().save_entities(data)
+
+        # forked workers must not share this process' connection, they open their own
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=self.workers, initializer=init_worker) as executor:
+            self.executor = executor
+            try:
+                super().save_entities(data)
+            finally:
+                self.executor = None
+
+    def insert_batches(self, model, batches, returning=False):
+        if self.executor is None:
+            yield from super().insert_batches(model, batches, returning)
+            return
+
+        # keep a bounded window of batches in flight so the input is still streamed
+        window = self.workers * 2
+        pending = deque()
+        for batch in batches:
+            pending.append((batch, self.executor.submit(insert_batch, model._meta.label, batch, returning, self.use_copy)))
+            if len(pending) >= window:
+                batch, future = pending.popleft()
+                yield batch, future.result()
+        while pending:
+            batch, future = pending.popleft()
+            yield batch, future.result()
+
+
+def init_worker():
+    if not apps.ready:
+        django.setup()
+    connections.close_all()
+
+
+def insert_batch(model_label, rows, returning, use_copy):
+    processor = BulkDataProcessor(batch_size=len(rows), use_copy=use_copy)
+    return processor.insert_rows(apps.get_model(model_label), rows, returning)
@@ -0,0 +1,332 @@
+import json
+import os
+import tempfile
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.utils.decorators import sync_and_async_middleware
+from .cache import get_stats as get_cache_stats
+
+# doc: https://prometheus.io/docs/instrumenting/exposition_formats/#text-based-format
+# doc: https://prometheus.io/docs/practices/histograms/
+# request metrics of every request, served in the Prometheus text format by the /metrics endpoint:
+# - latency histogram per URL name (fixed buckets), requests per URL name and status code
+# - SQL queries and their time per URL name, with DATA_METRICS_SQL: an execute wrapper on every
+#   query of every request (a context variable lookup and two perf_counter calls per query)
+# - response cache hits, misses and 304s (cache.py)
+# Each thread updates its own shard of the counters (uncontended lock, only taken by the scrape
+# otherwise). With DATA_METRICS_DIR, each process writes its counters to <dir>/<pid>.json every
+# DATA_METRICS_FLUSH_INTERVAL seconds and the endpoint sums the files of every process; the
+# directory should be emptied when the service starts. Without it the counters are per process.
+# A request costs a perf_counter pair and a shard update: the stage hooks of timing.py stay off
+# unless Server-Timing samples the request (benchmark_timing)
+
+# seconds, the last bucket is +Inf
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+UNMATCHED = 'unmatched'
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def is_enabled():
+    return getattr(settings, 'DATA_METRICS', True)
+
+
+def is_sql_enabled():
+    return getattr(settings, 'DATA_METRICS_SQL', False)
+
+
+def get_metrics_dir():
+    return getattr(settings, 'DATA_METRICS_DIR', None)
+
+
+def get_flush_interval():
+    return getattr(settings, 'DATA_METRICS_FLUSH_INTERVAL', 5.0)
+
+
+def new_view_counters():
+    # non-cumulative bucket counts, duration sum, SQL queries and their time
+    return {'buckets': [0] * (len(BUCKETS) + 1), 'sum': 0.0, 'queries': 0, 'query_seconds': 0.0}
+
+
+class Shard:
+    # counters of one thread
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.views = {}
+        self.statuses = {}
+
+    def observe(self, view, status, duration, queries, query_seconds):
+        with self.lock:
+            counters = self.views.get(view)
+            if counters is None:
+                counters = self.views[view] = new_view_counters()
+            counters['buckets'][bisect_left(BUCKETS, duration)] += 1
+            counters['sum'] += duration
+            counters['queries'] += queries
+            counters['query_seconds'] += query_seconds
+            key = (view, status)
+            self.statuses[key] = self.statuses.get(key, 0) + 1
+
+
+class Registry:
+    def __init__(self):
+        self.local = threading.local()
+        self.shards = []
+        self.lock = threading.Lock()
+        self.flushed_at = time.monotonic()
+        self.flush_lock = threading.Lock()
+
+    def get_shard(self):
+        shard = getattr(self.local, 'shard', None)
+        if shard is None:
+            shard = self.local.shard = Shard()
+            with self.lock:
+                self.shards.append(shard)
+        return shard
+
+    def observe(self, view, status, duration, queries=0, query_seconds=0.0):
+        self.get_shard().observe(view, status, duration, queries, query_seconds)
+
+    def snapshot(self):
+        # counters of the process, JSON serializable
+        views, statuses = {}, {}
+        with self.lock:
+            shards = list(self.shards)
+        for shard in shards:
+            with shard.lock:
+                merge_views(views, shard.views)
+                for (view, status), count in shard.statuses.items():
+                    key = f'{view} {status}'
+                    statuses[key] = statuses.get(key, 0) + count
+        cache = get_cache_stats()
+        return {
+            'views': views,
+            'statuses': statuses,
+            'cache': {'hit': cache['hits'], 'miss': cache['misses'], 'not_modified': cache['not_modified']},
+        }
+
+    def clear(self):
+        with self.lock:
+            self.shards.clear()
+        self.local = threading.local()
+
+    def flush(self, force=False):
+        # writes the snapshot of the process to DATA_METRICS_DIR, one thread at a time
+        directory = get_metrics_dir()
+        if not directory or (not force and time.monotonic() - self.flushed_at < get_flush_interval()):
+            return
+        if not self.flush_lock.acquire(blocking=force):
+            return
+        try:
+            self.flushed_at = time.monotonic()
+            write_snapshot(directory, os.getpid(), self.snapshot())
+        finally:
+            self.flush_lock.release()
+
+    def should_flush(self):
+        return bool(get_metrics_dir()) and time.monotonic() - self.flushed_at >= get_flush_interval()
+
+
+_registry = Registry()
+
+
+def get_registry():
+    return _registry
+
+
+def merge_views(total, views):
+    for view, counters in views.items():
+        merged = total.get(view)
+        if merged is None:
+            merged = total[view] = new_view_counters()
+        merged['buckets'] = [left + right for left, right in zip(merged['buckets'], counters['buckets'])]
+        for name in ('sum', 'queries', 'query_seconds'):
+            merged[name] += counters[name]
+
+
+def merge_snapshots(snapshots):
+    total = {'views': {}, 'statuses': {}, 'cache': {'hit': 0, 'miss': 0, 'not_modified': 0}}
+    for snapshot in snapshots:
+        merge_views(total['views'], snapshot['views'])
+        for key, count in snapshot['statuses'].items():
+            total['statuses'][key] = total['statuses'].get(key, 0) + count
+        for name, count in snapshot['cache'].items():
+            total['cache'][name] += count
+    return total
+
+
+def write_snapshot(directory, pid, snapshot):
+    # atomic replace, a concurrent scrape reads the previous or the new file
+    os.makedirs(directory, exist_ok=True)
+    descriptor, temporary = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(descriptor, 'w') as file:
+            json.dump(snapshot, file)
+        os.replace(temporary, os.path.join(directory, f'{pid}.json'))
+    except BaseException:
+        os.unlink(temporary)
+        raise
+
+
+def read_snapshots(directory, exclude_pid=None):
+    snapshots = []
+    for name in os.listdir(directory):
+        if not name.endswith('.json') or name == f'{exclude_pid}.json':
+            continue
+        try:
+            with open(os.path.join(directory, name)) as file:
+                snapshots.append(json.load(file))
+        except (OSError, ValueError):
+            # removed or being replaced
+            continue
+    return snapshots
+
+
+def collect():
+    # counters of every process: the live counters of this one and the files of the others
+    snapshot = _registry.snapshot()
+    directory = get_metrics_dir()
+    if not directory:
+        return snapshot
+    _registry.flush(force=True)
+    return merge_snapshots([snapshot, *read_snapshots(directory, exclude_pid=os.getpid())])
+
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render_metrics(snapshot):
+    lines = [
+        '# HELP data_request_duration_seconds Request latency by URL name.',
+        '# TYPE data_request_duration_seconds histogram',
+    ]
+    views = sorted(snapshot['views'].items())
+    for view, counters in views:
+        label, cumulative = escape_label(view), 0
+        for bound, count in zip([*map(str, BUCKETS), '+Inf'], counters['buckets']):
+            cumulative += count
+            lines.append(f'data_request_duration_seconds_bucket{{view="{label}",le="{bound}"}} {cumulative}')
+        lines.append(f'data_request_duration_seconds_sum{{view="{label}"}} {format_value(counters["sum"])}')
+        lines.append(f'data_request_duration_seconds_count{{view="{label}"}} {cumulative}')
+
+    lines += ['# HELP data_requests_total Requests by URL name and status code.', '# TYPE data_requests_total counter']
+    for key, count in sorted(snapshot['statuses'].items()):
+        view, status = key.rsplit(' ', 1)
+        lines.append(f'data_requests_total{{view="{escape_label(view)}",status="{status}"}} {count}')
+
+    if is_sql_enabled():
+        lines += ['# HELP data_db_queries_total SQL queries by URL name.', '# TYPE data_db_queries_total counter']
+        lines += [f'data_db_queries_total{{view="{escape_label(view)}"}} {counters["queries"]}' for view, counters in views]
+        lines += ['# HELP data_db_query_seconds_total SQL query time by URL name.', '# TYPE data_db_query_seconds_total counter']
+        lines += [f'data_db_query_seconds_total{{view="{escape_label(view)}"}} {format_value(counters["query_seconds"])}' for view, counters in views]
+
+    cache = snapshot['cache']
+    lines += ['# HELP data_cache_requests_total Response cache lookups by result.', '# TYPE data_cache_requests_total counter']
+    lines += [f'data_cache_requests_total{{result="{result}"}} {count}' for result, count in sorted(cache.items())]
+    lookups = cache['hit'] + cache['miss']
+    lines += ['# HELP data_cache_hit_ratio Response cache hits per lookup.', '# TYPE data_cache_hit_ratio gauge']
+    lines.append(f'data_cache_hit_ratio {format_value(cache["hit"] / lookups if lookups else 0.0)}')
+    return '\n'.join(lines) + '\n'
+
+
+def get_view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return UNMATCHED
+    return match.url_name or match.view_name
+
+
+_queries = ContextVar('data_metrics_queries', default=None)
+
+
+class QueryCounter:
+    # SQL queries of the current request and their time
+    def __init__(self):
+        self.queries = 0
+        self.seconds = 0.0
+
+
+def count_query(execute, sql, params, many, context):
+    counter = _queries.get()
+    if counter is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        counter.queries += 1
+        counter.seconds += time.perf_counter() - start
+
+
+def install_query_counter(connection):
+    if count_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(count_query)
+
+
+@receiver(connection_created)
+def handle_connection_created(sender, connection, **kwargs):
+    # only with the SQL metrics, no wrapper on the queries otherwise
+    if is_enabled() and is_sql_enabled():
+        install_query_counter(connection)
+
+
+def start_query_counter():
+    # (counter, token of _queries), (None, None) without the SQL metrics
+    if not is_sql_enabled():
+        return None, None
+    # connections opened before the SQL metrics were enabled (connection_created)
+    for connection in connections.all(initialized_only=True):
+        install_query_counter(connection)
+    counter = QueryCounter()
+    return counter, _queries.set(counter)
+
+
+def record(request, response, started, counter):
+    queries, seconds = (counter.queries, counter.seconds) if counter is not None else (0, 0.0)
+    _registry.observe(get_view_name(request), response.status_code, time.perf_counter() - started, queries, seconds)
+
+
+@sync_and_async_middleware
+def metrics_middleware(get_response):
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            if not is_enabled():
+                return await get_response(request)
+            started = time.perf_counter()
+            counter, token = start_query_counter()
+            try:
+                response = await get_response(request)
+            finally:
+                if token is not None:
+                    _queries.reset(token)
+            record(request, response, started, counter)
+            if _registry.should_flush():
+                await sync_to_async(_registry.flush)()
+            return response
+        return middleware
+
+    def middleware(request):
+        if not is_enabled():
+            return get_response(request)
+        started = time.perf_counter()
+        counter, token = start_query_counter()
+        try:
+            response = get_response(request)
+        finally:
+            if token is not None:
+                _queries.reset(token)
+        record(request, response, started, counter)
+        _registry.flush()
+        return response
+    return middleware
@@ -0,0 +1,86 @@
+# Generated by Django 4.2.6 on 2026-10-18 20:20
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Address',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('parent_type', models.CharField(choices=[('hcp', 'HCP'), ('hco', 'HCO')], max_length=3)),
+                ('addr1', models.CharField(max_length=200)),
+                ('addr2', models.CharField(blank=True, max_length=200, null=True)),
+                ('city', models.CharField(max_length=200)),
+                ('state', models.CharField(max_length=50)),
+                ('zip', models.CharField(max_length=10)),
+                ('status', models.CharField(choices=[('I', 'INACTIVE'), ('A', 'ACTIVE')], max_length=1)),
+            ],
+            options={
+                'db_table': 'address',
+            },
+        ),
+        migrations.CreateModel(
+            name='HealthCareProvider',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=200)),
+                ('status', models.CharField(choices=[('I', 'INACTIVE'), ('A', 'ACTIVE')], max_length=1)),
+                ('addresses', models.ManyToManyField(to='data.address')),
+            ],
+            options={
+                'db_table': 'hcp',
+            },
+        ),
+        migrations.CreateModel(
+            name='HealthCareOrganization',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=200)),
+                ('status', models.CharField(choices=[('I', 'INACTIVE'), ('A', 'ACTIVE')], max_length=1)),
+                ('addresses', models.ManyToManyField(to='data.address')),
+            ],
+            options={
+                'db_table': 'hco',
+            },
+        ),
+        migrations.CreateModel(
+            name='Affiliation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('type', models.CharField(choices=[('HCP_HCO', 'HCP_HCO'), ('HCO_HCP', 'HCO_HCP'), ('HCO_HCO', 'HCO_HCO'), ('HCP_HCP', 'HCP_HCP')], max_length=7)),
+                ('status', models.CharField(choices=[('I', 'INACTIVE'), ('A', 'ACTIVE')], max_length=1)),
+                ('child_hco_link', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='child_hco_link', to='data.healthcareorganization')),
+                ('child_hcp_link', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='child_hcp_link', to='data.healthcareprovider')),
+                ('parent_hco_link', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='parent_hco_link', to='data.healthcareorganization')),
+                ('parent_hcp_link', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='parent_hcp_link', to='data.healthcareprovider')),
+            ],
+            options={
+                'db_table': 'affiliation',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='affiliation',
+            constraint=models.UniqueConstraint(fields=('parent_hcp_link', 'child_hcp_link', 'type'), name='unique_affiliation_link_hcp_hcp'),
+        ),
+        migrations.AddConstraint(
+            model_name='affiliation',
+            constraint=models.UniqueConstraint(fields=('parent_hcp_link', 'child_hco_link', 'type'), name='unique_affiliation_link_hcp_hco'),
+        ),
+        migrations.AddConstraint(
+            model_name='affiliation',
+            constraint=models.UniqueConstraint(fields=('parent_hco_link', 'child_hcp_link', 'type'), name='unique_affiliation_link_hco_hcp'),
+        ),
+        migrations.AddConstraint(
+            model_name='affiliation',
+            constraint=models.UniqueConstraint(fields=('parent_hco_link', 'child_hco_link', 'type'), name='unique_affiliation_link_hco_hco'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 4.2.6 on 2026-10-18 20:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='address',
+            index=models.Index(fields=['status', 'parent_type', 'id'], name='address_status_type_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='address',
+            index=models.Index(condition=models.Q(('status', 'A')), fields=['id'], name='address_active_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='affiliation',
+            index=models.Index(fields=['status', 'type', 'id'], name='affiliation_status_type_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='affiliation',
+            index=models.Index(condition=models.Q(('status', 'A')), fields=['id'], name='affiliation_active_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='healthcareorganization',
+            index=models.Index(fields=['status', 'id'], name='hco_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='healthcareprovider',
+            index=models.Index(fields=['status', 'id'], name='hcp_status_idx'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+from django.db import migrations
+
+# doc: https://www.postgresql.org/docs/current/pgtrgm.html#PGTRGM-INDEX
+# indexes of the name search (data/search.py), PostgreSQL only: a btree on lower(name) for the
+# prefix matches and a trigram GIN index for the similar names. Not model Meta indexes, other
+# databases have neither the operator classes nor the extension (the search scans the names there)
+
+TABLES = ('hcp', 'hco')
+
+
+def create_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for table in TABLES:
+        schema_editor.execute(f'CREATE INDEX IF NOT EXISTS {table}_name_prefix_idx ON {table} (lower(name) text_pattern_ops)')
+        schema_editor.execute(f'CREATE INDEX IF NOT EXISTS {table}_name_trgm_idx ON {table} USING gin (name gin_trgm_ops)')
+
+
+def drop_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for table in TABLES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {table}_name_prefix_idx')
+        schema_editor.execute(f'DROP INDEX IF EXISTS {table}_name_trgm_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data', '0002_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
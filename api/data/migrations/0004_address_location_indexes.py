@@ -0,0 +1,26 @@
+# Generated by Django 4.2.6 on 2026-10-18 20:56
+
+from django.db import migrations, models
+import django.db.models.functions.text
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data', '0003_name_search'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='address',
+            index=models.Index(models.F('status'), django.db.models.functions.text.Upper('state'), django.db.models.functions.text.Upper('city'), models.F('id'), name='address_state_city_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='address',
+            index=models.Index(models.F('status'), django.db.models.functions.text.Upper('city'), models.F('id'), name='address_city_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='address',
+            index=models.Index(fields=['status', 'zip'], name='address_zip_idx', opclasses=['varchar_pattern_ops', 'varchar_pattern_ops']),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.6 on 2026-10-18 22:47
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data', '0004_address_location_indexes'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='address',
+            name='address_active_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='affiliation',
+            name='affiliation_active_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='healthcareorganization',
+            name='hco_status_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='healthcareprovider',
+            name='hcp_status_idx',
+        ),
+    ]
@@ -0,0 +1,141 @@
+from django.conf import settings
+from django.db import connection, connections
+from django.db.models import Q
+from rest_framework.exceptions import ValidationError
+from .models import HealthCareProvider, HealthCareOrganization, Affiliation
+from .plans import AFFILIATION_PLAN, ORGANIZATION_PLAN, PROVIDER_PLAN
+
+# doc: https://www.postgresql.org/docs/current/queries-with.html#QUERIES-WITH-RECURSIVE
+# affiliation network of an HCP/HCO: the entities reachable through affiliations (either way,
+# parent or child) up to `depth` hops, and the affiliations between them.
+# Breadth first, one level per step with the set of visited entities so every entity is expanded
+# once whatever the cycles: a single recursive query on PostgreSQL, one query per level otherwise
+
+HCP, HCO = 'HCP', 'HCO'
+NODE_MODELS = {HCP: HealthCareProvider, HCO: HealthCareOrganization}
+NODE_PLANS = {HCP: PROVIDER_PLAN, HCO: ORGANIZATION_PLAN}
+LINK_COLUMNS = ['parent_hcp_link_id', 'parent_hco_link_id', 'child_hcp_link_id', 'child_hco_link_id']
+
+# one row per level: (depth, hcp ids, hco ids). The lateral arrays are the entities linked to the
+# previous level minus the visited ones, each branch reads one side of the affiliation through the
+# foreign key indexes. Stops at `depth`, on an empty level, or past `max_nodes` visited entities
+NETWORK_SQL = '''
+WITH RECURSIVE levels(depth, hcp, hco, visited_hcp, visited_hco) AS (
+    SELECT 0, %(hcp)s::bigint[], %(hco)s::bigint[], %(hcp)s::bigint[], %(hco)s::bigint[]
+  UNION ALL
+    SELECT levels.depth + 1, next.hcp, next.hco, levels.visited_hcp || next.hcp, levels.visited_hco || next.hco
+    FROM levels
+    CROSS JOIN LATERAL (
+        SELECT
+            ARRAY(
+                SELECT child_hcp_link_id FROM affiliation
+                WHERE status = %(status)s AND child_hcp_link_id IS NOT NULL
+                  AND (parent_hcp_link_id = ANY(levels.hcp) OR parent_hco_link_id = ANY(levels.hco))
+                UNION
+                SELECT parent_hcp_link_id FROM affiliation
+                WHERE status = %(status)s AND parent_hcp_link_id IS NOT NULL
+                  AND (child_hcp_link_id = ANY(levels.hcp) OR child_hco_link_id = ANY(levels.hco))
+                EXCEPT
+                SELECT unnest(levels.visited_hcp)
+            ) AS hcp,
+            ARRAY(
+                SELECT child_hco_link_id FROM affiliation
+                WHERE status = %(status)s AND child_hco_link_id IS NOT NULL
+                  AND (parent_hcp_link_id = ANY(levels.hcp) OR parent_hco_link_id = ANY(levels.hco))
+                UNION
+                SELECT parent_hco_link_id FROM affiliation
+                WHERE status = %(status)s AND parent_hco_link_id IS NOT NULL
+                  AND (child_hcp_link_id = ANY(levels.hcp) OR child_hco_link_id = ANY(levels.hco))
+                EXCEPT
+                SELECT unnest(levels.visited_hco)
+            ) AS hco
+    ) AS next
+    WHERE levels.depth < %(depth)s
+      AND cardinality(levels.hcp) + cardinality(levels.hco) > 0
+      AND cardinality(levels.visited_hcp) + cardinality(levels.visited_hco) <= %(max_nodes)s
+)
+SELECT depth, hcp, hco FROM levels ORDER BY depth
+'''
+
+
+def get_network_params(request):
+    # (depth, status) query params of the network endpoints
+    max_depth = getattr(settings, 'DATA_NETWORK_MAX_DEPTH', 4)
+    try:
+        depth = int(request.query_params.get('depth', 1))
+    except ValueError:
+        depth = -1
+    if not 0 <= depth <= max_depth:
+        raise ValidationError({'depth': f'Must be an integer between 0 and {max_depth}.'})
+    return depth, request.query_params.get('status', 'A')
+
+
+def walk_levels_cte(node, depth, status, max_nodes):
+    kind, id = node
+    params = {
+        'hcp': [id] if kind == HCP else [],
+        'hco': [id] if kind == HCO else [],
+        'status': status,
+        'depth': depth,
+        'max_nodes': max_nodes,
+    }
+    # the database of the reads of Affiliation, a replica for the GET endpoints (routers.py)
+    with connections[Affiliation.objects.db].cursor() as cursor:
+        cursor.execute(NETWORK_SQL, params)
+        return [{(HCP, id) for id in hcp} | {(HCO, id) for id in hco} for _, hcp, hco in cursor.fetchall()]
+
+
+def walk_levels(node, depth, status, max_nodes):
+    # same walk as NETWORK_SQL, one query per level
+    levels, visited = [{node}], {node}
+    while len(levels) <= depth and levels[-1] and len(visited) <= max_nodes:
+        frontier = levels[-1]
+        hcp_ids = [id for kind, id in frontier if kind == HCP]
+        hco_ids = [id for kind, id in frontier if kind == HCO]
+        rows = Affiliation.objects.filter(
+            Q(parent_hcp_link_id__in=hcp_ids) | Q(parent_hco_link_id__in=hco_ids) | Q(child_hcp_link_id__in=hcp_ids) | Q(child_hco_link_id__in=hco_ids),
+            status=status,
+        ).values_list(*LINK_COLUMNS)
+
+        level = set()
+        for parent_hcp, parent_hco, child_hcp, child_hco in rows:
+            parent = (HCP, parent_hcp) if parent_hcp is not None else (HCO, parent_hco)
+            child = (HCP, child_hcp) if child_hcp is not None else (HCO, child_hco)
+            if parent in frontier:
+                level.add(child)
+            if child in frontier:
+                level.add(parent)
+        level.difference_update(visited)
+        visited.update(level)
+        levels.append(level)
+    return levels
+
+
+def get_network(node, depth, status, max_nodes=None, walk=None):
+    # node: (HCP|HCO, id). Nodes ordered by depth, type and id, at most `max_nodes` (DATA_NETWORK_MAX_NODES).
+    # walk: levels of the entities reachable from the node, e.g. the in-memory graph index (graph.py)
+    if max_nodes is None:
+        max_nodes = getattr(settings, 'DATA_NETWORK_MAX_NODES', 1000)
+    if walk is None:
+        walk = walk_levels_cte if connection.vendor == 'postgresql' else walk_levels
+    nodes = [(level_depth, kind, id) for level_depth, level in enumerate(walk(node, depth, status, max_nodes)) for kind, id in sorted(level)]
+    truncated = len(nodes) > max_nodes
+    nodes = nodes[:max_nodes]
+
+    ids = {kind: [id for _, node_kind, id in nodes if node_kind == kind] for kind in NODE_MODELS}
+    details = {
+        (kind, row['id']): NODE_PLANS[kind].serialize_one(row)
+        for kind, model in NODE_MODELS.items() if ids[kind]
+        for row in NODE_PLANS[kind].rows(model.objects.filter(id__in=ids[kind]))
+    }
+    edges = Affiliation.objects.filter(
+        Q(parent_hcp_link_id__in=ids[HCP]) | Q(parent_hco_link_id__in=ids[HCO]),
+        Q(child_hcp_link_id__in=ids[HCP]) | Q(child_hco_link_id__in=ids[HCO]),
+        status=status,
+    ).order_by('id')
+
+    return {
+        'nodes': [{'type': kind, **details[kind, id], 'depth': node_depth} for node_depth, kind, id in nodes if (kind, id) in details],
+        'edges': AFFILIATION_PLAN.serialize(AFFILIATION_PLAN.rows(edges)),
+        'truncated': truncated,
+    }
@@ -0,0 +1,247 @@
+import base64
+import hashlib
+import json
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connections
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import BasePagination, LimitOffsetPagination, _positive_int
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+from .routers import is_fresh
+from .versions import get_cache, get_generation
+
+# doc: https://www.django-rest-framework.org/api-guide/pagination/#custom-pagination
+# doc: https://use-the-index-luke.com/no-offset
+# doc: https://wiki.postgresql.org/wiki/Count_estimate
+
+COUNT_EXACT = 'exact'
+COUNT_ESTIMATE = 'estimate'
+COUNT_NONE = 'none'
+COUNT_MODES = (COUNT_EXACT, COUNT_ESTIMATE, COUNT_NONE)
+
+
+def encode_cursor(position):
+    return base64.urlsafe_b64encode(json.dumps(position, separators=(',', ':')).encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        position = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, TypeError):
+        raise NotFound('Invalid cursor')
+    if not isinstance(position, dict):
+        raise NotFound('Invalid cursor')
+    return position
+
+
+class KeysetPagination(BasePagination):
+    # seeks by primary key (id > last id) instead of skipping rows with OFFSET,
+    # so every page costs the same regardless of how deep it is
+    cursor_query_param = 'cursor'
+    after_id_query_param = 'after_id'
+    limit_query_param = 'limit'
+    default_limit = api_settings.PAGE_SIZE
+    max_limit = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        return self.finish_page(list(self.get_page_queryset(queryset, request)))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        # async views (async ORM)
+        return self.finish_page([item async for item in self.get_page_queryset(queryset, request)])
+
+    def get_page_queryset(self, queryset, request):
+        self.request = request
+        self.limit = self.get_limit(request)
+        after_id = self.get_after_id(request)
+
+        queryset = queryset.order_by('id')
+        if after_id is not None:
+            queryset = queryset.filter(id__gt=after_id)
+        return queryset[:self.limit + 1]
+
+    def finish_page(self, page):
+        self.has_next = len(page) > self.limit
+        page = page[:self.limit]
+        self.last_id = KeysetPagination.get_id(page[-1]) if page else None
+        return page
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'next_cursor': self.get_next_cursor(),
+            'results': data
+        })
+
+    def get_limit(self, request):
+        try:
+            return _positive_int(request.query_params[self.limit_query_param], strict=True, cutoff=self.max_limit)
+        except (KeyError, ValueError):
+            return self.default_limit
+
+    def get_after_id(self, request):
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor:
+            after_id = decode_cursor(cursor).get('id')
+            if not isinstance(after_id, int):
+                raise NotFound('Invalid cursor')
+            return after_id
+
+        after_id = request.query_params.get(self.after_id_query_param)
+        if after_id is None:
+            return None
+        try:
+            return int(after_id)
+        except ValueError:
+            raise ValidationError({self.after_id_query_param: 'A valid integer is required.'})
+
+    def get_next_cursor(self):
+        if not self.has_next:
+            return None
+        return encode_cursor({'id': self.last_id})
+
+    def get_next_link(self):
+        cursor = self.get_next_cursor()
+        if cursor is None:
+            return None
+        url = remove_query_param(self.request.build_absolute_uri(), self.after_id_query_param)
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    @staticmethod
+    def get_id(item):
+        return item['id'] if isinstance(item, dict) else item.pk
+
+
+def count_cache_key(queryset):
+    # per-filter key (ordering does not change the count), invalidated by any write to the model (generation bump)
+    sql_hash = hashlib.md5(str(queryset.order_by().query).encode()).hexdigest()
+    return f'count:{queryset.model._meta.label_lower}:{get_generation(queryset.model)}:{sql_hash}'
+
+
+def get_cached_count(queryset):
+    return get_cache().get(count_cache_key(queryset))
+
+
+def set_cached_count(queryset, count):
+    # not stored when counted on a replica that may miss the last writes (routers.py)
+    if is_fresh(get_generation(queryset.model)):
+        get_cache().set(count_cache_key(queryset), count)
+
+
+def get_planner_estimate(queryset):
+    connection = connections[queryset.db]
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+def estimate_count(queryset):
+    # returns (count, is_exact): a cached per-filter count if there is one, else the
+    # PostgreSQL planner estimate, else (other databases) an exact count that gets cached
+    count = get_cached_count(queryset)
+    if count is not None:
+        return count, False
+    if connections[queryset.db].vendor == 'postgresql':
+        return get_planner_estimate(queryset), False
+    count = queryset.count()
+    set_cached_count(queryset, count)
+    return count, True
+
+
+class CountingLimitOffsetPagination(LimitOffsetPagination):
+    # limit/offset pagination where the COUNT(*) can be skipped or estimated with ?count=none|estimate,
+    # ?count=exact always runs the exact count. The response says whether `count` is exact
+    count_query_param = 'count'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.count_mode = self.get_count_mode(request)
+        self.count_exact = self.count_mode == COUNT_EXACT
+        if self.count_exact:
+            return super().paginate_queryset(queryset, request, view)
+
+        self.request = request
+        self.limit = self.get_limit(request)
+        if self.limit is None:
+            return None
+        self.offset = self.get_offset(request)
+
+        # one extra row tells whether there is a next page without counting
+        page = self.finish_page(list(queryset[self.offset:self.offset + self.limit + 1]))
+        if self.count is None and self.count_mode == COUNT_ESTIMATE:
+            self.set_estimated_count(estimate_count(queryset), page)
+        return page
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        # async views (async ORM), same steps as paginate_queryset
+        self.request = request
+        self.count_mode = self.get_count_mode(request)
+        self.count_exact = self.count_mode == COUNT_EXACT
+        self.limit = self.get_limit(request)
+        if self.limit is None:
+            return None
+        self.offset = self.get_offset(request)
+
+        if self.count_exact:
+            self.count = await queryset.acount()
+            await sync_to_async(set_cached_count)(queryset, self.count)
+            if self.count == 0 or self.offset > self.count:
+                return []
+            return [item async for item in queryset[self.offset:self.offset + self.limit]]
+
+        page = self.finish_page([item async for item in queryset[self.offset:self.offset + self.limit + 1]])
+        if self.count is None and self.count_mode == COUNT_ESTIMATE:
+            self.set_estimated_count(await sync_to_async(estimate_count)(queryset), page)
+        return page
+
+    def finish_page(self, page):
+        self.has_next = len(page) > self.limit
+        page = page[:self.limit]
+
+        self.count = None
+        if not self.has_next and (page or not self.offset):
+            # last page, the count is known
+            self.count, self.count_exact = self.offset + len(page), True
+        return page
+
+    def set_estimated_count(self, estimate, page):
+        count, self.count_exact = estimate
+        self.count = max(count, self.offset + len(page) + int(self.has_next))
+
+    def get_count(self, queryset):
+        count = super().get_count(queryset)
+        set_cached_count(queryset, count)
+        return count
+
+    def get_count_mode(self, request):
+        count_mode = request.query_params.get(self.count_query_param, getattr(settings, 'DATA_PAGINATION_COUNT', COUNT_EXACT))
+        if count_mode not in COUNT_MODES:
+            raise ValidationError({self.count_query_param: f'Must be one of {", ".join(COUNT_MODES)}.'})
+        return count_mode
+
+    def get_next_link(self):
+        if self.count_mode == COUNT_EXACT:
+            return super().get_next_link()
+        if not self.has_next:
+            return None
+
+        url = self.request.build_absolute_uri()
+        url = replace_query_param(url, self.limit_query_param, self.limit)
+        return replace_query_param(url, self.offset_query_param, self.offset + self.limit)
+
+    def get_paginated_response(self, data):
+        response = super().get_paginated_response(data)
+        response.data['count_exact'] = self.count_exact
+        return response
+
+
+def get_paginator(request):
+    # keyset pagination is opt-in (?cursor= or ?after_id=), limit/offset stays the default
+    if KeysetPagination.cursor_query_param in request.query_params or KeysetPagination.after_id_query_param in request.query_params:
+        return KeysetPagination()
+    return CountingLimitOffsetPagination()
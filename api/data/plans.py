@@ -0,0 +1,62 @@
+from .serializers import AddressSerializer, HealthCareProviderSerializer, HealthCareOrganizationSerializer, AffiliationSerializer
+from .timing import timed
+
+# read path of the GET endpoints without model instances nor ModelSerializer: rows are fetched
+# with values() (only the columns the representation needs) and mapped to the output dicts by a
+# plan compiled once per representation. The output is the same as the serializers in serializers.py,
+# which stay the reference (see FieldPlanCase)
+
+
+class FieldPlan:
+    def __init__(self, columns, build=None):
+        self.columns = tuple(columns)
+        # build: row dict -> output dict, None when the values() row already is the output
+        self.build = build
+
+    def rows(self, query_set):
+        return query_set.values(*self.columns)
+
+    @timed('serialize')
+    def serialize(self, rows):
+        if self.build is None:
+            return rows if isinstance(rows, list) else list(rows)
+        build = self.build
+        return [build(row) for row in rows]
+
+    @timed('serialize')
+    def serialize_one(self, row):
+        return row if self.build is None else self.build(row)
+
+    def from_instance(self, instance):
+        # row of a model instance loaded by the ORM (e.g. prefetched), same columns as rows()
+        return {column: getattr(instance, column) for column in self.columns}
+
+
+# affiliation type -> (parent link column, child link column), as AffiliationSerializer.parse_*_link
+AFFILIATION_LINK_COLUMNS = {
+    'HCP_HCO': ('parent_hcp_link_id', 'child_hco_link_id'),
+    'HCP_HCP': ('parent_hcp_link_id', 'child_hcp_link_id'),
+    'HCO_HCP': ('parent_hco_link_id', 'child_hcp_link_id'),
+    'HCO_HCO': ('parent_hco_link_id', 'child_hco_link_id'),
+}
+NO_LINK_COLUMNS = (None, None)
+
+
+def build_affiliation(row):
+    parent, child = AFFILIATION_LINK_COLUMNS.get(row['type'], NO_LINK_COLUMNS)
+    return {
+        'id': row['id'],
+        'status': row['status'],
+        'type': row['type'],
+        'parent_link': row.get(parent),
+        'child_link': row.get(child),
+    }
+
+
+PROVIDER_PLAN = FieldPlan(HealthCareProviderSerializer.Meta.fields)
+ORGANIZATION_PLAN = FieldPlan(HealthCareOrganizationSerializer.Meta.fields)
+ADDRESS_PLAN = FieldPlan(AddressSerializer.Meta.fields)
+AFFILIATION_PLAN = FieldPlan(
+    ['id', 'status', 'type', 'parent_hcp_link_id', 'parent_hco_link_id', 'child_hcp_link_id', 'child_hco_link_id'],
+    build_affiliation,
+)
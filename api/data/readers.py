@@ -0,0 +1,101 @@
+import csv
+import json
+from pathlib import Path
+
+# incremental readers for ingest input files, each yields one record (dict) at a time
+# so that memory use does not depend on the input file size
+# doc: https://docs.python.org/3/library/json.html#json.JSONDecoder.raw_decode
+# doc: https://jsonlines.org/
+
+READ_CHUNK_SIZE = 64 * 1024
+
+JSON_FORMAT = 'json'
+NDJSON_FORMAT = 'ndjson'
+CSV_FORMAT = 'csv'
+
+FORMATS_BY_SUFFIX = {
+    '.json': JSON_FORMAT,
+    '.ndjson': NDJSON_FORMAT,
+    '.jsonl': NDJSON_FORMAT,
+    '.csv': CSV_FORMAT,
+}
+
+
+def detect_format(filename):
+    suffix = Path(filename).suffix.lower()
+    if suffix not in FORMATS_BY_SUFFIX:
+        raise ValueError(f'Unsupported input file format: {filename}')
+    return FORMATS_BY_SUFFIX[suffix]
+
+
+def iter_records(filename, file_format=None):
+    match file_format or detect_format(filename):
+        case 'json':
+            reader = iter_json_array
+        case 'ndjson':
+            reader = iter_ndjson
+        case 'csv':
+            reader = iter_csv
+        case _:
+            raise ValueError(f'Unsupported input file format: {file_format}')
+    with open(filename, newline='' if reader is iter_csv else None) as file:
+        yield from reader(file)
+
+
+def iter_json_array(file, chunk_size=READ_CHUNK_SIZE):
+    decoder = json.JSONDecoder()
+    buffer, position, eof = '', 0, False
+    started = False
+
+    def fill():
+        nonlocal buffer, position, eof
+        chunk = file.read(chunk_size)
+        buffer = buffer[position:] + chunk
+        position = 0
+        eof = not chunk
+
+    while True:
+        # skip whitespace, the opening bracket and separators between elements
+        while position < len(buffer) and buffer[position] in ' \t\r\n,[':
+            if buffer[position] == '[':
+                if started:
+                    break
+                started = True
+            position += 1
+        if position >= len(buffer):
+            if eof:
+                if started:
+                    raise ValueError('Unterminated JSON array')
+                return
+            fill()
+            continue
+        if not started:
+            raise ValueError('Expected a JSON array')
+        if buffer[position] == ']':
+            return
+
+        try:
+            record, end = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            fill()
+            continue
+        if end >= len(buffer) and not eof:
+            # the element may continue in the next chunk (e.g. a number split in two)
+            fill()
+            continue
+        position = end
+        yield record
+
+
+def iter_ndjson(file):
+    for line in file:
+        if line.strip():
+            yield json.loads(line)
+
+
+def iter_csv(file):
+    for row in csv.DictReader(file):
+        # empty cells are missing values (e.g. addr2)
+        yield {key: (value if value != '' else None) for key, value in row.items()}
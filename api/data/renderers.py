@@ -0,0 +1,42 @@
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from .timing import timed
+
+try:
+    import orjson
+except ImportError:  # optional, JSONRenderer (json module) is used without it
+    orjson = None
+
+# doc: https://www.django-rest-framework.org/api-guide/renderers/#custom-renderers
+# doc: https://github.com/ijl/orjson
+
+ORJSON_OPTIONS = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS if orjson else 0
+
+
+class FastJSONRenderer(JSONRenderer):
+    # JSONRenderer output (compact, unescaped unicode, \u2028/\u2029 escaped) encoded with orjson.
+    # Anything orjson would encode differently from the DRF encoder (dates, Decimal, lazy strings...)
+    # or an indented response falls back to JSONRenderer, so the bytes are always the same
+
+    @timed('render')
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or data is None or not self.compact or self.ensure_ascii:
+            return super().render(data, accepted_media_type, renderer_context)
+        if self.get_indent(accepted_media_type, renderer_context or {}) is not None:
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(data, option=ORJSON_OPTIONS)
+        except TypeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        return ret.replace('\u2028'.encode(), b'\\u2028').replace('\u2029'.encode(), b'\\u2029')
+
+
+class MetricsRenderer(BaseRenderer):
+    # text exposition format of /metrics (metrics.py), errors are rendered as their message
+    media_type = 'text/plain'
+    format = 'txt'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, dict):
+            data = f"{data.get('detail', data)}\n"
+        return data.encode(self.charset)
@@ -0,0 +1,237 @@
+import itertools
+import threading
+import time
+from contextvars import ContextVar
+from functools import lru_cache
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.signals import request_finished
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+from django.dispatch import receiver
+from django.utils.decorators import sync_and_async_middleware
+from .versions import get_cache
+
+# doc: https://docs.djangoproject.com/en/4.2/topics/db/multi-db/#database-routers
+# doc: https://www.postgresql.org/docs/current/functions-admin.html#FUNCTIONS-RECOVERY-INFO-TABLE
+# read replicas (DATA_REPLICAS, database aliases of settings.py) for the GET endpoints of data/urls.py:
+# - their reads of the data models go to one replica per request, picked round robin among the
+#   replicas lagging at most DATA_REPLICA_MAX_LAG seconds (checked every DATA_REPLICA_LAG_CHECK_INTERVAL
+#   seconds per process, an unreachable replica counts as lagging); primary when none is left
+# - everything else reads from the primary: other requests (admin), management commands (ingest_data),
+#   the auth/session tables, and the reads of a request after it wrote
+# - writes always go to the primary. A user whose request wrote reads from the primary for the next
+#   DATA_REPLICA_PRIMARY_WINDOW seconds (pinned in the data cache, shared by the processes when the
+#   cache is), so they read their writes
+# - data derived from a replica read is not stored under versions younger than the staleness bound
+#   (max lag + check interval): the replica may not have those writes yet (is_fresh, cache.py)
+
+DATA_APP = 'data'
+READ_METHODS = ('GET', 'HEAD')
+
+_route = ContextVar('data_route', default=None)
+_replica_counter = itertools.count()
+# alias -> (monotonic time of the check, lag in seconds)
+_lags = {}
+_lags_lock = threading.Lock()
+
+# seconds behind the primary: 0 when the replica replayed everything it received (an idle primary
+# sends nothing, the last replay time then only tells how long it has been idle), NULL without replay yet
+LAG_SQL = """
+SELECT CASE
+    WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+    ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+END
+"""
+
+
+def get_replicas():
+    return getattr(settings, 'DATA_REPLICAS', [])
+
+
+def get_max_lag():
+    return getattr(settings, 'DATA_REPLICA_MAX_LAG', 5.0)
+
+
+def get_lag_check_interval():
+    return getattr(settings, 'DATA_REPLICA_LAG_CHECK_INTERVAL', 1.0)
+
+
+def get_primary_window():
+    return getattr(settings, 'DATA_REPLICA_PRIMARY_WINDOW', 10.0)
+
+
+@lru_cache(maxsize=None)
+def get_read_url_names():
+    # the URL names of data/urls.py (imported late, the router is loaded with the first query)
+    from . import urls
+    return {pattern.name for pattern in urls.urlpatterns}
+
+
+def get_replica_lag(alias):
+    connection = connections[alias]
+    if connection.vendor != 'postgresql':
+        # no replication (e.g. a SQLite copy used in development)
+        return 0.0
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(LAG_SQL)
+            lag = cursor.fetchone()[0]
+    except DatabaseError:
+        connection.close()
+        return float('inf')
+    return float('inf') if lag is None else float(lag)
+
+
+def get_lag(alias):
+    # last checked lag of the replica, checked again by one thread once older than the interval
+    checked = _lags.get(alias)
+    if checked is not None and time.monotonic() - checked[0] < get_lag_check_interval():
+        return checked[1]
+    if not _lags_lock.acquire(blocking=checked is None):
+        return checked[1]
+    try:
+        checked = _lags[alias] = (time.monotonic(), get_replica_lag(alias))
+    finally:
+        _lags_lock.release()
+    return checked[1]
+
+
+def reset_lags():
+    with _lags_lock:
+        _lags.clear()
+
+
+def choose_replica():
+    # round robin over the replicas within the lag threshold, None when there is none
+    replicas = get_replicas()
+    start = next(_replica_counter)
+    for position in range(len(replicas)):
+        alias = replicas[(start + position) % len(replicas)]
+        if get_lag(alias) <= get_max_lag():
+            return alias
+    return None
+
+
+def pin_key(user_id):
+    return f'primary:user:{user_id}'
+
+
+def get_user_id(request):
+    user = getattr(request, 'user', None)
+    return user.pk if user is not None and user.is_authenticated else None
+
+
+class Route:
+    # database of the reads of one request
+    def __init__(self, request):
+        self.request = request
+        self.alias = None
+        self.wrote = False
+        self.pinned = None
+
+    def uses_replicas(self):
+        match = getattr(self.request, 'resolver_match', None)
+        return (
+            self.request.method in READ_METHODS and match is not None
+            and match.view_name in get_read_url_names() and not self.is_pinned()
+        )
+
+    def is_pinned(self):
+        # the user wrote in the primary window (the user is set by the authentication of the view)
+        if self.pinned is None:
+            user_id = get_user_id(self.request)
+            self.pinned = user_id is not None and get_cache().get(pin_key(user_id)) is not None
+        return self.pinned
+
+    def get_read_alias(self):
+        if self.wrote:
+            return DEFAULT_DB_ALIAS
+        if self.alias is None:
+            # decided on the first read, once the view authenticated the user
+            self.alias = (self.uses_replicas() and choose_replica()) or DEFAULT_DB_ALIAS
+        return self.alias
+
+    def used_replica(self):
+        return self.alias is not None and self.alias != DEFAULT_DB_ALIAS
+
+
+def is_fresh(version):
+    # whether the data read by the request includes the writes up to `version` (versions.py, ns)
+    route = _route.get()
+    if route is None or not route.used_replica():
+        return True
+    return time.time_ns() - version >= (get_max_lag() + get_lag_check_interval()) * 1_000_000_000
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        route = _route.get()
+        if route is None or model._meta.app_label != DATA_APP or not get_replicas():
+            return None
+        return route.get_read_alias()
+
+    def db_for_write(self, model, **hints):
+        route = _route.get()
+        if route is not None and model._meta.app_label == DATA_APP:
+            route.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # the replicas hold the same rows as the primary
+        databases = {DEFAULT_DB_ALIAS, *get_replicas()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # the replicas get the schema by replication
+        if db in get_replicas():
+            return False
+        return None
+
+
+def start_route(request):
+    route = Route(request)
+    _route.set(route)
+    return route
+
+
+async def aload_pin(request):
+    # async views, once authenticated: the pin is read in a thread, not by the router on the event loop
+    route = _route.get()
+    if route is not None and get_replicas():
+        await sync_to_async(route.is_pinned)()
+
+
+def finish_route(route, request):
+    if route.wrote and get_replicas():
+        user_id = get_user_id(request)
+        if user_id is not None:
+            get_cache().set(pin_key(user_id), True, get_primary_window())
+
+
+@receiver(request_finished)
+def handle_request_finished(sender, **kwargs):
+    # after the response is sent: streamed responses (exports) read while they are sent
+    _route.set(None)
+
+
+@sync_and_async_middleware
+def replica_routing_middleware(get_response):
+    # the route is left set for the response streaming, request_finished clears it
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            route = start_route(request)
+            response = await get_response(request)
+            if route.wrote:
+                # the data cache blocks on file I/O
+                await sync_to_async(finish_route)(route, request)
+            return response
+        return middleware
+
+    def middleware(request):
+        route = start_route(request)
+        response = get_response(request)
+        finish_route(route, request)
+        return response
+    return middleware
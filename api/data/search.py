@@ -0,0 +1,138 @@
+import re
+from django.db import connection, connections
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import _positive_int
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+from .models import HealthCareProvider, HealthCareOrganization
+from .pagination import decode_cursor, encode_cursor
+from .plans import ORGANIZATION_PLAN, PROVIDER_PLAN
+
+# doc: https://www.postgresql.org/docs/current/pgtrgm.html
+# doc: https://use-the-index-luke.com/sql/partial-results/fetch-next-page
+# name search of the HCP/HCO endpoints (?q=): names starting with the query, or similar to it
+# (trigram similarity, as pg_trgm: the share of the 3-letter sequences of the words both have).
+# rank = 1 for a prefix match + similarity, ordered by rank then id, paginated by (rank, id) keyset.
+# PostgreSQL: one query through the indexes of migration 0003 (lower(name) prefix btree, name
+# trigram GIN). Other databases: every name is scanned and ranked in Python, same results
+
+SEARCH_QUERY_PARAM = 'q'
+MAX_QUERY_LENGTH = 200
+MAX_LIMIT = 100
+# pg_trgm.similarity_threshold default, used by the `%` operator
+SIMILARITY_THRESHOLD = 0.3
+# ranks are rounded so they compare equal in the keyset cursor whatever the float representation
+RANK_DIGITS = 6
+
+SEARCH_PLANS = {HealthCareProvider: PROVIDER_PLAN, HealthCareOrganization: ORGANIZATION_PLAN}
+
+# the (rank, id) of the last row of the previous page is NULL on the first page
+SEARCH_SQL = '''
+SELECT {columns}, rank FROM (
+    SELECT {columns}, round(((lower(name) LIKE %(prefix)s)::int + similarity(name, %(q)s))::numeric, {digits}) AS rank
+    FROM {table}
+    WHERE (lower(name) LIKE %(prefix)s OR name %% %(q)s) AND status = %(status)s
+) AS matches
+WHERE %(rank)s::numeric IS NULL OR rank < %(rank)s::numeric OR (rank = %(rank)s::numeric AND id > %(id)s)
+ORDER BY rank DESC, id
+LIMIT %(limit)s
+'''
+
+
+def get_trigrams(value):
+    # as pg_trgm: lowercase words of letters and digits, padded with 2 spaces before and 1 after
+    trigrams = set()
+    for word in re.findall(r'[^\W_]+', value.lower()):
+        word = f'  {word} '
+        trigrams.update(word[position:position + 3] for position in range(len(word) - 2))
+    return trigrams
+
+
+def similarity(left, right):
+    if not left or not right:
+        return 0.0
+    shared = len(left & right)
+    return shared / (len(left) + len(right) - shared)
+
+
+def escape_like(value):
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def get_search_params(request):
+    # (query, status, limit, (rank, id) after which the page starts or None)
+    query = request.query_params.get(SEARCH_QUERY_PARAM, '').strip()
+    if not query or len(query) > MAX_QUERY_LENGTH:
+        raise ValidationError({SEARCH_QUERY_PARAM: f'Must be between 1 and {MAX_QUERY_LENGTH} characters.'})
+
+    try:
+        limit = _positive_int(request.query_params['limit'], strict=True, cutoff=MAX_LIMIT)
+    except (KeyError, ValueError):
+        limit = api_settings.PAGE_SIZE
+
+    after = None
+    cursor = request.query_params.get('cursor')
+    if cursor:
+        position = decode_cursor(cursor)
+        rank, id = position.get('rank'), position.get('id')
+        if not isinstance(rank, (int, float)) or not isinstance(id, int):
+            raise NotFound('Invalid cursor')
+        after = (rank, id)
+    return query, request.query_params.get('status', 'A'), limit, after
+
+
+def search_sql(model, query, status, limit, after):
+    columns = ', '.join(SEARCH_PLANS[model].columns)
+    sql = SEARCH_SQL.format(columns=columns, table=model._meta.db_table, digits=RANK_DIGITS)
+    params = {
+        'q': query,
+        'prefix': escape_like(query.lower()) + '%',
+        'status': status,
+        'rank': after[0] if after else None,
+        'id': after[1] if after else None,
+        'limit': limit,
+    }
+    with connections[model.objects.db].cursor() as cursor:
+        cursor.execute(sql, params)
+        names = [column.name for column in cursor.description]
+        rows = [dict(zip(names, row)) for row in cursor.fetchall()]
+    for row in rows:
+        row['rank'] = float(row['rank'])
+    return rows
+
+
+def search_python(model, query, status, limit, after):
+    # same filter, rank and order as SEARCH_SQL
+    prefix, trigrams = query.lower(), get_trigrams(query)
+    matches = []
+    for row in SEARCH_PLANS[model].rows(model.objects.filter(status=status)).iterator():
+        score = similarity(get_trigrams(row['name']), trigrams)
+        is_prefix = row['name'].lower().startswith(prefix)
+        if is_prefix or score >= SIMILARITY_THRESHOLD:
+            rank = round(int(is_prefix) + score, RANK_DIGITS)
+            if after is None or rank < after[0] or (rank == after[0] and row['id'] > after[1]):
+                matches.append({**row, 'rank': rank})
+    matches.sort(key=lambda row: (-row['rank'], row['id']))
+    return matches[:limit]
+
+
+def search(model, query, status, limit, after=None):
+    # rows of the plan of the model with their rank, at most `limit`
+    if connection.vendor == 'postgresql':
+        return search_sql(model, query, status, limit, after)
+    return search_python(model, query, status, limit, after)
+
+
+def get_search_data(request, model):
+    query, status, limit, after = get_search_params(request)
+    # one extra row tells whether there is a next page
+    rows = search(model, query, status, limit + 1, after)
+    page = rows[:limit]
+
+    next_cursor = encode_cursor({'rank': page[-1]['rank'], 'id': page[-1]['id']}) if len(rows) > limit else None
+    plan = SEARCH_PLANS[model]
+    return {
+        'next': replace_query_param(request.build_absolute_uri(), 'cursor', next_cursor) if next_cursor else None,
+        'next_cursor': next_cursor,
+        'results': [{**plan.serialize_one({column: row[column] for column in plan.columns}), 'rank': row['rank']} for row in page],
+    }
@@ -38,19 +38,20 @@ class AffiliationSerializer(serializers.ModelSerializer):
     parent_link = serializers.SerializerMethodField(method_name='parse_parent_link')
     child_link = serializers.SerializerMethodField(method_name='parse_child_link')
 
+    # read the raw *_id columns, accessing the relations would load the related row for every affiliation
     def parse_parent_link(self, affiliation):
         match affiliation.type:
             case 'HCP_HCO' | 'HCP_HCP':
-                return affiliation.parent_hcp_link.id
+                return affiliation.parent_hcp_link_id
             case 'HCO_HCP' | 'HCO_HCO':
-                return affiliation.parent_hco_link.id
+                return affiliation.parent_hco_link_id
 
     def parse_child_link(self, affiliation):
         match affiliation.type:
             case 'HCP_HCO' | 'HCO_HCO':
-                return affiliation.child_hco_link.id
+                return affiliation.child_hco_link_id
             case 'HCO_HCP' | 'HCP_HCP':
-                return affiliation.child_hcp_link.id
+                return affiliation.child_hcp_link_id
     
     class Meta:
         model = Affiliation
@@ -0,0 +1,128 @@
+from functools import partial
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from .models import Address, HealthCareProvider, HealthCareOrganization, Affiliation
+from .versions import bump_generation, bump_versions, get_generation
+
+# doc: https://docs.djangoproject.com/en/4.2/topics/signals/
+# doc: https://docs.djangoproject.com/en/4.2/ref/signals/#m2m-changed
+# doc: https://docs.djangoproject.com/en/4.2/topics/db/transactions/#performing-actions-after-commit
+# keeps the version counters (versions.py) in sync with the data tables. The counters are bumped
+# once the write is committed (right away outside of a transaction): a request reading the new
+# versions before the commit would store the previous rows under them (cache.py). What the bumps
+# need (linked entities, previous links) is read during the write.
+# note: bulk_create/COPY (ingest_data --bulk) do not send signals, the ingestion invalidates everything itself
+
+DATA_MODELS = (Address, HealthCareProvider, HealthCareOrganization, Affiliation)
+AFFILIATION_LINKS = (
+    ('parent_hcp_link_id', HealthCareProvider),
+    ('child_hcp_link_id', HealthCareProvider),
+    ('parent_hco_link_id', HealthCareOrganization),
+    ('child_hco_link_id', HealthCareOrganization),
+)
+
+
+def on_commit(using, function, *args):
+    transaction.on_commit(partial(function, *args), using=using)
+
+
+def get_affiliation_links(values):
+    return {field: values.get(field) for field, _ in AFFILIATION_LINKS}
+
+
+def bump_affiliation_entities(links):
+    # affiliation responses of both linked entities
+    for field, model in AFFILIATION_LINKS:
+        bump_versions(model, [links.get(field)])
+
+
+def get_address_parents(address_id):
+    return {
+        HealthCareProvider: list(HealthCareProvider.objects.filter(addresses=address_id).values_list('id', flat=True)),
+        HealthCareOrganization: list(HealthCareOrganization.objects.filter(addresses=address_id).values_list('id', flat=True)),
+    }
+
+
+def bump_address_parents(parents):
+    # address responses of the entities the address is linked to
+    for model, ids in parents.items():
+        bump_versions(model, ids)
+
+
+def bump_entity(model, instance, pk):
+    # the generation before the bump tells the graph index (graph.py) whether it missed other writes
+    instance._previous_generation = get_generation(model)
+    instance._generation = bump_generation(model)
+    bump_versions(model, [pk])
+
+
+@receiver(post_save, sender=Address)
+@receiver(post_save, sender=HealthCareProvider)
+@receiver(post_save, sender=HealthCareOrganization)
+@receiver(post_save, sender=Affiliation)
+@receiver(post_delete, sender=Address)
+@receiver(post_delete, sender=HealthCareProvider)
+@receiver(post_delete, sender=HealthCareOrganization)
+@receiver(post_delete, sender=Affiliation)
+def handle_entity_changed(sender, instance, using, **kwargs):
+    # the pk is unset after a delete
+    on_commit(using, bump_entity, sender, instance, instance.pk)
+
+
+@receiver(pre_save, sender=Affiliation)
+def handle_affiliation_pre_save(sender, instance, using, **kwargs):
+    # an edit can move the affiliation away from an entity, which must be invalidated too
+    if instance.pk:
+        previous = Affiliation.objects.using(using).filter(pk=instance.pk).values(*(field for field, _ in AFFILIATION_LINKS)).first()
+        if previous:
+            on_commit(using, bump_affiliation_entities, previous)
+
+
+@receiver(post_save, sender=Affiliation)
+@receiver(post_delete, sender=Affiliation)
+def handle_affiliation_changed(sender, instance, using, **kwargs):
+    on_commit(using, bump_affiliation_entities, get_affiliation_links(instance.__dict__))
+
+
+@receiver(post_save, sender=Address)
+def handle_address_saved(sender, instance, created, using, **kwargs):
+    if not created:
+        on_commit(using, bump_address_parents, get_address_parents(instance.pk))
+
+
+@receiver(pre_delete, sender=Address)
+def handle_address_pre_delete(sender, instance, **kwargs):
+    # the links are deleted before the address, remember the parents for post_delete
+    instance._linked_parents = get_address_parents(instance.pk)
+
+
+@receiver(post_delete, sender=Address)
+def handle_address_deleted(sender, instance, using, **kwargs):
+    on_commit(using, bump_address_parents, getattr(instance, '_linked_parents', {}))
+
+
+def bump_addresses_changed(model, linked):
+    bump_generation(Address, HealthCareProvider, HealthCareOrganization)
+    bump_versions(model, linked)
+
+
+@receiver(m2m_changed, sender=HealthCareProvider.addresses.through)
+@receiver(m2m_changed, sender=HealthCareOrganization.addresses.through)
+def handle_addresses_changed(sender, instance, action, reverse, model, pk_set, using, **kwargs):
+    if action == 'pre_clear':
+        # pk_set is not provided on clear, remember what is linked
+        if reverse:
+            instance._cleared_links = set(model.objects.filter(addresses=instance).values_list('id', flat=True))
+        else:
+            instance._cleared_links = set(instance.addresses.values_list('id', flat=True))
+        return
+    if not action.startswith('post_'):
+        return
+
+    if reverse:
+        # address.healthcareprovider_set.add(...): instance is the address, pk_set the entities
+        linked = pk_set if action != 'post_clear' else getattr(instance, '_cleared_links', set())
+        on_commit(using, bump_addresses_changed, model, set(linked))
+    else:
+        on_commit(using, bump_addresses_changed, type(instance), [instance.pk])
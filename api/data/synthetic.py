@@ -0,0 +1,212 @@
+import csv
+import json
+import math
+import os
+import random
+
+# synthetic datasets in the ingest_data input format, generated as streams of records
+# so that large datasets (tens of millions of rows) can be written without holding them in memory.
+# Shaped after real provider data: people and organization names (name search, a few common
+# surnames and a long tail of rare ones, distinct names growing with the scale), addresses spread
+# over states by population with consistent cities and zip prefixes (location filters), and a
+# heavy-tailed affiliation graph: the number of children per parent follows a Pareto distribution
+# of mean `degree`, and children are picked by popularity (a few large organizations get most of
+# the providers), popular entities being scattered over the ids
+
+STATUSES = ['A', 'A', 'A', 'I']
+ADDRESS_STATUSES = ['A'] * 9 + ['I']
+
+# state: (population weight, {city: zip prefix})
+LOCATIONS = {
+    'CA': (39, {'Los Angeles': '900', 'San Diego': '921', 'San Jose': '951', 'San Francisco': '941', 'Fresno': '937'}),
+    'TX': (30, {'Houston': '770', 'San Antonio': '782', 'Dallas': '752', 'Austin': '787', 'Fort Worth': '761'}),
+    'FL': (22, {'Jacksonville': '322', 'Miami': '331', 'Tampa': '336', 'Orlando': '328'}),
+    'NY': (20, {'New York': '100', 'Buffalo': '142', 'Rochester': '146', 'Albany': '122'}),
+    'PA': (13, {'Philadelphia': '191', 'Pittsburgh': '152', 'Allentown': '181'}),
+    'IL': (13, {'Chicago': '606', 'Aurora': '605', 'Springfield': '627'}),
+    'OH': (12, {'Columbus': '432', 'Cleveland': '441', 'Cincinnati': '452'}),
+    'GA': (11, {'Atlanta': '303', 'Augusta': '309', 'Savannah': '314'}),
+    'NC': (11, {'Charlotte': '282', 'Raleigh': '276', 'Greensboro': '274'}),
+    'MI': (10, {'Detroit': '482', 'Grand Rapids': '495', 'Lansing': '489'}),
+}
+STATES = list(LOCATIONS)
+STATE_WEIGHTS = [weight for weight, _ in LOCATIONS.values()]
+CITIES = {state: list(cities.items()) for state, (_, cities) in LOCATIONS.items()}
+
+FIRST_NAMES = [
+    'James', 'Mary', 'Robert', 'Patricia', 'John', 'Jennifer', 'Michael', 'Linda', 'David', 'Elizabeth',
+    'William', 'Barbara', 'Richard', 'Susan', 'Joseph', 'Jessica', 'Thomas', 'Sarah', 'Carlos', 'Maria',
+    'Wei', 'Priya', 'Ahmed', 'Fatima', 'Daniel', 'Nancy', 'Kevin', 'Karen', 'Jose', 'Anh',
+]
+LAST_NAMES = [
+    'Smith', 'Johnson', 'Williams', 'Brown', 'Jones', 'Garcia', 'Miller', 'Davis', 'Rodriguez', 'Martinez',
+    'Hernandez', 'Lopez', 'Gonzalez', 'Wilson', 'Anderson', 'Thomas', 'Taylor', 'Moore', 'Jackson', 'Martin',
+    'Lee', 'Perez', 'Thompson', 'White', 'Harris', 'Nguyen', 'Clark', 'Patel', 'Kim', 'Chen',
+]
+ORGANIZATION_KINDS = [
+    'Medical Center', 'General Hospital', 'Health System', 'Clinic', 'Family Practice',
+    'Cardiology Associates', 'Pediatrics', 'Orthopedic Group', 'Oncology Institute', 'Urgent Care',
+]
+# share of the names with a common surname (LAST_NAMES), the others get a rare surname: a common
+# one extended by syllables, drawn among as many as there are entities of the kind
+COMMON_SURNAME_SHARE = 0.5
+SURNAME_SYLLABLES = ['ber', 'ton', 'wick', 'ley', 'man', 'ford', 'ham', 'well', 'ridge', 'dale', 'er', 'ski', 'ani', 'ova', 'ard', 'ino']
+STREETS = ['Main Street', 'Oak Avenue', 'Maple Drive', 'Park Road', 'Cedar Lane', 'Washington Boulevard', 'Lake Street', 'Hill Road']
+
+# Pareto shape of the children per parent (infinite variance: a long tail of large parents)
+DEGREE_ALPHA = 2.0
+# children per parent at most MAX_DEGREE_FACTOR times the mean degree
+MAX_DEGREE_FACTOR = 100
+# popularity of the children: position = count * random() ** CHILD_SKEW, the first positions
+# (after scattering) are picked most often
+CHILD_SKEW = 3
+# (affiliation type, weight) by parent type
+AFFILIATION_TYPES = {
+    'HCO': [('HCO_HCP', 7), ('HCO_HCO', 3)],
+    'HCP': [('HCP_HCO', 17), ('HCP_HCP', 3)],
+}
+# ids of the children are picked again when they repeat one of their parent, at most
+MAX_CHILD_ATTEMPTS = 10
+
+RECORD_FIELDS = {
+    'address': ['parent_link', 'parent_type', 'addr1', 'addr2', 'city', 'state', 'zip', 'status'],
+    'hco': ['id', 'name', 'status'],
+    'hcp': ['id', 'name', 'status'],
+    'affiliation': ['parent_link', 'child_link', 'status', 'type'],
+}
+
+
+def get_surname(count, rng):
+    if rng.random() < COMMON_SURNAME_SHARE:
+        return rng.choice(LAST_NAMES)
+    # number -> surname is one to one: a common surname and the base len(SURNAME_SYLLABLES) digits
+    number, syllables = divmod(rng.randrange(count), len(LAST_NAMES))
+    surname = LAST_NAMES[syllables]
+    while True:
+        number, syllable = divmod(number, len(SURNAME_SYLLABLES))
+        surname += SURNAME_SYLLABLES[syllable]
+        if not number:
+            return surname
+
+
+def generate_providers(count, rng):
+    for position in range(count):
+        yield {
+            'id': position + 1,
+            'name': f'{rng.choice(FIRST_NAMES)} {get_surname(count, rng)}',
+            'status': rng.choice(STATUSES),
+        }
+
+
+def generate_organizations(count, rng):
+    for position in range(count):
+        yield {
+            'id': position + 1,
+            'name': f'{get_surname(count, rng)} {rng.choice(ORGANIZATION_KINDS)}',
+            'status': rng.choice(STATUSES),
+        }
+
+
+def generate_addresses(organizations, providers, rng):
+    # one address per entity, matched by position by ingest_data
+    for parent_type, count in (('HCO', organizations), ('HCP', providers)):
+        for position in range(count):
+            state = rng.choices(STATES, STATE_WEIGHTS)[0]
+            city, zip_prefix = rng.choice(CITIES[state])
+            yield {
+                'parent_link': position + 1,
+                'parent_type': parent_type,
+                'addr1': f'{rng.randint(1, 9999)} {rng.choice(STREETS)}',
+                'addr2': rng.choice([None, None, None, f'Suite {rng.randint(100, 999)}']),
+                'city': city,
+                'state': state,
+                'zip': f'{zip_prefix}{rng.randint(0, 99):02d}',
+                'status': rng.choice(ADDRESS_STATUSES),
+            }
+
+
+def get_scatter_step(count):
+    # multiplier coprime with count: position -> position * step % count is a permutation
+    step = 2654435761 % count if count > 1 else 1
+    while math.gcd(step, count) != 1:
+        step += 1
+    return step
+
+
+def sample_degree(degree, rng):
+    # Pareto of mean `degree` (rounded), at least degree / 2 for a parent
+    scale = degree * (DEGREE_ALPHA - 1) / DEGREE_ALPHA
+    return min(round(rng.paretovariate(DEGREE_ALPHA) * scale), degree * MAX_DEGREE_FACTOR)
+
+
+def generate_affiliations(organizations, providers, degree, rng):
+    # children are distinct per parent, so (parent, child, type) stays unique; no self affiliation
+    counts = {'HCO': organizations, 'HCP': providers}
+    steps = {parent_type: get_scatter_step(count) for parent_type, count in counts.items() if count}
+    for parent_type, count in counts.items():
+        types = [(type, weight) for type, weight in AFFILIATION_TYPES[parent_type] if counts[type[4:]]]
+        if not types or not degree:
+            continue
+        names, weights = zip(*types)
+        for position in range(count):
+            children = set()
+            for type in rng.choices(names, weights, k=sample_degree(degree, rng)):
+                child_type = type[4:]
+                for _ in range(MAX_CHILD_ATTEMPTS):
+                    popular = int(counts[child_type] * rng.random() ** CHILD_SKEW)
+                    child = popular * steps[child_type] % counts[child_type]
+                    if (type, child) not in children and (child_type != parent_type or child != position):
+                        break
+                else:
+                    continue
+                children.add((type, child))
+                yield {
+                    'parent_link': position + 1,
+                    'child_link': child + 1,
+                    'status': rng.choice(STATUSES),
+                    'type': type,
+                }
+
+
+def generate_dataset(organizations, providers, degree=2, seed=0):
+    # one random generator per entity, so each stream is reproducible on its own
+    return {
+        'address': generate_addresses(organizations, providers, random.Random(f'{seed}-address')),
+        'hco': generate_organizations(organizations, random.Random(f'{seed}-hco')),
+        'hcp': generate_providers(providers, random.Random(f'{seed}-hcp')),
+        'affiliation': generate_affiliations(organizations, providers, degree, random.Random(f'{seed}-affiliation')),
+    }
+
+
+def write_ndjson(filename, records):
+    total = 0
+    with open(filename, 'w') as file:
+        for record in records:
+            file.write(json.dumps(record))
+            file.write('\n')
+            total += 1
+    return total
+
+
+def write_csv(filename, records, fields):
+    # empty cells are read back as null (readers.iter_csv)
+    total = 0
+    with open(filename, 'w', newline='') as file:
+        writer = csv.DictWriter(file, fields)
+        writer.writeheader()
+        for record in records:
+            writer.writerow(record)
+            total += 1
+    return total
+
+
+def write_dataset(directory, organizations, providers, degree=2, seed=0, file_format='ndjson'):
+    # returns the ingest_data filenames argument (entity -> filename) and the rows per file
+    filenames, rows = {}, {}
+    for entity, records in generate_dataset(organizations, providers, degree, seed).items():
+        filenames[entity] = os.path.join(directory, f'{entity}.{file_format}')
+        if file_format == 'csv':
+            rows[entity] = write_csv(filenames[entity], records, RECORD_FIELDS[entity])
+        else:
+            rows[entity] = write_ndjson(filenames[entity], records)
+    return filenames, rows
@@ -1,15 +1,84 @@
-from django.test import TestCase
+import asyncio
+import io
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+from unittest import mock, skipUnless
+from collections import Counter
+from urllib.parse import parse_qs, urlparse
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.handlers.asgi import ASGIHandler
+from django.core.management import call_command
+from django.core.signals import request_finished, request_started
+from django.db import close_old_connections, connection, connections, router, transaction
+from django.db.backends.postgresql.psycopg_any import is_psycopg3
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import include, path, reverse
+from rest_framework.test import APIClient
 from rest_framework.validators import ValidationError
 from django.db.utils import DataError
 from rest_framework.test import APIRequestFactory, force_authenticate
 from django.contrib.auth.models import User
+from rest_framework.authtoken.models import Token
 from .models import Address, HealthCareProvider, HealthCareOrganization, Affiliation
+from .backends.postgresql import base as pool_backend
+from .management.commands import benchmark_api
+from .management.commands.ingest_data import DataProcessor, BulkDataProcessor, ParallelDataProcessor
+from rest_framework.renderers import JSONRenderer
+from .serializers import AddressSerializer, HealthCareProviderSerializer, HealthCareOrganizationSerializer, AffiliationSerializer
+from .plans import ADDRESS_PLAN, AFFILIATION_PLAN, ORGANIZATION_PLAN, PROVIDER_PLAN
+from .renderers import FastJSONRenderer
+from .pagination import decode_cursor, encode_cursor, get_cached_count
+from .readers import iter_json_array
+from . import async_views, urls as data_urls
+from .authentication import aauthenticate, create_signed_token, reset_auth_cache
+from .cache import get_stats, reset_stats
+from .graph import GraphIndex, get_graph_index, reset_graph_index
+from .metrics import count_query, get_registry, new_view_counters, render_metrics, write_snapshot
+from .network import walk_levels
+from .routers import choose_replica, replica_routing_middleware, reset_lags
+from .search import get_trigrams, similarity
+from .synthetic import generate_dataset, write_dataset
+from .timing import Timings, server_timing_middleware, timed
+from .versions import bump_generation, get_cache, version_key
+from . import timing
 from .views import get_healthcare_provider_affiliations, get_all_addresses, get_affiliation_by_id, get_all_affiliations, get_all_providers, get_healthcare_provider_by_id, get_healthcare_addresses_by_provider_by_id, get_healthcare_provider_address_by_id
 # doc: https://docs.djangoproject.com/en/4.2/topics/testing/overview/
 # doc: https://www.django-rest-framework.org/api-guide/testing/
 
+# model of each multi-get endpoint (?ids=)
+MULTI_GET_MODELS = {
+    'get_providers_by_ids': HealthCareProvider,
+    'get_organizations_by_ids': HealthCareOrganization,
+    'get_addresses_by_ids': Address,
+    'get_affiliations_by_ids': Affiliation,
+}
 
-class AddressCase(TestCase):
+# URLconf of AsyncViewsCase (ROOT_URLCONF='data.tests'): the data endpoints served by the async views
+urlpatterns = [
+    path('api/v1/', include([
+        path(str(pattern.pattern), getattr(async_views, pattern.name, pattern.callback), name=pattern.name)
+        for pattern in data_urls.urlpatterns
+    ])),
+]
+
+
+class DataTestCase(TestCase):
+    # the version bumps of the writes (signals.py) run on commit, never in a test: the data cache is
+    # emptied so that the entries of the previous tests (same ids once rolled back) are not served
+    def _pre_setup(self):
+        super()._pre_setup()
+        get_cache().clear()
+
+
+class AddressCase(DataTestCase):
     def setUp(self):
         self.factory = APIRequestFactory()
         self.user = User.objects.create_user('user', 'user@gmail.com', 'pwd')
@@ -63,7 +132,7 @@ class AddressCase(TestCase):
         }.items())
 
 
-class HealthCareProviderCase(TestCase):
+class HealthCareProviderCase(DataTestCase):
     def setUp(self):
         self.factory = APIRequestFactory()
         self.user = User.objects.create_user('user', 'user@gmail.com', 'pwd')
@@ -204,6 +273,48 @@ class HealthCareProviderCase(TestCase):
             'status': 'A'
         }.items())
 
+    def test_endpoint_get_hcp_addresses_by_id_should_paginate_addresses(self):
+        hcp = HealthCareProvider.objects.create(name='hcp', status='A')
+        addresses = [Address.objects.create(addr1=f"Address {index}", city="City 1", status="A") for index in range(5)]
+        hcp.addresses.set(addresses)
+
+        request = self.factory.get(f'/v1/hcp/{hcp.id}/address/?limit=2&offset=2')
+        force_authenticate(request, user=self.user)
+
+        response = get_healthcare_addresses_by_provider_by_id(request, hcp.id)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 5)
+        self.assertEqual([item['id'] for item in response.data['results']], [addresses[2].id, addresses[3].id])
+
+    def test_endpoint_get_hcp_addresses_by_id_should_return_404(self):
+        request = self.factory.get('/v1/hcp/1/address/')
+        force_authenticate(request, user=self.user)
+
+        response = get_healthcare_addresses_by_provider_by_id(request, 1)
+
+        self.assertEqual(response.status_code, 404)
+
+    def test_endpoint_get_hcp_address_by_id_should_return_requested_address(self):
+        hcp = HealthCareProvider.objects.create(name='hcp', status='A')
+        address1 = Address.objects.create(addr1="Address 1", city="City 1", status="A")
+        address2 = Address.objects.create(addr1="Address 2", city="City 2", status="A")
+        other_address = Address.objects.create(addr1="Address 3", city="City 3", status="A")
+        hcp.addresses.set([address1, address2])
+
+        request = self.factory.get(f'/v1/hcp/{hcp.id}/address/{address2.id}/')
+        force_authenticate(request, user=self.user)
+        response = get_healthcare_provider_address_by_id(request, hcp.id, address2.id)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['addr1'], 'Address 2')
+
+        request = self.factory.get(f'/v1/hcp/{hcp.id}/address/{other_address.id}/')
+        force_authenticate(request, user=self.user)
+        response = get_healthcare_provider_address_by_id(request, hcp.id, other_address.id)
+
+        self.assertEqual(response.status_code, 404)
+
     def test_endpoint_get_hcp_affiliations_should_return_expected_result(self):
         hcp = HealthCareProvider.objects.create(name='hco', status='A')
         hcp2 = HealthCareProvider.objects.create(name='hco2', status='A')
@@ -245,7 +356,100 @@ class HealthCareProviderCase(TestCase):
         }.items())
 
 
-class AffiliationCase(TestCase):
+class KeysetPaginationCase(DataTestCase):
+    def setUp(self):
+        self.factory = APIRequestFactory()
+        self.user = User.objects.create_user('user', 'user@gmail.com', 'pwd')
+        self.providers = [HealthCareProvider.objects.create(name=f'hcp{index}', status='A') for index in range(5)]
+
+    def get_providers(self, url):
+        request = self.factory.get(url)
+        force_authenticate(request, user=self.user)
+        return get_all_providers(request)
+
+    def test_endpoint_admin_get_all_hcp_with_cursor_should_walk_all_pages(self):
+        names, url = [], '/v1/admin/hcp/?cursor=&limit=2'
+        while url:
+            response = self.get_providers(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn('count', response.data)
+            names.extend(item['name'] for item in response.data['results'])
+            url = response.data['next']
+
+        self.assertEqual(names, [provider.name for provider in self.providers])
+
+    def test_endpoint_admin_get_all_hcp_with_after_id_should_seek_by_id(self):
+        response = self.get_providers(f'/v1/admin/hcp/?after_id={self.providers[2].id}&limit=1')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([item['id'] for item in response.data['results']], [self.providers[3].id])
+        self.assertEqual(decode_cursor(response.data['next_cursor']), {'id': self.providers[3].id})
+        self.assertNotIn('after_id', response.data['next'])
+
+    def test_endpoint_admin_get_all_hcp_with_invalid_cursor_should_return_404(self):
+        response = self.get_providers('/v1/admin/hcp/?cursor=invalid')
+
+        self.assertEqual(response.status_code, 404)
+
+    def test_endpoint_admin_get_all_hcp_without_cursor_should_keep_limit_offset(self):
+        response = self.get_providers('/v1/admin/hcp/?limit=2&offset=4')
+
+        self.assertEqual(response.data['count'], 5)
+        self.assertEqual(len(response.data['results']), 1)
+
+
+class CountModeCase(DataTestCase):
+    def setUp(self):
+        self.factory = APIRequestFactory()
+        self.user = User.objects.create_user('user', 'user@gmail.com', 'pwd')
+        for index in range(5):
+            Address.objects.create(addr1=f"Address {index}", city="City 1", status="A")
+
+    def get_addresses(self, url):
+        request = self.factory.get(url)
+        force_authenticate(request, user=self.user)
+        return get_all_addresses(request)
+
+    def test_endpoint_admin_get_all_addresses_should_report_exact_count_by_default(self):
+        response = self.get_addresses('/v1/admin/address/?limit=2')
+
+        self.assertEqual(response.data['count'], 5)
+        self.assertTrue(response.data['count_exact'])
+
+    def test_endpoint_admin_get_all_addresses_with_count_none_should_skip_count(self):
+        with self.assertNumQueries(1):
+            response = self.get_addresses('/v1/admin/address/?limit=2&count=none')
+
+        self.assertIsNone(response.data['count'])
+        self.assertFalse(response.data['count_exact'])
+        self.assertEqual(len(response.data['results']), 2)
+        self.assertIn('offset=2', response.data['next'])
+
+        response = self.get_addresses('/v1/admin/address/?limit=2&offset=4&count=none')
+        self.assertEqual(response.data['count'], 5)
+        self.assertTrue(response.data['count_exact'])
+        self.assertIsNone(response.data['next'])
+
+    def test_endpoint_admin_get_all_addresses_with_count_estimate_should_use_cached_count(self):
+        self.get_addresses('/v1/admin/address/?limit=2&count=exact')
+
+        with self.assertNumQueries(1):
+            response = self.get_addresses('/v1/admin/address/?limit=2&count=estimate')
+        self.assertEqual(response.data['count'], 5)
+        self.assertFalse(response.data['count_exact'])
+
+        # writes invalidate the cached count
+        with self.captureOnCommitCallbacks(execute=True):
+            Address.objects.create(addr1="Address 6", city="City 1", status="A")
+        self.assertIsNone(get_cached_count(Address.objects.filter(status='A')))
+
+    def test_endpoint_admin_get_all_addresses_with_invalid_count_should_return_400(self):
+        response = self.get_addresses('/v1/admin/address/?count=invalid')
+
+        self.assertEqual(response.status_code, 400)
+
+
+class AffiliationCase(DataTestCase):
     def setUp(self):
         self.factory = APIRequestFactory()
         self.user = User.objects.create_user('user', 'user@gmail.com', 'pwd')
@@ -336,3 +540,1590 @@ class AffiliationCase(TestCase):
             'status': 'A',
             'type': 'HCP_HCO'
         }.items())
+
+
+class IngestDataCase(DataTestCase):
+    data = {
+        'address': [
+            {'parent_type': 'HCP', 'addr1': 'Address 1', 'city': 'City 1', 'state': 'NY', 'zip': '10001', 'status': 'A'},
+            {'parent_type': 'HCO', 'addr1': 'Address 2', 'addr2': 'Suite 2', 'city': 'City 2', 'state': 'NY', 'zip': '10002', 'status': 'A'},
+            {'parent_type': 'HCP', 'addr1': 'Address 3', 'city': 'City 3', 'state': 'CA', 'zip': '90001', 'status': 'I'},
+        ],
+        'hco': [{'name': 'hco1', 'status': 'A'}],
+        'hcp': [{'name': 'hcp1', 'status': 'A'}, {'name': 'hcp2', 'status': 'I'}],
+        'affiliation': [
+            {'parent_link': 1, 'child_link': 2, 'status': 'A', 'type': 'HCP_HCP'},
+            {'parent_link': 1, 'child_link': 2, 'status': 'A', 'type': 'HCO_HCP'},
+        ]
+    }
+
+    def assert_ingested(self):
+        hcp1, hcp2 = HealthCareProvider.objects.order_by('id')
+        hco1 = HealthCareOrganization.objects.get()
+
+        self.assertEqual(list(hcp1.addresses.values_list('addr1', flat=True)), ['Address 1'])
+        self.assertEqual(list(hcp2.addresses.values_list('addr1', flat=True)), ['Address 3'])
+        self.assertEqual(list(hco1.addresses.values_list('addr2', flat=True)), ['Suite 2'])
+        self.assertTrue(Affiliation.objects.filter(parent_hcp_link=hcp1, child_hcp_link=hcp2, type='HCP_HCP').exists())
+        self.assertTrue(Affiliation.objects.filter(parent_hco_link=hco1, child_hcp_link=hcp2, type='HCO_HCP').exists())
+
+    def test_save_entities_should_link_addresses_and_affiliations_by_position(self):
+        DataProcessor().save_entities(self.data)
+
+        self.assert_ingested()
+
+    def test_bulk_save_entities_should_match_row_by_row_result(self):
+        processor = BulkDataProcessor(batch_size=2)
+        processor.save_entities(self.data)
+
+        self.assert_ingested()
+        self.assertEqual(processor.stats['address']['rows'], 3)
+        self.assertEqual(processor.stats['affiliation']['rows'], 2)
+
+    def test_address_rows_should_count_every_inserted_address(self):
+        # an address of another parent type is inserted but not linked
+        data = {**self.data, 'address': [*self.data['address'], {'parent_type': 'ORG', 'addr1': 'Address 4', 'city': 'City 4', 'state': 'NY', 'zip': '10004', 'status': 'A'}]}
+        for processor in [DataProcessor(), BulkDataProcessor(batch_size=2)]:
+            with self.subTest(processor=type(processor).__name__):
+                processor.save_entities(data)
+                self.assertEqual(processor.stats['address']['rows'], Address.objects.count())
+                self.assertEqual(processor.stats['address']['rows'], 4)
+                self.assertEqual(processor.stats['address_link']['rows'], 3)
+                Address.objects.all().delete()
+
+    def test_parallel_save_entities_with_single_worker_should_match_row_by_row_result(self):
+        processor = ParallelDataProcessor(1, batch_size=1)
+        processor.save_entities(self.data)
+
+        self.assert_ingested()
+
+    def test_map_affiliation_row_should_resolve_input_positions_to_ids(self):
+        row = BulkDataProcessor.map_affiliation_row({'parent_link': 2, 'child_link': 1, 'status': 'A', 'type': 'HCP_HCO'}, [10], [20, 21])
+
+        self.assertEqual(row, {
+            'type': 'HCP_HCO',
+            'status': 'A',
+            'parent_hco_link_id': None,
+            'parent_hcp_link_id': 21,
+            'child_hcp_link_id': None,
+            'child_hco_link_id': 10
+        })
+
+    def test_read_data_files_should_stream_json_ndjson_and_csv(self):
+        with tempfile.TemporaryDirectory() as directory:
+            filenames = {
+                'address': os.path.join(directory, 'addresses.json'),
+                'hco': os.path.join(directory, 'hco.ndjson'),
+                'hcp': os.path.join(directory, 'hcp.csv'),
+                'affiliation': os.path.join(directory, 'affiliations.json'),
+            }
+            with open(filenames['address'], 'w') as file:
+                json.dump(self.data['address'], file, indent=4)
+            with open(filenames['hco'], 'w') as file:
+                file.writelines(json.dumps(hco) + '\n' for hco in self.data['hco'])
+            with open(filenames['hcp'], 'w') as file:
+                file.write('name,status\nhcp1,A\nhcp2,I\n')
+            with open(filenames['affiliation'], 'w') as file:
+                json.dump(self.data['affiliation'], file)
+
+            processor = BulkDataProcessor()
+            data = processor.read_data_files(filenames)
+            self.assertFalse(isinstance(data['address'], list))
+            processor.save_entities(data)
+
+        self.assert_ingested()
+
+    def test_iter_json_array_should_yield_records_split_across_chunks(self):
+        records = [{'id': index, 'name': f'name {index}', 'nested': {'values': [1, 2, 3]}} for index in range(50)]
+
+        parsed = list(iter_json_array(io.StringIO(json.dumps(records, indent=2)), chunk_size=7))
+
+        self.assertEqual(parsed, records)
+        self.assertEqual(list(iter_json_array(io.StringIO('[1, 22, 333]'), chunk_size=1)), [1, 22, 333])
+        self.assertEqual(list(iter_json_array(io.StringIO(' [ ] '))), [])
+
+
+class ResponseCacheCase(DataTestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('user', 'user@gmail.com', 'pwd')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.hcp = HealthCareProvider.objects.create(name='hcp', status='A')
+        self.hco = HealthCareOrganization.objects.create(name='hco', status='A')
+        self.address = Address.objects.create(addr1="Address 1", city="City 1", status="A")
+        self.hcp.addresses.add(self.address)
+        reset_stats()
+
+    def get_cached(self, url):
+        # first request fills the cache, the second one must not reach the database
+        first = self.client.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            second = self.client.get(url)
+        self.assertEqual(len(queries), 0)
+        self.assertEqual(first.json(), second.json())
+        self.assertEqual(second['Content-Type'], 'application/json')
+        return second.json()
+
+    def test_cached_response_should_be_served_without_queries(self):
+        self.get_cached(f'/api/v1/hcp/{self.hcp.id}/')
+        self.get_cached('/api/v1/admin/hcp/')
+        self.assertEqual(get_stats()['hits'], 2)
+        self.assertEqual(get_stats()['misses'], 2)
+
+    def test_cached_response_should_still_require_authentication(self):
+        self.get_cached(f'/api/v1/hcp/{self.hcp.id}/')
+        response = APIClient().get(f'/api/v1/hcp/{self.hcp.id}/')
+        self.assertEqual(response.status_code, 403)
+
+    def test_not_found_should_not_be_cached(self):
+        self.client.get('/api/v1/hcp/999999/')
+        self.client.get('/api/v1/hcp/999999/')
+        self.assertEqual(get_stats()['hits'], 0)
+
+    def test_entity_update_should_invalidate_detail_and_list(self):
+        self.get_cached(f'/api/v1/hcp/{self.hcp.id}/')
+        self.get_cached('/api/v1/admin/hcp/')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.hcp.name = 'updated'
+            self.hcp.save()
+        self.assertEqual(self.client.get(f'/api/v1/hcp/{self.hcp.id}/').json()['name'], 'updated')
+        self.assertEqual(self.client.get('/api/v1/admin/hcp/').json()['results'][0]['name'], 'updated')
+
+    def test_padded_id_should_share_the_invalidation(self):
+        self.get_cached(f'/api/v1/hcp/00{self.hcp.id}/')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.hcp.name = 'updated'
+            self.hcp.save()
+        self.assertEqual(self.client.get(f'/api/v1/hcp/00{self.hcp.id}/').json()['name'], 'updated')
+
+    def test_address_update_should_invalidate_parent_addresses(self):
+        addresses_url = f'/api/v1/hcp/{self.hcp.id}/address/'
+        address_url = f'/api/v1/hcp/{self.hcp.id}/address/{self.address.id}/'
+        self.get_cached(addresses_url)
+        self.get_cached(address_url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.address.city = 'City 2'
+            self.address.save()
+        self.assertEqual(self.client.get(addresses_url).json()['results'][0]['city'], 'City 2')
+        self.assertEqual(self.client.get(address_url).json()['city'], 'City 2')
+
+    def test_address_links_should_invalidate_parent_addresses(self):
+        addresses_url = f'/api/v1/hcp/{self.hcp.id}/address/'
+        self.get_cached(addresses_url)
+        with self.captureOnCommitCallbacks(execute=True):
+            other = Address.objects.create(addr1="Address 2", city="City 1", status="A")
+            other.healthcareprovider_set.add(self.hcp)
+        self.assertEqual(self.client.get(addresses_url).json()['count'], 2)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.hcp.addresses.clear()
+        self.assertEqual(self.client.get(addresses_url).json()['count'], 0)
+
+    def test_affiliation_changes_should_invalidate_entity_affiliations(self):
+        affiliations_url = f'/api/v1/hcp/{self.hcp.id}/affiliation/'
+        self.assertEqual(self.get_cached(affiliations_url)['count'], 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            affiliation = Affiliation.create(parent_hcp_link=self.hcp, child_hco_link=self.hco, status='A', type='HCP_HCO')
+        self.assertEqual(self.client.get(affiliations_url).json()['count'], 1)
+
+        self.get_cached(f'/api/v1/hco/{self.hco.id}/affiliation/')
+        other = HealthCareOrganization.objects.create(name='other', status='A')
+        affiliation.child_hco_link = other
+        with self.captureOnCommitCallbacks(execute=True):
+            affiliation.save()
+        self.assertEqual(self.client.get(f'/api/v1/hco/{self.hco.id}/affiliation/').json()['count'], 0)
+
+    @override_settings(DATA_RESPONSE_CACHE=False)
+    def test_disabled_cache_should_not_be_used(self):
+        self.client.get(f'/api/v1/hcp/{self.hcp.id}/')
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(f'/api/v1/hcp/{self.hcp.id}/')
+        self.assertEqual(len(queries), 1)
+        self.assertFalse(self.client.get('/api/v1/admin/cache/').json()['enabled'])
+
+
+@override_settings(DATA_RESPONSE_CACHE=False)
+class ConditionalRequestCase(DataTestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('user', 'user@gmail.com', 'pwd')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.hcp = HealthCareProvider.objects.create(name='hcp', status='A')
+        self.url = f'/api/v1/hcp/{self.hcp.id}/'
+
+    def test_response_should_include_validators(self):
+        for url in (self.url, '/api/v1/admin/hcp/'):
+            response = self.client.get(url)
+            self.assertRegex(response['ETag'], r'^"[0-9a-f]{32}"$')
+            self.assertTrue(response['Last-Modified'].endswith('GMT'))
+            self.assertEqual(response['Content-Type'], 'application/json')
+
+    def test_matching_etag_should_return_304_without_queries(self):
+        etag = self.client.get(self.url)['ETag']
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(len(queries), 0)
+
+    def test_etag_should_change_after_write(self):
+        etag = self.client.get(self.url)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.hcp.name = 'updated'
+            self.hcp.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.json()['name'], 'updated')
+
+    def test_etag_should_only_change_once_the_write_is_committed(self):
+        # a request of another connection reads the previous row until the commit, the row version
+        # must not change before it (that row would be cached under the new version)
+        key = version_key(HealthCareProvider, self.hcp.id)
+        etag = self.client.get(self.url)['ETag']
+        version = get_cache().get(key)
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                self.hcp.name = 'updated'
+                self.hcp.save()
+                self.assertEqual(get_cache().get(key), version)
+                self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertNotEqual(get_cache().get(key), version)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['name'], 'updated')
+
+    def test_etag_should_depend_on_query_params(self):
+        etag = self.client.get('/api/v1/admin/hcp/', {'limit': 1})['ETag']
+        response = self.client.get('/api/v1/admin/hcp/', {'limit': 2}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_if_modified_since_should_return_304_when_not_modified(self):
+        last_modified = self.client.get(self.url)['Last-Modified']
+        self.assertEqual(self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 304)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_MODIFIED_SINCE='Mon, 01 Jan 2001 00:00:00 GMT').status_code, 200)
+
+    def test_if_none_match_should_take_precedence_over_if_modified_since(self):
+        last_modified = self.client.get(self.url)['Last-Modified']
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH='"other"', HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 200)
+
+    def test_not_modified_should_still_require_authentication(self):
+        etag = self.client.get(self.url)['ETag']
+        self.assertEqual(APIClient().get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 403)
+
+    def test_if_none_match_any_should_return_304_only_for_existing_resources(self):
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH='*').status_code, 304)
+        self.assertEqual(self.client.get('/api/v1/hcp/999999/', HTTP_IF_NONE_MATCH='*').status_code, 404)
+
+    @override_settings(CACHES={**settings.CACHES, 'data': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_process_local_cache_should_disable_validators_and_cache(self):
+        # its versions would miss the writes of the other processes (ingest_data, workers)
+        reset_stats()
+        for _ in range(2):
+            response = self.client.get(self.url)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn('ETag', response)
+            self.assertNotIn('Last-Modified', response)
+        self.assertEqual(get_stats()['hits'] + get_stats()['misses'], 0)
+
+
+class ExportCase(DataTestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('user', 'user@gmail.com', 'pwd')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.hcps = [HealthCareProvider.objects.create(name=f'hcp{index}', status='A' if index % 3 else 'I') for index in range(10)]
+        self.hco = HealthCareOrganization.objects.create(name='hco', status='A')
+        Address.objects.create(addr1="Address 1", city="City 1", status="A", parent_type="HCP")
+        Address.objects.create(addr1="Address 2", city="City 1", status="A", parent_type="HCO")
+        Affiliation.create(parent_hcp_link=self.hcps[1], child_hco_link=self.hco, status='A', type='HCP_HCO')
+
+    def export(self, url, params=None):
+        response = self.client.get(url, params or {})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        return [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+
+    @override_settings(DATA_EXPORT_CHUNK_SIZE=2)
+    def test_export_should_stream_all_matching_rows(self):
+        rows = self.export('/api/v1/admin/hcp/export/')
+        expected = HealthCareProviderSerializer(HealthCareProvider.objects.filter(status='A').order_by('id'), many=True).data
+        self.assertEqual(rows, json.loads(json.dumps(expected)))
+        self.assertEqual([row['status'] for row in self.export('/api/v1/admin/hcp/export/', {'status': 'I'})], ['I'] * 4)
+
+    def test_export_should_apply_list_filters(self):
+        self.assertEqual([row['parent_type'] for row in self.export('/api/v1/admin/address/export/', {'type': 'HCO'})], ['HCO'])
+        self.assertEqual(len(self.export('/api/v1/admin/hco/export/')), 1)
+        affiliations = self.export('/api/v1/admin/affiliation/export/', {'type': 'HCP_HCO'})
+        self.assertEqual([(row['parent_link'], row['child_link']) for row in affiliations], [(self.hcps[1].id, self.hco.id)])
+
+    def test_export_should_require_authentication(self):
+        self.assertEqual(APIClient().get('/api/v1/admin/hcp/export/').status_code, 403)
+
+    @override_settings(DATA_EXPORT_CHUNK_SIZE=2)
+    def test_export_should_be_consumed_incrementally_under_asgi(self):
+        # each chunk is sent once read, not after the whole export was read into a list
+        token = Token.objects.create(user=self.user)
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET', 'scheme': 'http',
+            'path': '/api/v1/admin/hcp/export/', 'query_string': b'', 'server': ('testserver', 80), 'client': ('127.0.0.1', 1),
+            'headers': [(b'host', b'testserver'), (b'authorization', f'Token {token.key}'.encode())],
+        }
+        serialize = mock.Mock(wraps=PROVIDER_PLAN.serialize)
+        # serialized chunks when each body message is sent
+        bodies = []
+
+        async def receive():
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+        async def send(message):
+            if message['type'] == 'http.response.body':
+                bodies.append((serialize.call_count, message.get('body', b'')))
+
+        # as the test client: the test transaction must outlive the request
+        request_started.disconnect(close_old_connections)
+        request_finished.disconnect(close_old_connections)
+        try:
+            with mock.patch.object(PROVIDER_PLAN, 'serialize', serialize):
+                async_to_sync(ASGIHandler())(scope, receive, send)
+        finally:
+            request_started.connect(close_old_connections)
+            request_finished.connect(close_old_connections)
+        self.assertEqual([count for count, _ in bodies], [1, 2, 3, 3])
+        rows = [json.loads(line) for line in b''.join(body for _, body in bodies).decode().splitlines()]
+        self.assertEqual([row['id'] for row in rows], list(HealthCareProvider.objects.filter(status='A').order_by('id').values_list('id', flat=True)))
+
+
+class FieldPlanCase(DataTestCase):
+    # the field plans and FastJSONRenderer must give the bytes of the serializers + JSONRenderer
+    def setUp(self):
+        self.hcps = [
+            HealthCareProvider.objects.create(name=name, status='A')
+            for name in ['hcp', 'Ärztin \u00e9 \u4e2d', 'line\u2028separator\u2029', 'quote " \\ \n\t']
+        ]
+        self.hco = HealthCareOrganization.objects.create(name='hco', status='A')
+        Address.objects.create(addr1="Address 1", addr2=None, city="City 1", state="NY", zip="10001", status="A", parent_type="HCP")
+        Address.objects.create(addr1="Address 2", addr2="Suite 2", city="City 1", state="NY", zip="10002", status="A", parent_type="HCO")
+        Affiliation.create(parent_hcp_link=self.hcps[0], child_hco_link=self.hco, status='A', type='HCP_HCO')
+        Affiliation.create(parent_hco_link=self.hco, child_hcp_link=self.hcps[1], status='A', type='HCO_HCP')
+        Affiliation.create(parent_hcp_link=self.hcps[1], child_hcp_link=self.hcps[2], status='I', type='HCP_HCP')
+
+    def test_plan_should_match_serializer_output(self):
+        cases = [
+            (HealthCareProviderSerializer, PROVIDER_PLAN, HealthCareProvider),
+            (HealthCareOrganizationSerializer, ORGANIZATION_PLAN, HealthCareOrganization),
+            (AddressSerializer, ADDRESS_PLAN, Address),
+            (AffiliationSerializer, AFFILIATION_PLAN, Affiliation),
+        ]
+        for serializer_class, plan, model in cases:
+            query_set = model.objects.order_by('id')
+            expected = serializer_class(query_set, many=True).data
+            rows = plan.serialize(plan.rows(query_set))
+            self.assertEqual(rows, expected)
+            self.assertEqual(FastJSONRenderer().render(rows), JSONRenderer().render(expected))
+            self.assertEqual(plan.serialize_one(plan.rows(query_set).first()), expected[0])
+
+    def test_fast_renderer_should_match_json_renderer(self):
+        values = [
+            {'id': 1, 'name': 'Ärztin \u4e2d \u2028 \u2029 </script>', 'addr2': None, 'ok': True, 'ratio': 0.5},
+            [], {}, 'text', 10, None, '',
+        ]
+        for value in values:
+            self.assertEqual(FastJSONRenderer().render(value), JSONRenderer().render(value))
+        self.assertEqual(FastJSONRenderer().render({'a': 1}, 'application/json; indent=2'), JSONRenderer().render({'a': 1}, 'application/json; indent=2'))
+
+    def test_views_should_render_serializer_output(self):
+        user = User.objects.create_user('user', 'user@gmail.com', 'pwd')
+        client = APIClient()
+        client.force_authenticate(user=user)
+        response = client.get('/api/v1/admin/hcp/', {'limit': 10})
+        expected = HealthCareProviderSerializer(HealthCareProvider.objects.order_by('id'), many=True).data
+        self.assertEqual(response.content, JSONRenderer().render(dict(response.data, results=expected)))
+        response = client.get(f'/api/v1/hcp/{self.hcps[2].id}/')
+        self.assertEqual(response.content, JSONRenderer().render(expected[2]))
+        self.assertIn(b'\\u2028', response.content)
+
+
+class MultiGetCase(DataTestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('user', 'user@gmail.com', 'pwd')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.hcps = [HealthCareProvider.objects.create(name=f'hcp{index}', status='A' if index % 2 else 'I') for index in range(5)]
+        self.hco = HealthCareOrganization.objects.create(name='hco', status='A')
+        self.address = Address.objects.create(addr1="Address 1", city="City 1", status="A", parent_type="HCP")
+        self.affiliation = Affiliation.create(parent_hcp_link=self.hcps[1], child_hco_link=self.hco, status='A', type='HCP_HCO')
+
+    def test_multi_get_should_return_rows_in_requested_order(self):
+        ids = [self.hcps[3].id, self.hcps[0].id, self.hcps[3].id, self.hcps[2].id]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/v1/hcp/', {'ids': ','.join(str(id) for id in ids)})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(queries), 1)
+        expected = HealthCareProviderSerializer([self.hcps[3], self.hcps[0], self.hcps[2]], many=True).data
+        self.assertEqual(response.data, {'results': expected, 'missing': []})
+
+    def test_multi_get_should_report_missing_ids(self):
+        response = self.client.get('/api/v1/hco/', {'ids': f'999999, {self.hco.id},888888'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row['name'] for row in response.data['results']], ['hco'])
+        self.assertEqual(response.data['missing'], [999999, 888888])
+
+        response = self.client.get('/api/v1/affiliation/', {'ids': f'{self.affiliation.id}'})
+        self.assertEqual(response.data['results'], [{'id': self.affiliation.id, 'status': 'A', 'type': 'HCP_HCO', 'parent_link': self.hcps[1].id, 'child_link': self.hco.id}])
+        response = self.client.get('/api/v1/address/', {'ids': f'{self.address.id},{self.address.id + 1}'})
+        self.assertEqual((len(response.data['results']), response.data['missing']), (1, [self.address.id + 1]))
+
+    @override_settings(DATA_MULTI_GET_MAX_IDS=3)
+    def test_multi_get_should_validate_ids(self):
+        for ids in [None, '', ',', 'a', '1,b', '1,2,3,4']:
+            with self.subTest(ids=ids):
+                response = self.client.get('/api/v1/hcp/', {} if ids is None else {'ids': ids})
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('ids', response.data)
+        # duplicates count once
+        self.assertEqual(self.client.get('/api/v1/hcp/', {'ids': '1,2,3,3,2'}).status_code, 200)
+        self.assertEqual(APIClient().get('/api/v1/hcp/', {'ids': '1'}).status_code, 403)
+
+
+class ExpandCase(DataTestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('user', 'user@gmail.com', 'pwd')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.hcp = HealthCareProvider.objects.create(name='hcp', status='A')
+        self.hcp2 = HealthCareProvider.objects.create(name='hcp2', status='A')
+        self.hco = HealthCareOrganization.objects.create(name='hco', status='A')
+        self.address = Address.objects.create(addr1="Address 1", city="City 1", status="A", parent_type="HCP")
+        self.hcp.addresses.add(self.address)
+        self.affiliation = Affiliation.create(parent_hcp_link=self.hcp, child_hco_link=self.hco, status='A', type='HCP_HCO')
+        self.affiliation2 = Affiliation.create(parent_hcp_link=self.hcp2, child_hcp_link=self.hcp, status='A', type='HCP_HCP')
+
+    def test_unexpanded_responses_should_keep_their_shape(self):
+        response = self.client.get(f'/api/v1/hcp/{self.hcp.id}/')
+        self.assertEqual(response.data, {'id': self.hcp.id, 'name': 'hcp', 'status': 'A'})
+        self.assertEqual(self.client.get(f'/api/v1/hcp/{self.hcp.id}/', {'expand': ''}).content, response.content)
+
+    def test_expand_should_embed_addresses_and_affiliations(self):
+        response = self.client.get(f'/api/v1/hcp/{self.hcp.id}/', {'expand': 'addresses,affiliations.child'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['name'], 'hcp')
+        self.assertEqual([address['id'] for address in response.data['addresses']], [self.address.id])
+        affiliations = self.client.get(f'/api/v1/hcp/{self.hcp.id}/affiliation/').data['results']
+        self.assertEqual([{key: value for key, value in affiliation.items() if key != 'child'} for affiliation in response.data['affiliations']], affiliations)
+        self.assertEqual([affiliation['child'] for affiliation in response.data['affiliations']], [
+            {'id': self.hco.id, 'name': 'hco', 'status': 'A'},
+            {'id': self.hcp.id, 'name': 'hcp', 'status': 'A'},
+        ])
+        self.assertNotIn('parent', response.data['affiliations'][0])
+
+        response = self.client.get('/api/v1/admin/hco/', {'expand': 'affiliations.parent'})
+        self.assertEqual(response.data['results'][0]['affiliations'][0]['parent'], {'id': self.hcp.id, 'name': 'hcp', 'status': 'A'})
+        self.assertNotIn('addresses', response.data['results'][0])
+
+    def test_expand_should_reject_unknown_expansions(self):
+        self.assertEqual(self.client.get(f'/api/v1/hcp/{self.hcp.id}/', {'expand': 'addresses,unknown'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/v1/hcp/999999/', {'expand': 'addresses'}).status_code, 404)
+
+    def test_expanded_cached_responses_should_be_invalidated_by_linked_rows(self):
+        url = f'/api/v1/hcp/{self.hcp.id}/'
+        self.assertEqual(self.client.get(url, {'expand': 'affiliations.child'}).data['affiliations'][0]['child']['name'], 'hco')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.hco.name = 'renamed'
+            self.hco.save()
+        self.assertEqual(self.client.get(url, {'expand': 'affiliations.child'}).data['affiliations'][0]['child']['name'], 'renamed')
+
+
+class NetworkCase(DataTestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('user', 'user@gmail.com', 'pwd')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.hcps = [HealthCareProvider.objects.create(name=f'hcp{index}', status='A') for index in range(4)]
+        self.hcos = [HealthCareOrganization.objects.create(name=f'hco{index}', status='A') for index in range(3)]
+        # hcp0 -> hco0 -> hcp1 -> hcp0 (cycle), hcp1 -> hco1 -> hco2, hcp0 -> hcp3 inactive
+        self.affiliations = [
+            Affiliation.create(parent_hcp_link=self.hcps[0], child_hco_link=self.hcos[0], status='A', type='HCP_HCO'),
+            Affiliation.create(parent_hco_link=self.hcos[0], child_hcp_link=self.hcps[1], status='A', type='HCO_HCP'),
+            Affiliation.create(parent_hcp_link=self.hcps[1], child_hcp_link=self.hcps[0], status='A', type='HCP_HCP'),
+            Affiliation.create(parent_hcp_link=self.hcps[1], child_hco_link=self.hcos[1], status='A', type='HCP_HCO'),
+            Affiliation.create(parent_hco_link=self.hcos[1], child_hco_link=self.hcos[2], status='A', type='HCO_HCO'),
+            Affiliation.create(parent_hcp_link=self.hcps[0], child_hcp_link=self.hcps[3], status='I', type='HCP_HCP'),
+        ]
+
+    def get_network(self, url, params=None):
+        response = self.client.get(url, params or {})
+        self.assertEqual(response.status_code, 200)
+        nodes = [(node['type'], node['id'], node['depth']) for node in response.data['nodes']]
+        return nodes, [edge['id'] for edge in response.data['edges']], response.data['truncated']
+
+    def test_network_should_return_reachable_subgraph(self):
+        url = f'/api/v1/hcp/{self.hcps[0].id}/network/'
+        self.assertEqual(self.get_network(url, {'depth': 0}), ([('HCP', self.hcps[0].id, 0)], [], False))
+
+        nodes, edges, truncated = self.get_network(url)
+        self.assertEqual(nodes, [('HCP', self.hcps[0].id, 0), ('HCO', self.hcos[0].id, 1), ('HCP', self.hcps[1].id, 1)])
+        self.assertEqual(edges, [affiliation.id for affiliation in self.affiliations[:3]])
+
+        nodes, edges, truncated = self.get_network(url, {'depth': 4})
+        self.assertEqual(nodes, [
+            ('HCP', self.hcps[0].id, 0), ('HCO', self.hcos[0].id, 1), ('HCP', self.hcps[1].id, 1), ('HCO', self.hcos[1].id, 2), ('HCO', self.hcos[2].id, 3),
+        ])
+        self.assertEqual((edges, truncated), ([affiliation.id for affiliation in self.affiliations[:5]], False))
+
+        response = self.client.get(f'/api/v1/hco/{self.hcos[2].id}/network/', {'depth': 1})
+        self.assertEqual(response.data['nodes'][1], {'type': 'HCO', 'id': self.hcos[1].id, 'name': 'hco1', 'status': 'A', 'depth': 1})
+        self.assertEqual(response.data['edges'], [AffiliationSerializer(self.affiliations[4]).data])
+
+    def test_network_should_filter_affiliations_by_status(self):
+        nodes, edges, _ = self.get_network(f'/api/v1/hcp/{self.hcps[0].id}/network/', {'status': 'I', 'depth': 2})
+        self.assertEqual(nodes, [('HCP', self.hcps[0].id, 0), ('HCP', self.hcps[3].id, 1)])
+        self.assertEqual(edges, [self.affiliations[5].id])
+
+    @override_settings(DATA_NETWORK_MAX_NODES=2)
+    def test_network_should_limit_nodes(self):
+        nodes, edges, truncated = self.get_network(f'/api/v1/hcp/{self.hcps[0].id}/network/', {'depth': 4})
+        self.assertEqual(nodes, [('HCP', self.hcps[0].id, 0), ('HCO', self.hcos[0].id, 1)])
+        self.assertEqual((edges, truncated), ([self.affiliations[0].id], True))
+
+    def test_network_should_validate_params(self):
+        url = f'/api/v1/hcp/{self.hcps[0].id}/network/'
+        for depth in ['-1', '5', 'a']:
+            self.assertEqual(self.client.get(url, {'depth': depth}).status_code, 400)
+        self.assertEqual(self.client.get('/api/v1/hcp/999999/network/').status_code, 404)
+        self.assertEqual(self.client.get('/api/v1/hco/999999/network/').status_code, 404)
+
+
+class LocationFilterCase(DataTestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('user', 'user@gmail.com', 'pwd')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        locations = [('NY', 'New York', '10001'), ('ny', 'new york', '10002'), ('NY', 'Buffalo', '14201'), ('CA', 'New York', '90001'), ('CA', 'Los Angeles', '9%001')]
+        self.addresses = [Address.objects.create(addr1=f'{index} Main Street', state=state, city=city, zip=zip, status='A', parent_type='hcp') for index, (state, city, zip) in enumerate(locations)]
+        self.inactive = Address.objects.create(addr1='Old Street', state='TX', city='Austin', zip='73301', status='I', parent_type='hcp')
+        self.hcps = [HealthCareProvider.objects.create(name=f'hcp{index}', status='A') for index in range(3)]
+        self.hcos = [HealthCareOrganization.objects.create(name=f'hco{index}', status='A') for index in range(2)]
+        # hcp0: two NY addresses, hcp1: CA, hcp2: inactive TX address
+        self.hcps[0].addresses.set(self.addresses[:3])
+        self.hcps[1].addresses.set(self.addresses[3:])
+        self.hcps[2].addresses.set([self.inactive])
+        self.hcos[0].addresses.set([self.addresses[1], self.addresses[4]])
+
+    def get_ids(self, url, params):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return [item['id'] for item in response.data['results']]
+
+    def test_addresses_should_be_filtered_by_location(self):
+        ids = [address.id for address in self.addresses]
+        self.assertEqual(self.get_ids('/api/v1/admin/address/', {'state': 'ny'}), ids[:3])
+        self.assertEqual(self.get_ids('/api/v1/admin/address/', {'city': 'NEW YORK'}), [ids[0], ids[1], ids[3]])
+        self.assertEqual(self.get_ids('/api/v1/admin/address/', {'state': 'NY', 'city': 'new york'}), ids[:2])
+        self.assertEqual(self.get_ids('/api/v1/admin/address/', {'zip': '100'}), ids[:2])
+        self.assertEqual(self.get_ids('/api/v1/admin/address/', {'zip': '9%'}), [ids[4]])
+        self.assertEqual(self.get_ids('/api/v1/admin/address/', {'zip': '1', 'state': 'NY', 'cursor': encode_cursor({'id': ids[0]})}), ids[1:3])
+        self.assertEqual(self.get_ids('/api/v1/admin/address/', {'state': 'TX'}), [])
+        self.assertEqual(self.get_ids('/api/v1/admin/address/', {'state': 'TX', 'status': 'I'}), [self.inactive.id])
+        self.assertEqual(self.get_ids('/api/v1/admin/address/', {'state': ' '}), ids)
+
+    def test_entity_addresses_should_be_filtered_by_location(self):
+        self.assertEqual(self.get_ids(f'/api/v1/hcp/{self.hcps[0].id}/address/', {'city': 'new york'}), [address.id for address in self.addresses[:2]])
+        self.assertEqual(self.get_ids(f'/api/v1/hco/{self.hcos[0].id}/address/', {'state': 'CA'}), [self.addresses[4].id])
+        self.assertEqual(self.get_ids(f'/api/v1/hco/{self.hcos[0].id}/address/', {'zip': '7'}), [])
+
+    def test_entities_should_be_filtered_by_address_location(self):
+        self.assertEqual(self.get_ids('/api/v1/admin/hcp/', {'city': 'new york'}), [self.hcps[0].id, self.hcps[1].id])
+        self.assertEqual(self.get_ids('/api/v1/admin/hcp/', {'state': 'ny', 'zip': '142'}), [self.hcps[0].id])
+        # one address must match all the filters
+        self.assertEqual(self.get_ids('/api/v1/admin/hcp/', {'state': 'CA', 'zip': '100'}), [])
+        # inactive addresses are not a location
+        self.assertEqual(self.get_ids('/api/v1/admin/hcp/', {'state': 'TX'}), [])
+        self.assertEqual(self.get_ids('/api/v1/admin/hco/', {'state': 'NY', 'count': 'exact'}), [self.hcos[0].id])
+        response = self.client.get('/api/v1/admin/hcp/', {'city': 'new york'})
+        self.assertEqual(response.data['count'], 2)
+
+    def test_filtered_entities_should_follow_address_writes(self):
+        self.assertEqual(self.get_ids('/api/v1/admin/hco/', {'city': 'buffalo'}), [])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.hcos[1].addresses.add(self.addresses[2])
+        self.assertEqual(self.get_ids('/api/v1/admin/hco/', {'city': 'buffalo'}), [self.hcos[1].id])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.addresses[2].city = 'Albany'
+            self.addresses[2].save()
+        self.assertEqual(self.get_ids('/api/v1/admin/hco/', {'city': 'buffalo'}), [])
+
+
+class SearchCase(DataTestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('user', 'user@gmail.com', 'pwd')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        names = ['John Smith', 'Johnny Smithers', 'Jon Smyth', 'Mary Johns', 'Smith Clinic', 'johnathan 100%_sure', 'Peter Parker']
+        self.hcps = [HealthCareProvider.objects.create(name=name, status='A') for name in names]
+        self.inactive = HealthCareProvider.objects.create(name='John Inactive', status='I')
+        self.hco = HealthCareOrganization.objects.create(name='St John Hospital', status='A')
+
+    def search(self, url, params):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_trigrams_should_match_pg_trgm(self):
+        # SELECT show_trgm('John Smith-Jr')
+        self.assertEqual(get_trigrams('John Smith-Jr'), {'  j', ' jo', 'joh', 'ohn', 'hn ', '  s', ' sm', 'smi', 'mit', 'ith', 'th ', ' jr', 'jr '})
+        # SELECT similarity('John Smith', 'Jon Smyth')
+        self.assertAlmostEqual(similarity(get_trigrams('John Smith'), get_trigrams('Jon Smyth')), 5 / 16)
+        self.assertEqual(similarity(get_trigrams('!!'), get_trigrams('John')), 0.0)
+
+    def test_search_should_rank_prefix_then_similar_names(self):
+        response = self.search('/api/v1/hcp/search/', {'q': 'john'})
+        names = [row['name'] for row in response.data['results']]
+        # prefix matches first (case insensitive), then similar names; no inactive nor HCO
+        self.assertEqual(set(names[:3]), {'John Smith', 'Johnny Smithers', 'johnathan 100%_sure'})
+        self.assertIn('Mary Johns', names[3:])
+        self.assertNotIn('Peter Parker', names)
+        self.assertNotIn('John Inactive', names)
+        self.assertEqual([row['rank'] for row in response.data['results']], sorted((row['rank'] for row in response.data['results']), reverse=True))
+        self.assertEqual(set(response.data['results'][0]), {'id', 'name', 'status', 'rank'})
+
+        # fuzzy: a misspelled name still matches
+        names = [row['name'] for row in self.search('/api/v1/hcp/search/', {'q': 'Jon Smith'}).data['results']]
+        self.assertEqual(names[:3], ['John Smith', 'Jon Smyth', 'Johnny Smithers'])
+
+        names = [row['name'] for row in self.search('/api/v1/hcp/search/', {'q': 'john', 'status': 'I'}).data['results']]
+        self.assertEqual(names, ['John Inactive'])
+        names = [row['name'] for row in self.search('/api/v1/hco/search/', {'q': 'john hospital'}).data['results']]
+        self.assertEqual(names, ['St John Hospital'])
+
+    def test_search_should_escape_like_wildcards(self):
+        names = [row['name'] for row in self.search('/api/v1/hcp/search/', {'q': 'johnathan 100%_'}).data['results']]
+        self.assertEqual(names[0], 'johnathan 100%_sure')
+        results = self.search('/api/v1/hcp/search/', {'q': '%'}).data['results']
+        self.assertEqual(results, [])
+
+    def test_search_should_paginate_by_rank_and_id(self):
+        HealthCareProvider.objects.bulk_create([HealthCareProvider(name='John Smith', status='A') for _ in range(5)])
+        expected = self.search('/api/v1/hcp/search/', {'q': 'smith', 'limit': 100}).data['results']
+        results, params = [], {'q': 'smith', 'limit': 2}
+        while True:
+            response = self.search('/api/v1/hcp/search/', params)
+            self.assertLessEqual(len(response.data['results']), 2)
+            results += response.data['results']
+            if response.data['next_cursor'] is None:
+                self.assertIsNone(response.data['next'])
+                break
+            self.assertEqual(parse_qs(urlparse(response.data['next']).query)['cursor'], [response.data['next_cursor']])
+            params = {**params, 'cursor': response.data['next_cursor']}
+        self.assertEqual(results, expected)
+        self.assertEqual(len({row['id'] for row in results}), len(results))
+
+    def test_search_should_validate_params(self):
+        for params in [{}, {'q': ' '}, {'q': 'x' * 201}]:
+            self.assertEqual(self.client.get('/api/v1/hcp/search/', params).status_code, 400)
+        self.assertEqual(self.client.get('/api/v1/hcp/search/', {'q': 'john', 'cursor': 'invalid'}).status_code, 404)
+        self.assertEqual(self.client.get('/api/v1/hcp/search/', {'q': 'john', 'cursor': encode_cursor({'id': 1})}).status_code, 404)
+
+    def test_search_should_follow_writes(self):
+        self.search('/api/v1/hcp/search/', {'q': 'spider'})
+        HealthCareProvider.objects.filter(id=self.hcps[-1].id).update(name='Spider Man')
+        bump_generation(HealthCareProvider)
+        names = [row['name'] for row in self.search('/api/v1/hcp/search/', {'q': 'spider'}).data['results']]
+        self.assertEqual(names, ['Spider Man'])
+
+
+class GraphIndexCase(DataTestCase):
+    # the index must give the same answers as the database
+    def setUp(self):
+        reset_graph_index()
+        self.user = User.objects.create_user('user', 'user@gmail.com', 'pwd')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        rng = random.Random(0)
+        self.hcps = [HealthCareProvider.objects.create(name=f'hcp{index}', status='A') for index in range(12)]
+        self.hcos = [HealthCareOrganization.objects.create(name=f'hco{index}', status='A') for index in range(6)]
+        nodes = [('hcp', hcp) for hcp in self.hcps] + [('hco', hco) for hco in self.hcos]
+        links = set()
+        while len(links) < 40:
+            (parent_kind, parent), (child_kind, child) = rng.sample(nodes, 2)
+            links.add((parent_kind, parent, child_kind, child))
+        for parent_kind, parent, child_kind, child in sorted(links, key=lambda link: (link[0], link[1].id, link[2], link[3].id)):
+            Affiliation.create(**{f'parent_{parent_kind}_link': parent, f'child_{child_kind}_link': child}, type=f'{parent_kind}_{child_kind}'.upper(), status=rng.choice('AAI'))
+
+    def get_nodes(self):
+        return [('HCP', hcp.id) for hcp in self.hcps] + [('HCO', hco.id) for hco in self.hcos]
+
+    def assertIndexMatchesDatabase(self, graph):
+        for kind, id in self.get_nodes():
+            query_set = Affiliation.filter_by_provider(id) if kind == 'HCP' else Affiliation.filter_by_organization(id)
+            expected = [affiliation.id for affiliation in query_set]
+            self.assertEqual([edge_id for _, edge_id, _ in graph.neighbours(kind, id)], expected)
+            self.assertEqual(graph.degree(kind, id, 'A'), len([affiliation for affiliation in query_set if affiliation.status == 'A']))
+
+    def test_neighbours_should_match_database(self):
+        self.assertIndexMatchesDatabase(get_graph_index())
+        hcp = self.hcps[0]
+        response = self.client.get(f'/api/v1/hcp/{hcp.id}/neighbours/', {'status': 'A'})
+        expected = AffiliationSerializer(Affiliation.filter_by_provider(hcp.id), many=True).data
+        self.assertEqual([neighbour['affiliation'] for neighbour in response.data['neighbours']], [affiliation for affiliation in expected if affiliation['status'] == 'A'])
+        self.assertEqual(response.data['degree'], len(response.data['neighbours']))
+        self.assertEqual(self.client.get('/api/v1/hcp/999999/neighbours/').status_code, 404)
+
+    def test_walk_should_match_database(self):
+        graph = get_graph_index()
+        for node in self.get_nodes():
+            for status in ['A', 'I']:
+                self.assertEqual(graph.walk_levels(node, 4, status, 1000), walk_levels(node, 4, status, 1000), (node, status))
+
+    def test_shortest_path_should_match_database(self):
+        graph = get_graph_index()
+        source = self.get_nodes()[0]
+        levels = walk_levels(source, 20, 'A', 1000)
+        for target in self.get_nodes():
+            response = self.client.get('/api/v1/graph/path/', {'source': '%s:%s' % source, 'target': '%s:%s' % target})
+            self.assertEqual(response.status_code, 200)
+            depth = next((depth for depth, level in enumerate(levels) if target in level), None)
+            self.assertEqual(response.data['length'], depth, target)
+            if depth is None:
+                continue
+            nodes = [(node['type'], node['id']) for node in response.data['nodes']]
+            self.assertEqual((nodes[0], nodes[-1]), (source, target))
+            # every step is an active affiliation between the consecutive entities
+            for (previous, following), edge in zip(zip(nodes, nodes[1:]), response.data['edges']):
+                self.assertEqual(edge, AffiliationSerializer(Affiliation.objects.get(id=edge['id'])).data)
+                self.assertEqual(edge['status'], 'A')
+                self.assertIn({(edge['type'][:3], edge['parent_link']), (edge['type'][4:], edge['child_link'])}, [{previous, following}])
+        self.assertIsNone(graph.shortest_path(source, self.get_nodes()[-1], 'A', max_depth=0))
+
+    def test_index_should_follow_writes(self):
+        graph = get_graph_index()
+        with self.captureOnCommitCallbacks(execute=True):
+            affiliation = Affiliation.create(parent_hco_link=self.hcos[0], child_hco_link=self.hcos[0], status='A', type='HCO_HCO')
+        with self.captureOnCommitCallbacks(execute=True):
+            affiliation.status = 'I'
+            affiliation.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            Affiliation.objects.order_by('id').first().delete()
+        with self.captureOnCommitCallbacks(execute=True):
+            moved = Affiliation.objects.filter(type='HCP_HCP').order_by('id').first()
+            moved.child_hcp_link = self.hcps[-1] if moved.parent_hcp_link != self.hcps[-1] else self.hcps[0]
+            moved.save()
+        self.assertIs(get_graph_index(), graph)
+        self.assertEqual(graph.get_stats()['added'], 2)
+        self.assertIndexMatchesDatabase(graph)
+        self.assertIndexMatchesDatabase(graph.compact())
+        self.assertEqual(sorted(graph.edges()), sorted(GraphIndex.from_database().edges()))
+
+    @override_settings(DATA_GRAPH_INDEX_MAX_DELTA=1)
+    def test_index_should_compact_overlay(self):
+        get_graph_index()
+        for affiliation in Affiliation.objects.order_by('id')[:3]:
+            with self.captureOnCommitCallbacks(execute=True):
+                affiliation.delete()
+        self.assertLessEqual(get_graph_index().get_delta(), 1)
+        self.assertIndexMatchesDatabase(get_graph_index())
+
+    def test_index_should_be_rebuilt_when_stale(self):
+        graph = get_graph_index()
+        # no signals (bulk ingestion), the generation is bumped by the ingestion
+        Affiliation.objects.bulk_create([Affiliation(parent_hcp_link=self.hcps[0], child_hcp_link=self.hcps[0], status='A', type='HCP_HCP')])
+        bump_generation(Affiliation)
+        self.assertIsNot(get_graph_index(), graph)
+        self.assertIndexMatchesDatabase(get_graph_index())
+        # a write that is not committed yet changes neither the generation nor the index
+        graph = get_graph_index()
+        Affiliation.objects.filter(type='HCP_HCP').first().delete()
+        self.assertIs(get_graph_index(), graph)
+        # a write of another process committed while this one was pending is not in the index
+        with self.captureOnCommitCallbacks(execute=True):
+            Affiliation.objects.filter(type='HCP_HCP').first().delete()
+            bump_generation(Affiliation)
+        self.assertIsNot(get_graph_index(), graph)
+        self.assertIndexMatchesDatabase(get_graph_index())
+
+    @override_settings(CACHES={**settings.CACHES, 'data': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}, DATA_GRAPH_INDEX_MAX_AGE=60)
+    def test_index_should_be_rebuilt_after_max_age_with_process_local_versions(self):
+        # the writes of the other processes do not reach a per-process generation
+        graph = get_graph_index()
+        self.assertIs(get_graph_index(), graph)
+        with mock.patch('data.graph.time.time', return_value=graph.built_at + 61):
+            self.assertIsNot(get_graph_index(), graph)
+        self.assertIndexMatchesDatabase(get_graph_index())
+
+    def test_network_should_be_served_by_index(self):
+        url = f'/api/v1/hco/{self.hcos[0].id}/network/'
+        expected = self.client.get(url, {'depth': 3}).content
+        with self.settings(DATA_GRAPH_INDEX=True), CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get(url, {'depth': 3}).content, expected)
+        # exists, index build, node details and edges, no query per level
+        self.assertLessEqual(len(queries), 5)
+
+    def test_path_should_validate_params(self):
+        for params in [{}, {'source': 'HCP:1'}, {'source': 'X:1', 'target': 'HCP:1'}, {'source': 'HCP:a', 'target': 'HCP:1'}]:
+            self.assertEqual(self.client.get('/api/v1/graph/path/', params).status_code, 400)
+        self.assertEqual(self.client.get('/api/v1/graph/path/', {'source': f'HCP:{self.hcps[0].id}', 'target': 'HCO:999999'}).status_code, 404)
+
+
+@override_settings(DATA_RESPONSE_CACHE=False)
+class AsyncViewsCase(DataTestCase):
+    PARAMS = [{}, {'limit': 1}, {'limit': 1, 'offset': 1, 'count': 'none'}, {'limit': 1, 'count': 'estimate'}, {'after_id': 0, 'limit': 1}]
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('user', 'user@gmail.com', 'pwd')
+        cls.token = Token.objects.create(user=cls.user)
+        cls.hcp = HealthCareProvider.objects.create(name='hcp', status='A')
+        cls.hco = HealthCareOrganization.objects.create(name='hco', status='A')
+        addresses = [Address.objects.create(addr1=f"Address {index}", city="City 1", status="A") for index in range(3)]
+        cls.hcp.addresses.set(addresses)
+        cls.hco.addresses.set(addresses)
+        cls.address = addresses[0]
+        cls.affiliation = Affiliation.create(parent_hcp_link=cls.hcp, child_hco_link=cls.hco, status='A', type='HCP_HCO')
+        Affiliation.create(parent_hco_link=cls.hco, child_hcp_link=HealthCareProvider.objects.create(name='hcp2', status='A'), status='A', type='HCO_HCP')
+
+    def get_sync(self, url, params=None, **headers):
+        return self.client.get(url, params or {}, **headers)
+
+    def get_async(self, url, params=None, **headers):
+        # the async client takes the headers by name (HTTP_IF_NONE_MATCH -> If-None-Match)
+        headers = {name.removeprefix('HTTP_').replace('_', '-'): value for name, value in headers.items()}
+        with self.settings(ROOT_URLCONF='data.tests'):
+            return async_to_sync(self.async_client.get)(url, params or {}, headers=headers)
+
+    def assertSameResponse(self, url, params=None, **headers):
+        expected = self.get_sync(url, params, **headers)
+        response = self.get_async(url, params, **headers)
+        self.assertEqual(response.status_code, expected.status_code, url)
+        self.assertEqual(response.content, expected.content, url)
+        for header in ('Content-Type', 'ETag', 'Last-Modified', 'Vary'):
+            self.assertEqual(response.get(header), expected.get(header), f'{url} {header}')
+        # DRF builds Allow from a set, the order changes between processes
+        self.assertEqual(set(response['Allow'].split(', ')), set(expected['Allow'].split(', ')))
+        return response
+
+    def get_urls(self):
+        ids = {
+            'provider_id': self.hcp.id,
+            'organization_id': self.hco.id,
+            'address_id': self.address.id,
+            'affiliation_id': self.affiliation.id,
+        }
+        for pattern in data_urls.urlpatterns:
+            if hasattr(async_views, pattern.name):
+                url = reverse(pattern.name, kwargs={name: ids[name] for name in pattern.pattern.converters})
+                model = MULTI_GET_MODELS.get(pattern.name)
+                if model:
+                    yield url, {'ids': f'999999,{model.objects.order_by("id").first().id}'}
+                elif pattern.name == 'get_affiliation_path':
+                    yield url, {'source': f'HCO:{self.hco.id}', 'target': f'HCP:{self.hcp.id}'}
+                elif pattern.name in ('search_providers', 'search_organizations'):
+                    yield url, {'q': 'hc'}
+                else:
+                    yield url, {}
+
+    def test_async_views_should_return_same_responses_as_sync_views(self):
+        headers = {'HTTP_AUTHORIZATION': f'Token {self.token.key}'}
+        for url, url_params in self.get_urls():
+            for params in self.PARAMS:
+                with self.subTest(url=url, params=params):
+                    self.assertEqual(self.assertSameResponse(url, {**params, **url_params}, **headers).status_code, 200)
+
+    def test_async_views_should_return_same_expanded_responses(self):
+        headers = {'HTTP_AUTHORIZATION': f'Token {self.token.key}'}
+        params = {'expand': 'addresses,affiliations.parent,affiliations.child'}
+        for url in ['/api/v1/admin/hcp/', '/api/v1/admin/hco/', f'/api/v1/hcp/{self.hcp.id}/', f'/api/v1/hco/{self.hco.id}/']:
+            self.assertEqual(self.assertSameResponse(url, params, **headers).status_code, 200)
+        self.assertEqual(self.assertSameResponse('/api/v1/admin/hcp/', {'expand': 'unknown'}, **headers).status_code, 400)
+
+    def test_async_views_should_return_same_errors_as_sync_views(self):
+        headers = {'HTTP_AUTHORIZATION': f'Token {self.token.key}'}
+        for url in ['/api/v1/hcp/999999/', '/api/v1/hco/999999/address/', '/api/v1/hcp/999999/affiliation/', f'/api/v1/hcp/{self.hcp.id}/address/999999/']:
+            self.assertEqual(self.assertSameResponse(url, **headers).status_code, 404)
+        self.assertEqual(self.assertSameResponse('/api/v1/admin/hcp/', {'count': 'all'}, **headers).status_code, 400)
+        self.assertEqual(self.assertSameResponse('/api/v1/admin/hcp/', {'cursor': 'invalid'}, **headers).status_code, 404)
+        self.assertEqual(self.assertSameResponse('/api/v1/hcp/', {'ids': 'a,b'}, **headers).status_code, 400)
+        self.assertEqual(self.assertSameResponse('/api/v1/admin/hcp/').status_code, 403)
+        self.assertEqual(self.assertSameResponse('/api/v1/admin/hcp/', HTTP_AUTHORIZATION='Token invalid').status_code, 403)
+        self.assertEqual(self.assertSameResponse('/api/v1/admin/hcp/', HTTP_AUTHORIZATION='Token').status_code, 403)
+
+    def test_async_views_should_answer_other_methods_as_sync_views(self):
+        authorization = f'Token {self.token.key}'
+        for url, _ in self.get_urls():
+            for method, headers in [('options', {'Authorization': authorization}), ('options', {}), ('post', {'Authorization': authorization})]:
+                with self.subTest(url=url, method=method, headers=headers):
+                    expected = getattr(self.client, method)(url, **{f'HTTP_{name.upper()}': value for name, value in headers.items()})
+                    with self.settings(ROOT_URLCONF='data.tests'):
+                        response = async_to_sync(getattr(self.async_client, method))(url, headers=headers)
+                    self.assertEqual(response.status_code, expected.status_code)
+                    self.assertEqual(response.json(), expected.json())
+                    self.assertEqual(set(response['Allow'].split(', ')), set(expected['Allow'].split(', ')))
+        self.assertEqual(expected.status_code, 405)
+
+    def test_async_views_should_accept_session_authentication(self):
+        self.async_client.force_login(self.user)
+        response = self.get_async(f'/api/v1/hcp/{self.hcp.id}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['name'], 'hcp')
+
+    def test_async_views_should_support_conditional_requests(self):
+        headers = {'HTTP_AUTHORIZATION': f'Token {self.token.key}'}
+        etag = self.get_async(f'/api/v1/hcp/{self.hcp.id}/', **headers)['ETag']
+        self.assertEqual(self.get_async(f'/api/v1/hcp/{self.hcp.id}/', HTTP_IF_NONE_MATCH=etag, **headers).status_code, 304)
+
+    @override_settings(DATA_REPLICAS=['default'], DATA_SIGNED_TOKENS=True)
+    def test_async_views_should_not_use_the_cache_on_the_event_loop(self):
+        # the file based cache blocks on file I/O
+        reset_auth_cache()
+        cache, on_loop = get_cache(), []
+
+        def check(method):
+            def wrapper(*args, **kwargs):
+                try:
+                    asyncio.get_running_loop()
+                    on_loop.append(method.__name__)
+                except RuntimeError:
+                    pass
+                return method(*args, **kwargs)
+            return wrapper
+
+        methods = {name: check(getattr(cache, name)) for name in ('get', 'get_many', 'set', 'set_many', 'add')}
+        signed_token = create_signed_token(self.user)
+        with mock.patch.multiple(cache, **methods):
+            for url, params in self.get_urls():
+                for count in ('exact', 'estimate'):
+                    self.assertEqual(self.get_async(url, {**params, 'count': count}, HTTP_AUTHORIZATION=f'Token {self.token.key}').status_code, 200)
+            self.assertEqual(self.get_async(f'/api/v1/hcp/{self.hcp.id}/', HTTP_AUTHORIZATION=f'Bearer {signed_token}').status_code, 200)
+            self.async_client.force_login(self.user)
+            self.assertEqual(self.get_async('/api/v1/admin/hcp/').status_code, 200)
+        self.assertEqual(on_loop, [])
+
+
+@override_settings(DATA_RESPONSE_CACHE=False)
+class MetricsCase(DataTestCase):
+    def setUp(self):
+        reset_auth_cache()
+        reset_stats()
+        get_registry().clear()
+        self.user = User.objects.create_user('user', 'user@gmail.com', 'pwd')
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        HealthCareProvider.objects.create(name='hcp', status='A')
+
+    def get_samples(self):
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        return dict(line.rsplit(' ', 1) for line in response.content.decode().splitlines() if not line.startswith('#'))
+
+    def test_requests_should_be_counted_per_url_name(self):
+        self.client.get('/api/v1/admin/hcp/')
+        self.client.get('/api/v1/admin/hcp/')
+        self.client.get('/api/v1/hcp/0/')
+        self.client.get('/unknown/')
+        samples = self.get_samples()
+
+        self.assertEqual(samples['data_requests_total{view="get_all_providers",status="200"}'], '2')
+        self.assertEqual(samples['data_requests_total{view="get_healthcare_provider_by_id",status="404"}'], '1')
+        self.assertEqual(samples['data_requests_total{view="unmatched",status="404"}'], '1')
+        self.assertEqual(samples['data_request_duration_seconds_count{view="get_all_providers"}'], '2')
+        self.assertEqual(samples['data_request_duration_seconds_bucket{view="get_all_providers",le="+Inf"}'], '2')
+        # no SQL metrics by default, nor a wrapper on the queries
+        self.assertNotIn('data_db_queries_total{view="get_all_providers"}', samples)
+        self.assertNotIn(count_query, connection.execute_wrappers)
+
+    @override_settings(DATA_METRICS_SQL=True)
+    def test_queries_should_be_counted_with_sql_metrics(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get('/api/v1/admin/hcp/')
+            self.client.get('/api/v1/admin/hcp/')
+        # the queries log is reset by the next requests
+        query_count = len(queries)
+        samples = self.get_samples()
+        self.assertEqual(samples['data_db_queries_total{view="get_all_providers"}'], str(query_count))
+        self.assertGreater(float(samples['data_db_query_seconds_total{view="get_all_providers"}']), 0)
+        connection.execute_wrappers.remove(count_query)
+
+    def test_cache_lookups_should_be_counted(self):
+        with self.settings(DATA_RESPONSE_CACHE=True):
+            self.client.get('/api/v1/admin/hcp/')
+            self.client.get('/api/v1/admin/hcp/')
+            self.client.get('/api/v1/admin/hcp/')
+        samples = self.get_samples()
+        self.assertEqual(samples['data_cache_requests_total{result="hit"}'], '2')
+        self.assertEqual(samples['data_cache_requests_total{result="miss"}'], '1')
+        self.assertAlmostEqual(float(samples['data_cache_hit_ratio']), 2 / 3)
+
+    def test_metrics_should_require_authentication(self):
+        self.assertEqual(APIClient().get('/metrics').status_code, 403)
+
+    def test_histogram_buckets_should_be_cumulative(self):
+        registry = get_registry()
+        for duration in [0.001, 0.005, 0.007, 0.3, 60]:
+            registry.observe('view', 200, duration)
+        buckets = render_metrics(registry.snapshot())
+        self.assertIn('data_request_duration_seconds_bucket{view="view",le="0.005"} 2', buckets)
+        self.assertIn('data_request_duration_seconds_bucket{view="view",le="0.01"} 3', buckets)
+        self.assertIn('data_request_duration_seconds_bucket{view="view",le="0.5"} 4', buckets)
+        self.assertIn('data_request_duration_seconds_bucket{view="view",le="10.0"} 4', buckets)
+        self.assertIn('data_request_duration_seconds_bucket{view="view",le="+Inf"} 5', buckets)
+
+    def test_threads_should_not_lose_observations(self):
+        registry = get_registry()
+
+        def observe():
+            for _ in range(1000):
+                registry.observe('view', 200, 0.01, 2, 0.001)
+
+        threads = [threading.Thread(target=observe) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        snapshot = registry.snapshot()
+        self.assertEqual(snapshot['statuses']['view 200'], 8000)
+        self.assertEqual(sum(snapshot['views']['view']['buckets']), 8000)
+        self.assertEqual(snapshot['views']['view']['queries'], 16000)
+
+    def test_processes_should_be_aggregated(self):
+        with tempfile.TemporaryDirectory() as directory, self.settings(DATA_METRICS_DIR=directory):
+            other = new_view_counters()
+            other['buckets'][0], other['sum'], other['queries'] = 3, 0.003, 6
+            write_snapshot(directory, 1, {'views': {'get_all_providers': other}, 'statuses': {'get_all_providers 200': 3}, 'cache': {'hit': 0, 'miss': 3, 'not_modified': 0}})
+            self.client.get('/api/v1/admin/hcp/')
+            samples = self.get_samples()
+            self.assertEqual(samples['data_requests_total{view="get_all_providers",status="200"}'], '4')
+            self.assertEqual(samples['data_request_duration_seconds_count{view="get_all_providers"}'], '4')
+            # the scraping process wrote its counters for the others
+            self.assertIn(f'{os.getpid()}.json', os.listdir(directory))
+
+
+@override_settings(DATA_RESPONSE_CACHE=False)
+class ServerTimingCase(DataTestCase):
+    def setUp(self):
+        reset_auth_cache()
+        self.user = User.objects.create_user('user', 'user@gmail.com', 'pwd')
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        self.hco = HealthCareOrganization.objects.create(name='hco', status='A')
+        for index in range(3):
+            hcp = HealthCareProvider.objects.create(name=f'hcp{index}', status='A')
+            Affiliation.create(parent_hco_link=self.hco, child_hcp_link=hcp, status='A', type='HCO_HCP')
+
+    def get_timings(self, response):
+        # {name: (duration, description)}
+        timings = {}
+        for entry in response['Server-Timing'].split(', '):
+            name, *params = entry.split(';')
+            params = dict(param.split('=', 1) for param in params)
+            timings[name] = (float(params['dur']), params.get('desc'))
+        return timings
+
+    def test_header_should_only_be_sent_when_sampled(self):
+        self.assertNotIn('Server-Timing', self.client.get('/api/v1/admin/hcp/'))
+        with self.settings(DATA_SERVER_TIMING_SAMPLE_RATE=0.5):
+            with mock.patch('data.timing.random.random', return_value=0.7):
+                self.assertNotIn('Server-Timing', self.client.get('/api/v1/admin/hcp/'))
+            with mock.patch('data.timing.random.random', return_value=0.2):
+                self.assertIn('Server-Timing', self.client.get('/api/v1/admin/hcp/'))
+
+    @override_settings(DATA_SERVER_TIMING_SAMPLE_RATE=1)
+    def test_header_should_break_down_request(self):
+        url = f'/api/v1/hco/{self.hco.id}/affiliation/'
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        timings = self.get_timings(response)
+        self.assertEqual(list(timings), ['auth', 'cache', 'serialize', 'render', 'db', 'total'])
+        self.assertEqual(timings['db'][1], f'"{len(queries)} queries"')
+        self.assertLessEqual(sum(timings[stage][0] for stage in ['auth', 'serialize', 'render']), timings['total'][0])
+
+        # cached credentials: no query for the authentication
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(self.get_timings(response)['db'][1], f'"{len(queries)} queries"')
+
+    @override_settings(DATA_SERVER_TIMING_SAMPLE_RATE=1)
+    def test_async_views_should_be_timed(self):
+        async def view(request):
+            return await async_views.get_healthcare_organization_by_id(request, organization_id=self.hco.id)
+
+        request = APIRequestFactory().get(f'/api/v1/hco/{self.hco.id}/', HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        response = async_to_sync(server_timing_middleware(view))(request)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('auth;dur=', response['Server-Timing'])
+        self.assertIn('serialize;dur=', response['Server-Timing'])
+
+    def test_nested_stages_should_be_timed_once(self):
+        @timed('serialize')
+        def serialize(depth):
+            time.sleep(0.01)
+            return serialize(depth - 1) if depth else None
+
+        serialize(3)
+        timings = Timings()
+        token = timing._timings.set(timings)
+        try:
+            serialize(3)
+        finally:
+            timing._timings.reset(token)
+        self.assertGreaterEqual(timings.durations['serialize'], 0.04)
+        self.assertLess(timings.durations['serialize'], 0.08)
+        self.assertEqual(timings.depths['serialize'], 0)
+
+
+@override_settings(DATA_RESPONSE_CACHE=False)
+class AuthenticationCase(DataTestCase):
+    def setUp(self):
+        reset_auth_cache()
+        self.user = User.objects.create_user('user', 'user@gmail.com', 'pwd')
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def get_auth_queries(self, url='/api/v1/admin/hcp/', client=None):
+        # (status code, queries on the credentials tables)
+        with CaptureQueriesContext(connection) as queries:
+            response = (client or self.client).get(url)
+        tables = ('authtoken_token', 'auth_user', 'django_session')
+        return response.status_code, [query['sql'] for query in queries if any(table in query['sql'] for table in tables)]
+
+    def test_token_should_be_resolved_once(self):
+        status, queries = self.get_auth_queries()
+        self.assertEqual((status, len(queries)), (200, 1))
+        self.assertEqual(self.get_auth_queries(), (200, []))
+        self.assertEqual(self.get_auth_queries(f'/api/v1/hcp/{HealthCareProvider.objects.create(name="hcp", status="A").id}/'), (200, []))
+        with self.settings(DATA_AUTH_CACHE=False):
+            self.assertEqual(len(self.get_auth_queries()[1]), 1)
+
+    def test_token_deletion_and_user_changes_should_invalidate(self):
+        self.assertEqual(self.get_auth_queries()[0], 200)
+        self.user.is_active = False
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.save()
+        self.assertEqual(self.get_auth_queries()[0], 403)
+
+        self.user.is_active = True
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.save()
+        self.assertEqual(self.get_auth_queries()[0], 200)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.token.delete()
+        self.assertEqual(self.get_auth_queries()[0], 403)
+
+    def test_changes_should_only_invalidate_their_user(self):
+        other = APIClient()
+        other.credentials(HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=User.objects.create_user("other", "other@gmail.com", "pwd")).key}')
+        for client in [self.client, other]:
+            self.assertEqual(len(self.get_auth_queries(client=client)[1]), 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.token.delete()
+        self.assertEqual(self.get_auth_queries(client=other), (200, []))
+        self.assertEqual(self.get_auth_queries()[0], 403)
+
+    def test_session_should_be_resolved_once(self):
+        client = APIClient()
+        client.login(username='user', password='pwd')
+        status, queries = self.get_auth_queries(client=client)
+        self.assertEqual(status, 200)
+        self.assertTrue(queries)
+        self.assertEqual(self.get_auth_queries(client=client), (200, []))
+        with self.captureOnCommitCallbacks(execute=True):
+            client.logout()
+        self.assertEqual(self.get_auth_queries(client=client)[0], 403)
+
+    @override_settings(DATA_AUTH_CACHE_MAX_ENTRIES=1)
+    def test_cache_should_be_bounded(self):
+        other = APIClient()
+        other.credentials(HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=User.objects.create_user("other", "other@gmail.com", "pwd")).key}')
+        for client in [self.client, other, self.client]:
+            status, queries = self.get_auth_queries(client=client)
+            self.assertEqual((status, len(queries)), (200, 1))
+
+    def test_async_authentication_should_use_cache(self):
+        request = APIRequestFactory().get('/api/v1/admin/hcp/', HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(async_to_sync(aauthenticate)(request), self.user)
+            self.assertEqual(async_to_sync(aauthenticate)(request), self.user)
+        self.assertEqual(len([query for query in queries if 'authtoken_token' in query['sql']]), 1)
+
+    def test_obtain_auth_token_should_issue_tokens(self):
+        response = APIClient().post('/api/v1/auth/', {'username': 'user', 'password': 'pwd'}, format='json')
+        self.assertEqual(response.data, {'token': self.token.key})
+
+    def test_signed_tokens_should_need_no_query(self):
+        self.assertEqual(APIClient().post('/api/v1/auth/signed/', {'username': 'user', 'password': 'pwd'}, format='json').status_code, 404)
+        with self.settings(DATA_SIGNED_TOKENS=True):
+            self.assertEqual(APIClient().post('/api/v1/auth/signed/', {'username': 'user', 'password': 'bad'}, format='json').status_code, 400)
+            response = APIClient().post('/api/v1/auth/signed/', {'username': 'user', 'password': 'pwd'}, format='json')
+            self.assertEqual(response.data['expires_in'], 3600)
+            client = APIClient()
+            client.credentials(HTTP_AUTHORIZATION=f'Bearer {response.data["token"]}')
+            self.assertEqual(self.get_auth_queries(client=client), (200, []))
+            self.assertEqual(self.assertAsyncStatus(client, response.data['token']), 200)
+
+            tampered = APIClient()
+            tampered.credentials(HTTP_AUTHORIZATION=f'Bearer {response.data["token"][:-1]}x')
+            self.assertEqual(self.get_auth_queries(client=tampered)[0], 403)
+            with self.settings(DATA_SIGNED_TOKEN_MAX_AGE=-1):
+                self.assertEqual(self.get_auth_queries(client=client)[0], 403)
+
+            # a user change revokes the tokens issued before it
+            self.user.set_password('new')
+            with self.captureOnCommitCallbacks(execute=True):
+                self.user.save()
+            self.assertEqual(self.get_auth_queries(client=client)[0], 403)
+            self.assertEqual(self.assertAsyncStatus(client, response.data['token']), 403)
+        self.assertEqual(self.get_auth_queries(client=client)[0], 403)
+
+    def assertAsyncStatus(self, client, token):
+        request = APIRequestFactory().get('/api/v1/admin/hcp/', HTTP_AUTHORIZATION=f'Bearer {token}')
+        return async_to_sync(async_views.get_all_providers)(request).status_code
+
+
+class SyntheticDataCase(DataTestCase):
+    def test_datasets_should_be_reproducible(self):
+        first, second = generate_dataset(20, 50, 3, seed=1), generate_dataset(20, 50, 3, seed=1)
+        for entity in first:
+            self.assertEqual(list(first[entity]), list(second[entity]))
+        self.assertNotEqual(list(generate_dataset(20, 50, 3, seed=2)['hcp']), list(generate_dataset(20, 50, 3, seed=1)['hcp']))
+
+    def test_affiliations_should_be_unique_and_heavy_tailed(self):
+        organizations, providers = 200, 2000
+        affiliations = list(generate_dataset(organizations, providers, 3)['affiliation'])
+        counts = {'HCO': organizations, 'HCP': providers}
+
+        keys = [(row['type'], row['parent_link'], row['child_link']) for row in affiliations]
+        self.assertEqual(len(keys), len(set(keys)))
+        for type, parent, child in keys:
+            self.assertTrue(1 <= parent <= counts[type[:3]] and 1 <= child <= counts[type[4:]])
+            self.assertFalse(type[:3] == type[4:] and parent == child)
+        self.assertAlmostEqual(len(affiliations) / (organizations + providers), 3, delta=0.5)
+
+        providers_per_organization = Counter(row['child_link'] for row in affiliations if row['type'] == 'HCP_HCO')
+        mean = sum(providers_per_organization.values()) / organizations
+        self.assertGreater(max(providers_per_organization.values()), 10 * mean)
+
+    def test_distinct_names_should_grow_with_scale(self):
+        distinct = {count: len({row['name'] for row in generate_dataset(0, count)['hcp']}) for count in (1000, 10000)}
+        # more than the first x last name pairs (30 x 30) and still growing
+        self.assertGreater(distinct[10000], 900 * 5)
+        self.assertGreater(distinct[10000], 5 * distinct[1000])
+
+    def test_generated_files_should_be_ingested(self):
+        for file_format in ['ndjson', 'csv']:
+            with self.subTest(file_format=file_format), tempfile.TemporaryDirectory() as directory:
+                filenames, rows = write_dataset(directory, 10, 30, 2, file_format=file_format)
+                processor = BulkDataProcessor()
+                processor.save_entities(processor.read_data_files(filenames))
+
+                self.assertEqual(HealthCareOrganization.objects.count(), 10)
+                self.assertEqual(HealthCareProvider.objects.count(), 30)
+                self.assertEqual(Address.objects.count(), rows['address'])
+                self.assertEqual(Affiliation.objects.count(), rows['affiliation'])
+                self.assertEqual(HealthCareProvider.objects.filter(addresses__isnull=False).count(), 30)
+                Affiliation.objects.all().delete()
+                Address.objects.all().delete()
+                HealthCareProvider.objects.all().delete()
+                HealthCareOrganization.objects.all().delete()
+
+    @override_settings(DATA_RESPONSE_CACHE=False)
+    def test_benchmark_api_should_request_every_endpoint(self):
+        call_command('generate_data', providers=60, organizations=20, degree=3, stdout=io.StringIO())
+        user = User.objects.create_user('user', 'user@gmail.com', 'pwd')
+        client = APIClient()
+        client.force_authenticate(user)
+
+        endpoints = benchmark_api.Command.get_endpoint_paths(3, random.Random(0))
+        self.assertEqual(list(endpoints), [pattern.name for pattern in data_urls.urlpatterns])
+        for name, paths in endpoints.items():
+            for path in paths:
+                with self.subTest(endpoint=name, path=path):
+                    response = client.get(path)
+                    if response.streaming:
+                        b''.join(response.streaming_content)
+                    self.assertEqual(response.status_code, 200)
+
+
+@skipUnless(connection.vendor == 'postgresql' and pool_backend.ConnectionPool is not None and is_psycopg3, 'psycopg 3 pool on PostgreSQL')
+class PostgreSQLConnectionCase(DataTestCase):
+    def get_wrapper(self, **options):
+        # pooled connections of another alias, outside of the test transaction
+        settings_dict = {**connection.settings_dict, 'CONN_MAX_AGE': 0, 'CONN_HEALTH_CHECKS': True}
+        settings_dict['OPTIONS'] = {**settings_dict['OPTIONS'], 'pool': {'min_size': 1, 'max_size': 1, 'timeout': 5}, **options}
+        wrapper = pool_backend.DatabaseWrapper(settings_dict, alias='pool_test')
+        self.addCleanup(wrapper.close_pool)
+        self.addCleanup(wrapper.close)
+        return wrapper
+
+    def get_backend_pid(self, wrapper):
+        with wrapper.cursor() as cursor:
+            cursor.execute('SELECT pg_backend_pid()')
+            return cursor.fetchone()[0]
+
+    def test_closed_connections_should_be_reused(self):
+        wrapper = self.get_wrapper()
+        pid = self.get_backend_pid(wrapper)
+        wrapper.close()
+        self.assertIsNone(wrapper.connection)
+        self.assertEqual(self.get_backend_pid(wrapper), pid)
+
+    def test_broken_connections_should_be_replaced(self):
+        wrapper = self.get_wrapper()
+        pid = self.get_backend_pid(wrapper)
+        wrapper.close()
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_terminate_backend(%s)', [pid])
+        time.sleep(0.2)
+        self.assertNotEqual(self.get_backend_pid(wrapper), pid)
+
+    def test_repeated_queries_should_be_prepared(self):
+        wrapper = self.get_wrapper(server_side_binding=True, prepare_threshold=2)
+        for id in range(3):
+            with wrapper.cursor() as cursor:
+                cursor.execute('SELECT id, name FROM hcp WHERE id = %s', [id])
+        with wrapper.cursor() as cursor:
+            cursor.execute("SELECT count(*) FROM pg_prepared_statements WHERE statement LIKE 'SELECT id, name FROM hcp%%'")
+            self.assertEqual(cursor.fetchone()[0], 1)
+
+    def test_pool_should_require_conn_max_age_zero(self):
+        wrapper = self.get_wrapper()
+        wrapper.settings_dict['CONN_MAX_AGE'] = 60
+        with self.assertRaises(ImproperlyConfigured):
+            wrapper.ensure_connection()
+
+    def test_copy_should_load_rows(self):
+        processor = BulkDataProcessor(use_copy=True)
+        ids = processor.insert_rows(HealthCareProvider, [{'name': 'hcp1', 'status': 'A'}, {'name': 'hcp2', 'status': 'I'}], returning=True)
+        self.assertEqual(list(HealthCareProvider.objects.filter(id__in=ids).values_list('name', 'status')), [('hcp1', 'A'), ('hcp2', 'I')])
+
+
+REPLICA = 'replica'
+
+
+@override_settings(DATA_REPLICAS=[REPLICA], DATA_RESPONSE_CACHE=False)
+class ReplicaRoutingCase(DataTestCase):
+    # a second database of the same vendor as the default one stands for the replica, its rows
+    # differ from the primary's so the responses tell which database was read. Created by the test
+    # case, the test runner only sets up the databases of the settings
+    @classmethod
+    def setUpClass(cls):
+        cls.databases = {'default', REPLICA}
+        settings_dict = {**connection.settings_dict}
+        if connection.vendor == 'postgresql':
+            settings_dict['NAME'] = f"{connection.settings_dict['NAME']}_replica"
+            with connection.cursor() as cursor:
+                cursor.execute(f'DROP DATABASE IF EXISTS {settings_dict["NAME"]}')
+                cursor.execute(f'CREATE DATABASE {settings_dict["NAME"]}')
+        else:
+            cls.replica_dir = tempfile.TemporaryDirectory()
+            settings_dict['NAME'] = os.path.join(cls.replica_dir.name, 'replica.sqlite3')
+        connections.settings[REPLICA] = settings_dict
+        with connections[REPLICA].schema_editor() as editor:
+            for model in (Address, HealthCareProvider, HealthCareOrganization, Affiliation):
+                editor.create_model(model)
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections[REPLICA].close()
+        if hasattr(connections[REPLICA], 'close_pool'):
+            # pooled connections (DB_POOL)
+            connections[REPLICA].close_pool()
+        del connections[REPLICA]
+        name = connections.settings.pop(REPLICA)['NAME']
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute(f'DROP DATABASE IF EXISTS {name}')
+        else:
+            cls.replica_dir.cleanup()
+
+    def setUp(self):
+        reset_lags()
+        reset_stats()
+        self.user = User.objects.create_user('user', 'user@gmail.com', 'pwd')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.hcp = HealthCareProvider.objects.create(name='primary', status='A')
+        HealthCareProvider.objects.using(REPLICA).create(id=self.hcp.id, name='replica', status='A')
+
+    def get_name(self, client=None):
+        response = (client or self.client).get(f'/api/v1/hcp/{self.hcp.id}/')
+        self.assertEqual(response.status_code, 200)
+        return response.json()['name']
+
+    def test_get_views_should_read_from_replicas(self):
+        self.assertEqual(self.get_name(), 'replica')
+        self.assertEqual(self.client.get('/api/v1/admin/hcp/').json()['results'][0]['name'], 'replica')
+        self.assertEqual(self.client.get('/api/v1/hcp/search/', {'q': 'replica'}).json()['results'][0]['id'], self.hcp.id)
+        with override_settings(DATA_REPLICAS=[]):
+            self.assertEqual(self.get_name(), 'primary')
+
+    def test_lagging_replicas_should_be_skipped(self):
+        with mock.patch('data.routers.get_replica_lag', return_value=60.0):
+            self.assertEqual(self.get_name(), 'primary')
+        # checked again after the interval
+        with override_settings(DATA_REPLICA_LAG_CHECK_INTERVAL=0), mock.patch('data.routers.get_replica_lag', return_value=0.5):
+            self.assertEqual(self.get_name(), 'replica')
+
+    def test_replicas_should_be_load_balanced(self):
+        lags = {'replica1': 0.0, 'replica2': 0.0}
+        with override_settings(DATA_REPLICAS=list(lags)), mock.patch('data.routers.get_replica_lag', side_effect=lags.get):
+            self.assertEqual({choose_replica() for _ in range(4)}, {'replica1', 'replica2'})
+            lags['replica2'] = 60.0
+            reset_lags()
+            self.assertEqual({choose_replica() for _ in range(4)}, {'replica1'})
+            lags['replica1'] = float('inf')
+            reset_lags()
+            self.assertIsNone(choose_replica())
+
+    def test_user_should_read_from_primary_after_a_write(self):
+        def view(request):
+            HealthCareProvider.objects.filter(id=self.hcp.id).update(name='primary')
+            # reads of the request after its write
+            return HttpResponse(HealthCareProvider.objects.get(id=self.hcp.id).name)
+
+        request = RequestFactory().post('/admin/data/healthcareprovider/')
+        request.user = self.user
+        self.assertEqual(replica_routing_middleware(view)(request).content, b'primary')
+        self.assertEqual(self.get_name(), 'primary')
+        other = APIClient()
+        other.force_authenticate(user=User.objects.create_user('other', 'other@gmail.com', 'pwd'))
+        self.assertEqual(self.get_name(other), 'replica')
+        with override_settings(DATA_REPLICA_PRIMARY_WINDOW=0.1):
+            replica_routing_middleware(view)(request)
+            time.sleep(0.2)
+            self.assertEqual(self.get_name(), 'replica')
+
+    def test_writes_admin_and_commands_should_use_primary(self):
+        self.assertEqual(HealthCareProvider.objects.db, 'default')
+        self.assertEqual(router.db_for_write(HealthCareProvider), 'default')
+        admin_user = User.objects.create_superuser('admin', 'admin@gmail.com', 'pwd')
+        self.client.force_login(admin_user)
+        response = self.client.get(reverse('admin:data_healthcareprovider_changelist'))
+        self.assertContains(response, 'primary')
+        self.assertNotContains(response, 'replica')
+
+    @override_settings(DATA_RESPONSE_CACHE=True)
+    def test_replica_reads_of_recent_writes_should_not_be_cached(self):
+        # the versions of the provider were just created, the replica may not have its last writes
+        response = self.client.get(f'/api/v1/hcp/{self.hcp.id}/')
+        self.assertNotIn('ETag', response)
+        self.client.get(f'/api/v1/hcp/{self.hcp.id}/')
+        self.assertEqual(get_stats()['hits'], 0)
+        with override_settings(DATA_REPLICA_MAX_LAG=0, DATA_REPLICA_LAG_CHECK_INTERVAL=0):
+            self.assertIn('ETag', self.client.get(f'/api/v1/hcp/{self.hcp.id}/'))
+            self.client.get(f'/api/v1/hcp/{self.hcp.id}/')
+            self.assertEqual(get_stats()['hits'], 1)
+
+
+@override_settings(DATA_RESPONSE_CACHE=False)
+class QueryBudgetCase(DataTestCase):
+    # max SQL queries per endpoint in data/urls.py (uncached), whatever the page size.
+    # every endpoint must have a budget, new endpoints fail this test until one is added
+    QUERY_BUDGETS = {
+        'get_all_providers': 2,
+        'get_all_organizations': 2,
+        'get_all_addresses': 2,
+        'get_all_affiliations': 2,
+        'get_healthcare_organization_by_id': 1,
+        'get_healthcare_addresses_by_organization_by_id': 3,
+        'get_healthcare_organization_address_by_id': 1,
+        'get_healthcare_organization_affiliations': 3,
+        'get_healthcare_provider_by_id': 1,
+        'get_healthcare_addresses_by_provider_by_id': 3,
+        'get_healthcare_provider_address_by_id': 1,
+        'get_healthcare_provider_affiliations': 3,
+        'get_affiliation_by_id': 1,
+        'get_cache_stats': 0,
+        'get_healthcare_provider_network': 5,
+        'get_healthcare_organization_network': 5,
+        # graph index endpoints: the entities exist, and the index is built (one query) on first use
+        'get_healthcare_provider_neighbours': 2,
+        'get_healthcare_organization_neighbours': 2,
+        'get_affiliation_path': 3,
+        'get_graph_index_stats': 0,
+        # one query, whatever the page size
+        'search_providers': 1,
+        'search_organizations': 1,
+        'get_providers_by_ids': 1,
+        'get_organizations_by_ids': 1,
+        'get_addresses_by_ids': 1,
+        'get_affiliations_by_ids': 1,
+        'export_providers': 1,
+        'export_organizations': 1,
+        'export_addresses': 1,
+        'export_affiliations': 1,
+    }
+    PAGE_SIZES = [1, 10, 100]
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('user', 'user@gmail.com', 'pwd')
+        cls.hcp = HealthCareProvider.objects.create(name='hcp', status='A')
+        cls.hco = HealthCareOrganization.objects.create(name='hco', status='A')
+        addresses = [Address.objects.create(addr1=f"Address {index}", city="City 1", status="A") for index in range(20)]
+        cls.hcp.addresses.set(addresses)
+        cls.hco.addresses.set(addresses)
+        cls.address = addresses[0]
+        for index in range(20):
+            hcp = HealthCareProvider.objects.create(name=f'hcp{index}', status='A')
+            hco = HealthCareOrganization.objects.create(name=f'hco{index}', status='A')
+            cls.affiliation = Affiliation.create(parent_hcp_link=cls.hcp, child_hco_link=hco, status='A', type='HCP_HCO')
+            Affiliation.create(parent_hco_link=cls.hco, child_hcp_link=hcp, status='A', type='HCO_HCP')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def get_url_kwargs(self, pattern):
+        ids = {
+            'provider_id': self.hcp.id,
+            'organization_id': self.hco.id,
+            'address_id': self.address.id,
+            'affiliation_id': self.affiliation.id,
+        }
+        return {name: ids[name] for name in pattern.pattern.converters}
+
+    def get_params(self, pattern):
+        # the multi-get endpoints resolve many rows with the same query
+        model = MULTI_GET_MODELS.get(pattern.name)
+        if model:
+            return {'ids': ','.join(str(id) for id in model.objects.values_list('id', flat=True)[:50])}
+        if pattern.name == 'get_affiliation_path':
+            return {'source': f'HCP:{self.hcp.id}', 'target': f'HCO:{self.hco.id}'}
+        if pattern.name in ('search_providers', 'search_organizations'):
+            return {'q': 'hc1'}
+        return {}
+
+    def test_expanded_endpoints_should_stay_within_query_budget(self):
+        # one query per prefetched relation, linked entities joined to the affiliations
+        budgets = {'get_all_providers': 5, 'get_all_organizations': 5, 'get_healthcare_provider_by_id': 4, 'get_healthcare_organization_by_id': 4}
+        for pattern in data_urls.urlpatterns:
+            if pattern.name not in budgets:
+                continue
+            url = reverse(pattern.name, kwargs=self.get_url_kwargs(pattern))
+            for limit in self.PAGE_SIZES:
+                with self.subTest(endpoint=pattern.name, limit=limit):
+                    with CaptureQueriesContext(connection) as queries:
+                        response = self.client.get(url, {'limit': limit, 'expand': 'addresses,affiliations.parent,affiliations.child'})
+                    self.assertEqual(response.status_code, 200)
+                    self.assertLessEqual(len(queries), budgets[pattern.name], [query['sql'] for query in queries])
+
+    def test_endpoints_should_stay_within_query_budget(self):
+        for pattern in data_urls.urlpatterns:
+            self.assertIn(pattern.name, self.QUERY_BUDGETS, f'missing query budget for {pattern.name}')
+            url = reverse(pattern.name, kwargs=self.get_url_kwargs(pattern))
+            params = self.get_params(pattern)
+            for limit in self.PAGE_SIZES:
+                with self.subTest(endpoint=pattern.name, limit=limit):
+                    with CaptureQueriesContext(connection) as queries:
+                        response = self.client.get(url, {'limit': limit, **params})
+                        if response.streaming:
+                            b''.join(response.streaming_content)
+                    self.assertEqual(response.status_code, 200)
+                    self.assertLessEqual(len(queries), self.QUERY_BUDGETS[pattern.name], [query['sql'] for query in queries])
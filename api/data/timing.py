@@ -0,0 +1,161 @@
+import random
+import time
+from contextvars import ContextVar
+from functools import wraps
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.utils.decorators import sync_and_async_middleware
+
+# doc: https://developer.mozilla.org/en-US/docs/Web/HTTP/Headers/Server-Timing
+# doc: https://docs.djangoproject.com/en/4.2/topics/db/instrumentation/
+# per-request breakdown of the time spent in the stages of the data endpoints, sent in a
+# Server-Timing header (browser devtools show it), for DATA_SERVER_TIMING_SAMPLE_RATE of the requests:
+# - auth: authentication classes (authentication.py)
+# - cache: response cache lookups and stores (cache.py)
+# - db: SQL queries (execute wrapper, desc is the number of queries), overlaps the other stages
+# - serialize: field plans (plans.py, expand.py)
+# - render: JSON encoding (renderers.py)
+# - total: the whole request, from the outermost middleware
+# A request that is not sampled only costs a context variable lookup per hook (benchmark_timing).
+# Streamed responses (exports) are timed until their first byte
+
+STAGES = ('auth', 'cache', 'db', 'serialize', 'render')
+
+_timings = ContextVar('data_timings', default=None)
+
+
+class Timings:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.durations = {}
+        # nested calls of a stage (e.g. an expanded plan serializing its rows) are timed once
+        self.depths = dict.fromkeys(STAGES, 0)
+        self.queries = 0
+        self.query_time = 0.0
+
+    def enter(self, stage):
+        self.depths[stage] += 1
+        return self.depths[stage] == 1
+
+    def exit(self, stage, duration):
+        self.depths[stage] -= 1
+        if not self.depths[stage]:
+            self.durations[stage] = self.durations.get(stage, 0.0) + duration
+
+    def add_query(self, duration):
+        self.queries += 1
+        self.query_time += duration
+
+    def get_header(self):
+        entries = [f'{stage};dur={self.durations[stage] * 1000:.2f}' for stage in STAGES if stage in self.durations]
+        entries.append(f'db;dur={self.query_time * 1000:.2f};desc="{self.queries} queries"')
+        entries.append(f'total;dur={(time.perf_counter() - self.started) * 1000:.2f}')
+        return ', '.join(entries)
+
+
+def get_sample_rate():
+    return getattr(settings, 'DATA_SERVER_TIMING_SAMPLE_RATE', 0.0)
+
+
+def get_timings():
+    # timings of the current request, None when it is not sampled
+    return _timings.get()
+
+
+def timed(stage):
+    # decorator of the functions of a stage, sync or async
+    def decorator(function):
+        if iscoroutinefunction(function):
+            @wraps(function)
+            async def async_wrapper(*args, **kwargs):
+                timings = _timings.get()
+                if timings is None:
+                    return await function(*args, **kwargs)
+                outermost = timings.enter(stage)
+                start = time.perf_counter()
+                try:
+                    return await function(*args, **kwargs)
+                finally:
+                    timings.exit(stage, time.perf_counter() - start if outermost else 0.0)
+            return async_wrapper
+
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            timings = _timings.get()
+            if timings is None:
+                return function(*args, **kwargs)
+            outermost = timings.enter(stage)
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                timings.exit(stage, time.perf_counter() - start if outermost else 0.0)
+        return wrapper
+    return decorator
+
+
+def time_query(execute, sql, params, many, context):
+    timings = _timings.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timings.add_query(time.perf_counter() - start)
+
+
+def install_query_timer(connection):
+    if time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(time_query)
+
+
+@receiver(connection_created)
+def handle_connection_created(sender, connection, **kwargs):
+    # only when timing is enabled, no wrapper on the queries otherwise
+    if get_sample_rate():
+        install_query_timer(connection)
+
+
+def start_timings():
+    rate = get_sample_rate()
+    if not rate or (rate < 1 and random.random() >= rate):
+        return None
+    # connections opened before timing was enabled (connection_created)
+    for connection in connections.all(initialized_only=True):
+        install_query_timer(connection)
+    return Timings()
+
+
+@sync_and_async_middleware
+def server_timing_middleware(get_response):
+    # first of MIDDLEWARE, so `total` covers the whole request
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            timings = start_timings()
+            if timings is None:
+                return await get_response(request)
+            token = _timings.set(timings)
+            try:
+                response = await get_response(request)
+            finally:
+                _timings.reset(token)
+            response['Server-Timing'] = timings.get_header()
+            return response
+        return middleware
+
+    def middleware(request):
+        timings = start_timings()
+        if timings is None:
+            return get_response(request)
+        token = _timings.set(timings)
+        try:
+            response = get_response(request)
+        finally:
+            _timings.reset(token)
+        response['Server-Timing'] = timings.get_header()
+        return response
+    return middleware
@@ -1,18 +1,39 @@
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import async_views, views
+
+# under ASGI (api/asgi.py) the read endpoints are served by their async versions
+read_views = async_views if settings.DATA_ASYNC_VIEWS else views
 
 urlpatterns = [
-    path('admin/hcp/', views.get_all_providers, name='get_all_providers'),
-    path('admin/hco/', views.get_all_organizations, name='get_all_organizations'),
-    path('admin/address/', views.get_all_addresses, name='get_all_addresses'),
-    path('admin/affiliation/', views.get_all_affiliations, name='get_all_affiliations'),
-    path('hco/<str:organization_id>/', views.get_healthcare_organization_by_id, name='get_healthcare_organization_by_id'),
-    path('hco/<str:organization_id>/address/', views.get_healthcare_addresses_by_organization_by_id, name='get_healthcare_addresses_by_organization_by_id'),
-    path('hco/<str:organization_id>/address/<str:address_id>/', views.get_healthcare_organization_address_by_id, name='get_healthcare_organization_address_by_id'),
-    path('hco/<str:organization_id>/affiliation/', views.get_healthcare_organization_affiliations, name='get_healthcare_organization_affiliations'),
-    path('hcp/<str:provider_id>/', views.get_healthcare_provider_by_id, name='get_healthcare_provider_by_id'),
-    path('hcp/<str:provider_id>/address/', views.get_healthcare_addresses_by_provider_by_id, name='get_healthcare_addresses_by_provider_by_id'),
-    path('hcp/<str:provider_id>/address/<str:address_id>/', views.get_healthcare_provider_address_by_id, name='get_healthcare_provider_address_by_id'),
-    path('hcp/<str:provider_id>/affiliation/', views.get_healthcare_provider_affiliations, name='get_healthcare_provider_affiliations'),
-    path('affiliation/<str:affiliation_id>/', views.get_affiliation_by_id, name='get_affiliation_by_id')
+    path('admin/hcp/', read_views.get_all_providers, name='get_all_providers'),
+    path('admin/hco/', read_views.get_all_organizations, name='get_all_organizations'),
+    path('admin/address/', read_views.get_all_addresses, name='get_all_addresses'),
+    path('admin/affiliation/', read_views.get_all_affiliations, name='get_all_affiliations'),
+    path('admin/hcp/export/', views.export_providers, name='export_providers'),
+    path('admin/hco/export/', views.export_organizations, name='export_organizations'),
+    path('admin/address/export/', views.export_addresses, name='export_addresses'),
+    path('admin/affiliation/export/', views.export_affiliations, name='export_affiliations'),
+    path('admin/cache/', views.get_cache_stats, name='get_cache_stats'),
+    path('admin/graph/', views.get_graph_index_stats, name='get_graph_index_stats'),
+    path('graph/path/', read_views.get_affiliation_path, name='get_affiliation_path'),
+    path('hcp/search/', read_views.search_providers, name='search_providers'),
+    path('hco/search/', read_views.search_organizations, name='search_organizations'),
+    path('hcp/', read_views.get_providers_by_ids, name='get_providers_by_ids'),
+    path('hco/', read_views.get_organizations_by_ids, name='get_organizations_by_ids'),
+    path('address/', read_views.get_addresses_by_ids, name='get_addresses_by_ids'),
+    path('affiliation/', read_views.get_affiliations_by_ids, name='get_affiliations_by_ids'),
+    path('hco/<str:organization_id>/', read_views.get_healthcare_organization_by_id, name='get_healthcare_organization_by_id'),
+    path('hco/<str:organization_id>/address/', read_views.get_healthcare_addresses_by_organization_by_id, name='get_healthcare_addresses_by_organization_by_id'),
+    path('hco/<str:organization_id>/address/<str:address_id>/', read_views.get_healthcare_organization_address_by_id, name='get_healthcare_organization_address_by_id'),
+    path('hco/<str:organization_id>/affiliation/', read_views.get_healthcare_organization_affiliations, name='get_healthcare_organization_affiliations'),
+    path('hco/<str:organization_id>/network/', read_views.get_healthcare_organization_network, name='get_healthcare_organization_network'),
+    path('hco/<str:organization_id>/neighbours/', read_views.get_healthcare_organization_neighbours, name='get_healthcare_organization_neighbours'),
+    path('hcp/<str:provider_id>/', read_views.get_healthcare_provider_by_id, name='get_healthcare_provider_by_id'),
+    path('hcp/<str:provider_id>/address/', read_views.get_healthcare_addresses_by_provider_by_id, name='get_healthcare_addresses_by_provider_by_id'),
+    path('hcp/<str:provider_id>/address/<str:address_id>/', read_views.get_healthcare_provider_address_by_id, name='get_healthcare_provider_address_by_id'),
+    path('hcp/<str:provider_id>/affiliation/', read_views.get_healthcare_provider_affiliations, name='get_healthcare_provider_affiliations'),
+    path('hcp/<str:provider_id>/network/', read_views.get_healthcare_provider_network, name='get_healthcare_provider_network'),
+    path('hcp/<str:provider_id>/neighbours/', read_views.get_healthcare_provider_neighbours, name='get_healthcare_provider_neighbours'),
+    path('affiliation/<str:affiliation_id>/', read_views.get_affiliation_by_id, name='get_affiliation_by_id')
 ]
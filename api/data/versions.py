@@ -0,0 +1,78 @@
+import time
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+
+# version counters used to key everything derived from the data tables (cached counts,
+# cached responses), so invalidating is bumping a counter instead of finding and deleting
+# entries:
+# - per-model generations, bumped on every write to a model (list pages, counts)
+# - per-row versions, bumped when a row or anything embedded in its responses changes
+# - a global epoch, bumped to invalidate everything (e.g. after a bulk ingestion)
+# Versions are timestamps (ns): they only increase, so an evicted counter comes back with
+# a value that no existing entry was keyed with. They are kept in the DATA_CACHE_ALIAS cache,
+# which must be shared by every process (file based by default, see settings.py)
+
+EPOCH_KEY = 'epoch'
+
+
+def get_cache():
+    return caches[getattr(settings, 'DATA_CACHE_ALIAS', 'default')]
+
+
+def is_shared():
+    # a process-local backend misses the bumps of the other processes (ingest_data, other workers),
+    # what is keyed with its versions could be served stale forever
+    return not isinstance(get_cache(), LocMemCache)
+
+
+def generation_key(model):
+    return f'generation:{model._meta.label_lower}'
+
+
+def version_key(model, pk):
+    return f'version:{model._meta.label_lower}:{normalize_pk(pk)}'
+
+
+def normalize_pk(pk):
+    # URL kwargs are strings ('007' and '7' must share a version)
+    try:
+        return str(int(pk))
+    except (TypeError, ValueError):
+        return str(pk)
+
+
+def get_versions(keys):
+    cache = get_cache()
+    versions = cache.get_many(keys)
+    missing = [key for key in keys if key not in versions]
+    if missing:
+        now = time.time_ns()
+        for key in missing:
+            cache.add(key, now, None)
+        versions.update(cache.get_many(missing))
+    return [versions.get(key) for key in keys]
+
+
+def bump(keys):
+    # the new version of the keys
+    now = time.time_ns()
+    if keys:
+        get_cache().set_many({key: now for key in keys}, None)
+    return now
+
+
+def get_generation(model):
+    return get_versions([generation_key(model)])[0]
+
+
+def bump_generation(*models):
+    return bump([generation_key(model) for model in models])
+
+
+def bump_versions(model, pks):
+    bump([version_key(model, pk) for pk in pks if pk is not None])
+
+
+def invalidate_all():
+    bump([EPOCH_KEY])
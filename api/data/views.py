@@ -1,244 +1,475 @@
+from django.conf import settings
 from django.http import Http404
-from rest_framework.pagination import LimitOffsetPagination
+from .authentication import AUTHENTICATION_CLASSES, create_signed_token, get_signed_token_max_age, is_signed_tokens_enabled
+from .cache import cached_response, get_stats
+from .expand import get_expand_dependencies, get_plan
+from .export import build_export_response
+from .pagination import CountingLimitOffsetPagination, get_paginator
 from .models import Address, HealthCareProvider, HealthCareOrganization, Affiliation
-from .serializers import AddressSerializer, HealthCareProviderSerializer, HealthCareOrganizationSerializer, HealthCareOrganizationAddressesSerializer, HealthCareProviderAddressesSerializer, AffiliationSerializer
-from rest_framework.decorators import api_view, authentication_classes, permission_classes
+from .metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, collect, render_metrics
+from .renderers import MetricsRenderer
+from .locations import filter_addresses, filter_by_addresses, get_location_dependencies, get_location_filters
+from .graph import get_graph_stats, get_graph_walk, get_neighbours_data, get_node_param, get_path_data
+from .network import HCO, HCP, NODE_MODELS, get_network, get_network_params
+from .plans import ADDRESS_PLAN, AFFILIATION_PLAN, ORGANIZATION_PLAN, PROVIDER_PLAN
+from .search import get_search_data
+from rest_framework.decorators import api_view, authentication_classes, permission_classes, renderer_classes
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
-from rest_framework.authentication import SessionAuthentication, TokenAuthentication
+from rest_framework.authtoken.serializers import AuthTokenSerializer
+from rest_framework.exceptions import NotFound
 from rest_framework.permissions import IsAuthenticated
-from django.db.models import Q
 
 RESPONSE_HEADERS = {
     'Content-Type': 'application/json'
 }
 
 def build_return_response(response: Response) -> Response:
-    response.headers = {
-        **response.headers,
-        **RESPONSE_HEADERS
-    }
+    # set on the existing headers, replacing them would drop the ones set by the decorators
+    for header, value in RESPONSE_HEADERS.items():
+        response[header] = value
     return response
 
 
-@api_view(['GET'])
-@authentication_classes([SessionAuthentication, TokenAuthentication])
-@permission_classes([IsAuthenticated])
-def get_all_providers(request):
+# admin list filters, shared by the paginated and export endpoints
+
+def get_providers_query_set(request):
     # get optinal status from query param, default ACTIVE
     status_filter = request.GET.get('status', 'A')
+    query_set = HealthCareProvider.objects.filter(status=status_filter).order_by('id')
+    return filter_by_addresses(query_set, get_location_filters(request))
+
+
+def get_organizations_query_set(request):
+    # get optinal status from query param, default ACTIVE
+    status_filter = request.GET.get('status', 'A')
+    query_set = HealthCareOrganization.objects.filter(status=status_filter).order_by('id')
+    return filter_by_addresses(query_set, get_location_filters(request))
+
 
-    query_set = HealthCareProvider.objects.filter(status=status_filter)
-    paginator = LimitOffsetPagination()
-    data = paginator.paginate_queryset(query_set, request)
+def get_addresses_query_set(request):
+    # get optinal status from query param, default ACTIVE
+    filter_params = {}
+    filter_params['status'] = request.GET.get('status', 'A')
+    type_filter = request.GET.get('type')
+    if type_filter:
+        filter_params['parent_type'] = type_filter
+    return filter_addresses(Address.objects.filter(**filter_params).order_by('id'), get_location_filters(request))
+
+
+def get_affiliations_query_set(request):
+    # get optinal status from query param, default ACTIVE
+    filter_params = {}
+    filter_params['status'] = request.GET.get('status', 'A')
+    type_filter = request.GET.get('type')
+    if type_filter:
+        filter_params['type'] = type_filter
+    return Affiliation.objects.filter(**filter_params).order_by('id')
+
+
+# multi-get endpoints, one id__in query for all the ids of the request
+
+def get_requested_ids(request):
+    # `ids` query param: comma separated ids, duplicates removed, request order kept
+    try:
+        ids = list(dict.fromkeys(int(id) for id in request.query_params.get('ids', '').split(',') if id.strip()))
+    except ValueError:
+        raise ValidationError({'ids': 'A comma separated list of integers is required.'})
+    if not ids:
+        raise ValidationError({'ids': 'This query parameter is required.'})
+    max_ids = getattr(settings, 'DATA_MULTI_GET_MAX_IDS', 100)
+    if len(ids) > max_ids:
+        raise ValidationError({'ids': f'Ensure there are no more than {max_ids} ids.'})
+    return ids
+
+
+def build_multi_get_response(plan, rows, ids):
+    # results in the requested order, ids without a row are listed in `missing`
+    found = {row['id']: plan.serialize_one(row) for row in rows}
+    data = {
+        'results': [found[id] for id in ids if id in found],
+        'missing': [id for id in ids if id not in found],
+    }
+    return Response(data, status=200, headers=RESPONSE_HEADERS)
+
+
+@api_view(['GET'])
+@authentication_classes(AUTHENTICATION_CLASSES)
+@permission_classes([IsAuthenticated])
+@cached_response(HealthCareProvider, get_expand_dependencies, get_location_dependencies)
+def get_all_providers(request):
+    query_set = get_providers_query_set(request)
+    plan = get_plan(request, PROVIDER_PLAN)
+    paginator = get_paginator(request)
+    data = paginator.paginate_queryset(plan.rows(query_set), request)
     
-    serializer = HealthCareProviderSerializer(data, many=True)
-    paginated_data = paginator.get_paginated_response(serializer.data)
+    paginated_data = paginator.get_paginated_response(plan.serialize(data))
     
     return build_return_response(paginated_data)
 
 
 @api_view(['GET'])
-@authentication_classes([SessionAuthentication, TokenAuthentication])
+@authentication_classes(AUTHENTICATION_CLASSES)
 @permission_classes([IsAuthenticated])
+@cached_response(HealthCareOrganization, get_expand_dependencies, get_location_dependencies)
 def get_all_organizations(request):
-    # get optinal status from query param, default ACTIVE
-    status_filter = request.GET.get('status', 'A')
-
-    query_set = HealthCareOrganization.objects.filter(status=status_filter)
-    paginator = LimitOffsetPagination()
-    data = paginator.paginate_queryset(query_set, request)
+    query_set = get_organizations_query_set(request)
+    plan = get_plan(request, ORGANIZATION_PLAN)
+    paginator = get_paginator(request)
+    data = paginator.paginate_queryset(plan.rows(query_set), request)
     
-    serializer = HealthCareOrganizationSerializer(data, many=True)
-    paginated_data = paginator.get_paginated_response(serializer.data)
+    paginated_data = paginator.get_paginated_response(plan.serialize(data))
     
     return build_return_response(paginated_data)
 
 
 @api_view(['GET'])
-@authentication_classes([SessionAuthentication, TokenAuthentication])
+@authentication_classes(AUTHENTICATION_CLASSES)
 @permission_classes([IsAuthenticated])
+@cached_response(Address)
 def get_all_addresses(request):
-    # get optinal status from query param, default ACTIVE
-    filter_params = {}
-    filter_params['status'] = request.GET.get('status', 'A')
-    type_filter = request.GET.get('type')
-    if type_filter:
-        filter_params['parent_type'] = type_filter
-    
-    query_set = Address.objects.filter(**filter_params)
-    paginator = LimitOffsetPagination()
-    data = paginator.paginate_queryset(query_set, request)
+    query_set = get_addresses_query_set(request)
+    paginator = get_paginator(request)
+    data = paginator.paginate_queryset(ADDRESS_PLAN.rows(query_set), request)
     
-    serializer = AddressSerializer(data, many=True)
-    paginated_data = paginator.get_paginated_response(serializer.data)
+    paginated_data = paginator.get_paginated_response(ADDRESS_PLAN.serialize(data))
     
     return build_return_response(paginated_data)
 
 
 @api_view(['GET'])
-@authentication_classes([SessionAuthentication, TokenAuthentication])
+@authentication_classes(AUTHENTICATION_CLASSES)
 @permission_classes([IsAuthenticated])
+@cached_response(Affiliation)
 def get_all_affiliations(request):
-    # get optinal status from query param, default ACTIVE
-    filter_params = {}
-    filter_params['status'] = request.GET.get('status', 'A')
-    type_filter = request.GET.get('type')
-    if type_filter:
-        filter_params['type'] = type_filter
+    query_set = get_affiliations_query_set(request)
+    paginator = get_paginator(request)
+    data = paginator.paginate_queryset(AFFILIATION_PLAN.rows(query_set), request)
     
-    query_set = Affiliation.objects.filter(**filter_params)
-
-    paginator = LimitOffsetPagination()
-    data = paginator.paginate_queryset(query_set, request)
-    
-    serializer = AffiliationSerializer(data, many=True)
-    paginated_data = paginator.get_paginated_response(serializer.data)
+    paginated_data = paginator.get_paginated_response(AFFILIATION_PLAN.serialize(data))
     
     return build_return_response(paginated_data)
 
 
 @api_view(['GET'])
-@authentication_classes([SessionAuthentication, TokenAuthentication])
+@authentication_classes(AUTHENTICATION_CLASSES)
+@permission_classes([IsAuthenticated])
+@cached_response(HealthCareProvider)
+def get_providers_by_ids(request):
+    ids = get_requested_ids(request)
+    return build_multi_get_response(PROVIDER_PLAN, PROVIDER_PLAN.rows(HealthCareProvider.objects.filter(id__in=ids)), ids)
+
+
+@api_view(['GET'])
+@authentication_classes(AUTHENTICATION_CLASSES)
+@permission_classes([IsAuthenticated])
+@cached_response(HealthCareOrganization)
+def get_organizations_by_ids(request):
+    ids = get_requested_ids(request)
+    return build_multi_get_response(ORGANIZATION_PLAN, ORGANIZATION_PLAN.rows(HealthCareOrganization.objects.filter(id__in=ids)), ids)
+
+
+@api_view(['GET'])
+@authentication_classes(AUTHENTICATION_CLASSES)
+@permission_classes([IsAuthenticated])
+@cached_response(Address)
+def get_addresses_by_ids(request):
+    ids = get_requested_ids(request)
+    return build_multi_get_response(ADDRESS_PLAN, ADDRESS_PLAN.rows(Address.objects.filter(id__in=ids)), ids)
+
+
+@api_view(['GET'])
+@authentication_classes(AUTHENTICATION_CLASSES)
+@permission_classes([IsAuthenticated])
+@cached_response(Affiliation)
+def get_affiliations_by_ids(request):
+    ids = get_requested_ids(request)
+    return build_multi_get_response(AFFILIATION_PLAN, AFFILIATION_PLAN.rows(Affiliation.objects.filter(id__in=ids)), ids)
+
+
+@api_view(['GET'])
+@authentication_classes(AUTHENTICATION_CLASSES)
+@permission_classes([IsAuthenticated])
+def export_providers(request):
+    # all rows matching the filters as NDJSON, streamed (not paginated nor cached)
+    return build_export_response(request, get_providers_query_set(request), PROVIDER_PLAN)
+
+
+@api_view(['GET'])
+@authentication_classes(AUTHENTICATION_CLASSES)
+@permission_classes([IsAuthenticated])
+def export_organizations(request):
+    # all rows matching the filters as NDJSON, streamed (not paginated nor cached)
+    return build_export_response(request, get_organizations_query_set(request), ORGANIZATION_PLAN)
+
+
+@api_view(['GET'])
+@authentication_classes(AUTHENTICATION_CLASSES)
+@permission_classes([IsAuthenticated])
+def export_addresses(request):
+    # all rows matching the filters as NDJSON, streamed (not paginated nor cached)
+    return build_export_response(request, get_addresses_query_set(request), ADDRESS_PLAN)
+
+
+@api_view(['GET'])
+@authentication_classes(AUTHENTICATION_CLASSES)
+@permission_classes([IsAuthenticated])
+def export_affiliations(request):
+    # all rows matching the filters as NDJSON, streamed (not paginated nor cached)
+    return build_export_response(request, get_affiliations_query_set(request), AFFILIATION_PLAN)
+
+
+@api_view(['GET'])
+@authentication_classes(AUTHENTICATION_CLASSES)
 @permission_classes([IsAuthenticated])
+@cached_response((HealthCareOrganization, 'organization_id'), get_expand_dependencies)
 def get_healthcare_organization_by_id(request, organization_id):
-    query_set = HealthCareOrganization.objects.filter(id=organization_id)
-    
-    response = HealthCareOrganizationSerializer(query_set, many=True)
-    if not len(response.data):
+    plan = get_plan(request, ORGANIZATION_PLAN)
+    row = plan.rows(HealthCareOrganization.objects.filter(id=organization_id)).first()
+    if row is None:
         raise Http404("Healthcare organization does not exist")
-    
-    return Response(response.data[0], status=200, headers=RESPONSE_HEADERS)
+
+    return Response(plan.serialize_one(row), status=200, headers=RESPONSE_HEADERS)
 
 
 @api_view(['GET'])
-@authentication_classes([SessionAuthentication, TokenAuthentication])
+@authentication_classes(AUTHENTICATION_CLASSES)
 @permission_classes([IsAuthenticated])
+@cached_response((Affiliation, 'affiliation_id'))
 def get_affiliation_by_id(request, affiliation_id):
-    query_set = Affiliation.objects.filter(id=affiliation_id)
-    
-    response = AffiliationSerializer(query_set, many=True)
-    if not len(response.data):
+    row = AFFILIATION_PLAN.rows(Affiliation.objects.filter(id=affiliation_id)).first()
+    if row is None:
         raise Http404("Affiliation does not exist")
-    
-    return Response(response.data[0], status=200, headers=RESPONSE_HEADERS)
+
+    return Response(AFFILIATION_PLAN.serialize_one(row), status=200, headers=RESPONSE_HEADERS)
 
 
 @api_view(['GET'])
-@authentication_classes([SessionAuthentication, TokenAuthentication])
+@authentication_classes(AUTHENTICATION_CLASSES)
 @permission_classes([IsAuthenticated])
+@cached_response((HealthCareOrganization, 'organization_id'))
 def get_healthcare_addresses_by_organization_by_id(request, organization_id):
-    query_set = HealthCareOrganization.objects.filter(id=organization_id)
-    
-    paginator = LimitOffsetPagination()
-    data = paginator.paginate_queryset(query_set, request)
+    # paginate the address rows through the m2m join table, not the parent row
+    query_set = filter_addresses(Address.objects.filter(healthcareorganization=organization_id).order_by('id'), get_location_filters(request))
 
-    serializer = HealthCareOrganizationAddressesSerializer(data, many=True)
-    if not len(serializer.data):
+    paginator = CountingLimitOffsetPagination()
+    data = paginator.paginate_queryset(ADDRESS_PLAN.rows(query_set), request)
+    if not data and not HealthCareOrganization.objects.filter(id=organization_id).exists():
         raise Http404("Heathcare organization addresses do not exist")
 
-    mapped_data = list(map(lambda x: x['addresses'], serializer.data)) 
-
-    paginated_data = paginator.get_paginated_response(mapped_data[0])
+    paginated_data = paginator.get_paginated_response(ADDRESS_PLAN.serialize(data))
     return build_return_response(paginated_data)
 
 
 @api_view(['GET'])
-@authentication_classes([SessionAuthentication, TokenAuthentication])
+@authentication_classes(AUTHENTICATION_CLASSES)
 @permission_classes([IsAuthenticated])
+@cached_response((HealthCareProvider, 'provider_id'), get_expand_dependencies)
 def get_healthcare_provider_by_id(request, provider_id):
-    query_set = HealthCareProvider.objects.filter(id=provider_id)
-    
-    response = HealthCareProviderSerializer(query_set, many=True)
-    if not len(response.data):
+    plan = get_plan(request, PROVIDER_PLAN)
+    row = plan.rows(HealthCareProvider.objects.filter(id=provider_id)).first()
+    if row is None:
         raise Http404("Heathcare provider does not exist")
-    
-    return Response(response.data[0], status=200, headers=RESPONSE_HEADERS)
+
+    return Response(plan.serialize_one(row), status=200, headers=RESPONSE_HEADERS)
 
 
 @api_view(['GET'])
-@authentication_classes([SessionAuthentication, TokenAuthentication])
+@authentication_classes(AUTHENTICATION_CLASSES)
 @permission_classes([IsAuthenticated])
+@cached_response((HealthCareProvider, 'provider_id'))
 def get_healthcare_addresses_by_provider_by_id(request, provider_id):
-    query_set = HealthCareProvider.objects.filter(id=provider_id)
+    query_set = filter_addresses(Address.objects.filter(healthcareprovider=provider_id).order_by('id'), get_location_filters(request))
 
-    paginator = LimitOffsetPagination()
-    data = paginator.paginate_queryset(query_set, request)
-    
-    serializer = HealthCareProviderAddressesSerializer(data, many=True)
-    if not len(serializer.data):
+    paginator = CountingLimitOffsetPagination()
+    data = paginator.paginate_queryset(ADDRESS_PLAN.rows(query_set), request)
+    if not data and not HealthCareProvider.objects.filter(id=provider_id).exists():
         raise Http404("Healthcare addresses do not exist")
 
-    mapped_data = list(map(lambda x: x['addresses'], serializer.data)) 
-
-    paginated_data = paginator.get_paginated_response(mapped_data[0])
+    paginated_data = paginator.get_paginated_response(ADDRESS_PLAN.serialize(data))
     return build_return_response(paginated_data)
 
 
 @api_view(['GET'])
-@authentication_classes([SessionAuthentication, TokenAuthentication])
+@authentication_classes(AUTHENTICATION_CLASSES)
 @permission_classes([IsAuthenticated])
+@cached_response((HealthCareOrganization, 'organization_id'), (Address, 'address_id'))
 def get_healthcare_organization_address_by_id(request, organization_id, address_id):
-    query_set = HealthCareOrganization.objects.filter(id=organization_id, addresses=address_id)
-    
-    serializer = HealthCareOrganizationAddressesSerializer(query_set, many=True)
-    if not len(serializer.data) or not len(serializer.data[0]['addresses']):
+    row = ADDRESS_PLAN.rows(Address.objects.filter(healthcareorganization=organization_id, id=address_id)).first()
+    if row is None:
         raise Http404("Healthcare organization address does not exist")
-    address = serializer.data[0]['addresses'][0]
 
-    return Response(address, status=200, headers=RESPONSE_HEADERS)
+    return Response(ADDRESS_PLAN.serialize_one(row), status=200, headers=RESPONSE_HEADERS)
 
 
 @api_view(['GET'])
-@authentication_classes([SessionAuthentication, TokenAuthentication])
+@authentication_classes(AUTHENTICATION_CLASSES)
 @permission_classes([IsAuthenticated])
+@cached_response((HealthCareProvider, 'provider_id'), (Address, 'address_id'))
 def get_healthcare_provider_address_by_id(request, provider_id, address_id):
-    query_set = HealthCareProvider.objects.filter(id=provider_id, addresses=address_id)
-    
-    serializer = HealthCareProviderAddressesSerializer(query_set, many=True)
-    if not len(serializer.data) or not len(serializer.data[0]['addresses']):
+    row = ADDRESS_PLAN.rows(Address.objects.filter(healthcareprovider=provider_id, id=address_id)).first()
+    if row is None:
         raise Http404("Healthcare provider address does not exist")
-    address = serializer.data[0]['addresses'][0]
 
-    return Response(address, status=200, headers=RESPONSE_HEADERS)
+    return Response(ADDRESS_PLAN.serialize_one(row), status=200, headers=RESPONSE_HEADERS)
 
 
 @api_view(['GET'])
-@authentication_classes([SessionAuthentication, TokenAuthentication])
+@authentication_classes(AUTHENTICATION_CLASSES)
 @permission_classes([IsAuthenticated])
+@cached_response((HealthCareProvider, 'provider_id'))
 def get_healthcare_provider_affiliations(request, provider_id):
-    query_set = HealthCareProvider.objects.filter(id=provider_id)
-    response = HealthCareProviderSerializer(query_set, many=True)
-    if not len(response.data):
+    if not HealthCareProvider.objects.filter(id=provider_id).exists():
         raise Http404("Heathcare provider does not exist")
 
-    hcp = dict(response.data[0])
-    query_set = Affiliation.objects.filter(Q(parent_hcp_link__id=hcp['id']) | Q(child_hcp_link__id=hcp['id']))
+    query_set = Affiliation.filter_by_provider(provider_id)
 
-    paginator = LimitOffsetPagination()
-    data = paginator.paginate_queryset(query_set, request)
+    paginator = CountingLimitOffsetPagination()
+    data = paginator.paginate_queryset(AFFILIATION_PLAN.rows(query_set), request)
     
-    serializer = AffiliationSerializer(data, many=True)
-    paginated_data = paginator.get_paginated_response(serializer.data)
+    paginated_data = paginator.get_paginated_response(AFFILIATION_PLAN.serialize(data))
     
     return build_return_response(paginated_data)
 
 
 @api_view(['GET'])
-@authentication_classes([SessionAuthentication, TokenAuthentication])
+@authentication_classes(AUTHENTICATION_CLASSES)
 @permission_classes([IsAuthenticated])
+@cached_response((HealthCareOrganization, 'organization_id'))
 def get_healthcare_organization_affiliations(request, organization_id):
-    query_set = HealthCareOrganization.objects.filter(id=organization_id)
-    response = HealthCareOrganizationSerializer(query_set, many=True)
-    if not len(response.data):
+    if not HealthCareOrganization.objects.filter(id=organization_id).exists():
         raise Http404("Heathcare organization does not exist")
 
-    hco = dict(response.data[0])
-    query_set = Affiliation.objects.filter(Q(parent_hco_link__id=hco['id']) | Q(child_hco_link__id=hco['id']))
+    query_set = Affiliation.filter_by_organization(organization_id)
 
-    paginator = LimitOffsetPagination()
-    data = paginator.paginate_queryset(query_set, request)
+    paginator = CountingLimitOffsetPagination()
+    data = paginator.paginate_queryset(AFFILIATION_PLAN.rows(query_set), request)
     
-    serializer = AffiliationSerializer(data, many=True)
-    paginated_data = paginator.get_paginated_response(serializer.data)
+    paginated_data = paginator.get_paginated_response(AFFILIATION_PLAN.serialize(data))
     
     return build_return_response(paginated_data)
+
+
+@api_view(['GET'])
+@authentication_classes(AUTHENTICATION_CLASSES)
+@permission_classes([IsAuthenticated])
+@cached_response(HealthCareProvider, HealthCareOrganization, Affiliation)
+def get_healthcare_provider_network(request, provider_id):
+    if not HealthCareProvider.objects.filter(id=provider_id).exists():
+        raise Http404("Heathcare provider does not exist")
+
+    depth, status_filter = get_network_params(request)
+    return Response(get_network((HCP, int(provider_id)), depth, status_filter, walk=get_graph_walk()), status=200, headers=RESPONSE_HEADERS)
+
+
+@api_view(['GET'])
+@authentication_classes(AUTHENTICATION_CLASSES)
+@permission_classes([IsAuthenticated])
+@cached_response(HealthCareProvider, HealthCareOrganization, Affiliation)
+def get_healthcare_organization_network(request, organization_id):
+    if not HealthCareOrganization.objects.filter(id=organization_id).exists():
+        raise Http404("Heathcare organization does not exist")
+
+    depth, status_filter = get_network_params(request)
+    return Response(get_network((HCO, int(organization_id)), depth, status_filter, walk=get_graph_walk()), status=200, headers=RESPONSE_HEADERS)
+
+
+@api_view(['GET'])
+@authentication_classes(AUTHENTICATION_CLASSES)
+@permission_classes([IsAuthenticated])
+@cached_response(HealthCareProvider, HealthCareOrganization, Affiliation)
+def get_healthcare_provider_neighbours(request, provider_id):
+    # served by the in-memory graph index (graph.py), built on first use
+    if not HealthCareProvider.objects.filter(id=provider_id).exists():
+        raise Http404("Heathcare provider does not exist")
+
+    return Response(get_neighbours_data((HCP, int(provider_id)), request.query_params.get('status', 'A')), status=200, headers=RESPONSE_HEADERS)
+
+
+@api_view(['GET'])
+@authentication_classes(AUTHENTICATION_CLASSES)
+@permission_classes([IsAuthenticated])
+@cached_response(HealthCareProvider, HealthCareOrganization, Affiliation)
+def get_healthcare_organization_neighbours(request, organization_id):
+    if not HealthCareOrganization.objects.filter(id=organization_id).exists():
+        raise Http404("Heathcare organization does not exist")
+
+    return Response(get_neighbours_data((HCO, int(organization_id)), request.query_params.get('status', 'A')), status=200, headers=RESPONSE_HEADERS)
+
+
+def get_path_params(request):
+    # (source, target, status, max depth) query params of the path endpoint
+    source, target = get_node_param(request, 'source'), get_node_param(request, 'target')
+    max_depth = request.query_params.get('max_depth')
+    if max_depth is not None and not max_depth.isdigit():
+        raise ValidationError({'max_depth': 'A valid integer is required.'})
+    return source, target, request.query_params.get('status', 'A'), int(max_depth) if max_depth is not None else None
+
+
+@api_view(['GET'])
+@authentication_classes(AUTHENTICATION_CLASSES)
+@permission_classes([IsAuthenticated])
+@cached_response(HealthCareProvider, HealthCareOrganization, Affiliation)
+def get_affiliation_path(request):
+    # shortest affiliation path between two entities, served by the in-memory graph index
+    source, target, status_filter, max_depth = get_path_params(request)
+    for kind, id in (source, target):
+        if not NODE_MODELS[kind].objects.filter(id=id).exists():
+            raise Http404(f"{kind} {id} does not exist")
+
+    return Response(get_path_data(source, target, status_filter, max_depth), status=200, headers=RESPONSE_HEADERS)
+
+
+@api_view(['GET'])
+@authentication_classes(AUTHENTICATION_CLASSES)
+@permission_classes([IsAuthenticated])
+@cached_response(HealthCareProvider)
+def search_providers(request):
+    # name search, ordered by relevance (search.py)
+    return Response(get_search_data(request, HealthCareProvider), status=200, headers=RESPONSE_HEADERS)
+
+
+@api_view(['GET'])
+@authentication_classes(AUTHENTICATION_CLASSES)
+@permission_classes([IsAuthenticated])
+@cached_response(HealthCareOrganization)
+def search_organizations(request):
+    return Response(get_search_data(request, HealthCareOrganization), status=200, headers=RESPONSE_HEADERS)
+
+
+@api_view(['POST'])
+@authentication_classes([])
+@permission_classes([])
+def obtain_signed_token(request):
+    # same credentials as obtain_auth_token, the token is checked without a query (authentication.py)
+    if not is_signed_tokens_enabled():
+        raise NotFound()
+    serializer = AuthTokenSerializer(data=request.data, context={'request': request})
+    serializer.is_valid(raise_exception=True)
+    token = create_signed_token(serializer.validated_data['user'])
+    return Response({'token': token, 'expires_in': get_signed_token_max_age()}, status=200, headers=RESPONSE_HEADERS)
+
+
+@api_view(['GET'])
+@authentication_classes(AUTHENTICATION_CLASSES)
+@permission_classes([IsAuthenticated])
+def get_graph_index_stats(request):
+    # graph index of the process serving the request
+    return Response(get_graph_stats(), status=200, headers=RESPONSE_HEADERS)
+
+
+@api_view(['GET'])
+@authentication_classes(AUTHENTICATION_CLASSES)
+@permission_classes([IsAuthenticated])
+def get_cache_stats(request):
+    # response cache hit/miss counters of the process serving the request
+    return Response(get_stats(), status=200, headers=RESPONSE_HEADERS)
+
+
+@api_view(['GET'])
+@authentication_classes(AUTHENTICATION_CLASSES)
+@permission_classes([IsAuthenticated])
+@renderer_classes([MetricsRenderer])
+def get_metrics(request):
+    # request metrics of every process (with DATA_METRICS_DIR), Prometheus text format
+    return Response(render_metrics(collect()), status=200, content_type=METRICS_CONTENT_TYPE)